@@ -0,0 +1,89 @@
+"""
+Per-request CPU of serializing a 100-item downloads page: FastAPI's
+response_model path against the trusted FastJSONResponse path, and the
+BSON decode plus encode cost of a sparse fieldset (fields=name,download_count)
+against full documents.
+
+    cd backend && python benchmarks/bench_download_responses.py
+"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+import bson  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from models.schemas import Download, PaginatedDownloads  # noqa: E402
+from services.responses import FastJSONResponse, with_defaults, sparse_items, orjson  # noqa: E402
+
+ITEMS = [
+    {
+        "id": str(uuid.uuid4()), "name": f"Download {i}", "download_link": f"https://example.com/{i}",
+        "type": "game", "submission_date": "2026-01-01", "approved": True,
+        "created_at": "2026-01-01T12:00:00+00:00", "download_count": i, "file_size": "1.5 GB",
+        "file_size_bytes": 1610612736, "description": "A fairly ordinary description " * 3,
+        "category": "Action", "tags": ["retro", "arcade"], "site_name": "Example", "site_url": "https://example.com",
+    }
+    for i in range(100)
+]
+PAYLOAD = {"items": ITEMS, "total": 1000, "page": 1, "pages": 10, "total_estimated": False,
+           "next_cursor": "abc", "prev_cursor": None}
+SPARSE_FIELDS = ["id", "name", "download_count"]
+# The documents as the server would send them for each projection
+FULL_BSON = [bson.encode(item) for item in ITEMS]
+SPARSE_BSON = [bson.encode({name: item[name] for name in SPARSE_FIELDS}) for item in ITEMS]
+FIELD = create_response_field(name="Response_get_downloads", type_=PaginatedDownloads)
+
+
+async def response_model_path():
+    # What the endpoint did before: wrap the items in the model, then let
+    # FastAPI validate against response_model and encode
+    model = PaginatedDownloads(**PAYLOAD)
+    content = await serialize_response(field=FIELD, response_content=model, is_coroutine=True)
+    return JSONResponse(content).body
+
+
+async def fast_path():
+    return FastJSONResponse({**PAYLOAD, "items": with_defaults(ITEMS, Download)}).body
+
+
+async def decode_full():
+    docs = [bson.decode(raw) for raw in FULL_BSON]
+    return FastJSONResponse({**PAYLOAD, "items": with_defaults(docs, Download)}).body
+
+
+async def decode_sparse():
+    docs = [bson.decode(raw) for raw in SPARSE_BSON]
+    return FastJSONResponse({**PAYLOAD, "items": sparse_items(docs, SPARSE_FIELDS)}).body
+
+
+async def bench(label, fn, number):
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<22} {best / number * 1e3:8.3f} ms/request")
+
+
+async def main():
+    print(f"encoder: {'orjson' if orjson else 'json (orjson not installed)'}")
+    await bench("response_model", response_model_path, 200)
+    await bench("fast path", fast_path, 200)
+    await bench("decode + full", decode_full, 200)
+    await bench("decode + sparse", decode_sparse, 200)
+    print(f"BSON bytes: full {sum(map(len, FULL_BSON))}, sparse {sum(map(len, SPARSE_BSON))}")
+    print(f"JSON bytes: full {len(await decode_full())}, sparse {len(await decode_sparse())}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
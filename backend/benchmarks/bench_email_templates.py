@@ -0,0 +1,182 @@
+"""
+Render throughput of the email templates against the f-string builders
+they replaced, copied verbatim from services/email.py before templates.
+
+The templates are rendered by the same functions the mail senders call.
+
+    cd backend && python benchmarks/bench_email_templates.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+os.environ.setdefault('FRONTEND_URL', 'https://example.com')
+
+from services import templates  # noqa: E402
+
+FRONTEND_URL = os.environ['FRONTEND_URL']
+
+SUBMISSION = {
+    "id": "bench", "name": "Some <Game> & Friends", "type": "games", "category": "Action",
+    "file_size": "4.2 GB", "submission_date": "2026-01-01", "created_at": "2026-01-01T12:00:00+00:00",
+}
+BATCH = [dict(SUBMISSION, name=f"Item {i}") for i in range(50)]
+
+
+def previous_submission(submission):
+    submit_url = f"{FRONTEND_URL}/submit"
+    html_content = f"""
+    <html>
+    <body style="font-family: 'Courier New', monospace; background-color: #0a0a0a; color: #00FF41; padding: 20px;">
+        <div style="max-width: 600px; margin: 0 auto; border: 2px solid #00FF41; padding: 20px;">
+            <h1 style="color: #00FF41; border-bottom: 1px solid #00FF41; padding-bottom: 10px;">
+                DOWNLOAD ZONE - SUBMISSION RECEIVED
+            </h1>
+            <p>Your submission has been received and is pending admin approval.</p>
+            
+            <h2 style="color: #00FFFF;">SUBMISSION DETAILS:</h2>
+            <table style="width: 100%; border-collapse: collapse;">
+                <tr>
+                    <td style="padding: 8px; border: 1px solid #333; color: #888;">Name:</td>
+                    <td style="padding: 8px; border: 1px solid #333; color: #00FF41;">{submission.get('name', 'N/A')}</td>
+                </tr>
+                <tr>
+                    <td style="padding: 8px; border: 1px solid #333; color: #888;">Type:</td>
+                    <td style="padding: 8px; border: 1px solid #333; color: #00FF41;">{submission.get('type', 'N/A')}</td>
+                </tr>
+                <tr>
+                    <td style="padding: 8px; border: 1px solid #333; color: #888;">Category:</td>
+                    <td style="padding: 8px; border: 1px solid #333; color: #00FF41;">{submission.get('category', 'N/A')}</td>
+                </tr>
+                <tr>
+                    <td style="padding: 8px; border: 1px solid #333; color: #888;">File Size:</td>
+                    <td style="padding: 8px; border: 1px solid #333; color: #00FF41;">{submission.get('file_size', 'N/A')}</td>
+                </tr>
+                <tr>
+                    <td style="padding: 8px; border: 1px solid #333; color: #888;">Date:</td>
+                    <td style="padding: 8px; border: 1px solid #333; color: #00FF41;">{submission.get('submission_date', 'N/A')}</td>
+                </tr>
+                <tr>
+                    <td style="padding: 8px; border: 1px solid #333; color: #888;">Time:</td>
+                    <td style="padding: 8px; border: 1px solid #333; color: #00FF41;">{submission.get('created_at', 'N/A')}</td>
+                </tr>
+            </table>
+            
+            <p style="margin-top: 20px;">
+                <a href="{submit_url}" style="display: inline-block; padding: 10px 20px; background-color: #00FF41; color: #000; text-decoration: none; font-weight: bold;">
+                    SUBMIT ANOTHER FILE
+                </a>
+            </p>
+            
+            <p style="margin-top: 30px; font-size: 12px; color: #666;">
+                This is an automated message from Download Zone.
+            </p>
+        </div>
+    </body>
+    </html>
+    """
+    
+    return html_content
+
+
+def previous_bulk(submissions):
+    submit_url = f"{FRONTEND_URL}/submit"
+
+    rows = ""
+    for s in submissions[:50]:
+        rows += f"""
+        <tr>
+            <td style=\"padding: 8px; border: 1px solid #333; color: #00FF41;\">{s.get('name','N/A')}</td>
+            <td style=\"padding: 8px; border: 1px solid #333; color: #00FF41;\">{s.get('type','N/A')}</td>
+            <td style=\"padding: 8px; border: 1px solid #333; color: #00FF41;\">{s.get('submission_date','N/A')}</td>
+        </tr>
+        """
+
+    html = f"""
+    <html>
+    <body style=\"font-family: 'Courier New', monospace; background-color: #0a0a0a; color: #00FF41; padding: 20px;\">
+        <div style=\"max-width: 600px; margin: 0 auto; border: 2px solid #00FF41; padding: 20px;\">
+            <h1 style=\"color: #00FF41; border-bottom: 1px solid #00FF41; padding-bottom: 10px;\">DOWNLOAD ZONE - BATCH SUBMISSION RECEIVED</h1>
+            <p>Your submissions have been received and are pending admin approval.</p>
+            <h2 style=\"color: #00FFFF;\">SUBMISSIONS:</h2>
+            <table style=\"width: 100%; border-collapse: collapse;\">
+                <tr>
+                    <td style=\"padding: 8px; border: 1px solid #333; color: #888;\">Name</td>
+                    <td style=\"padding: 8px; border: 1px solid #333; color: #888;\">Type</td>
+                    <td style=\"padding: 8px; border: 1px solid #333; color: #888;\">Date</td>
+                </tr>
+                {rows}
+            </table>
+            <p style=\"margin-top: 20px;\"><a href=\"{submit_url}\" style=\"display: inline-block; padding: 10px 20px; background-color: #00FF41; color: #000; text-decoration: none; font-weight: bold;\">SUBMIT MORE</a></p>
+        </div>
+    </body>
+    </html>
+    """
+
+    return html
+
+
+def previous_approval(submission):
+    home_url = FRONTEND_URL
+    html_content = f"""
+    <html>
+    <body style="font-family: 'Courier New', monospace; background-color: #0a0a0a; color: #00FF41; padding: 20px;">
+        <div style="max-width: 600px; margin: 0 auto; border: 2px solid #00FF41; padding: 20px;">
+            <h1 style="color: #00FF41; border-bottom: 1px solid #00FF41; padding-bottom: 10px;">
+                DOWNLOAD ZONE - SUBMISSION APPROVED
+            </h1>
+            <p style="color: #00FF41; font-size: 16px;">Great news! Your submission has been approved and is now live on Download Zone.</p>
+            
+            <h2 style="color: #00FFFF;">APPROVED CONTENT:</h2>
+            <table style="width: 100%; border-collapse: collapse;">
+                <tr>
+                    <td style="padding: 8px; border: 1px solid #333; color: #888;">Name:</td>
+                    <td style="padding: 8px; border: 1px solid #333; color: #00FF41;">{submission.get('name', 'N/A')}</td>
+                </tr>
+                <tr>
+                    <td style="padding: 8px; border: 1px solid #333; color: #888;">Type:</td>
+                    <td style="padding: 8px; border: 1px solid #333; color: #00FF41;">{submission.get('type', 'N/A')}</td>
+                </tr>
+                <tr>
+                    <td style="padding: 8px; border: 1px solid #333; color: #888;">Category:</td>
+                    <td style="padding: 8px; border: 1px solid #333; color: #00FF41;">{submission.get('category', 'N/A')}</td>
+                </tr>
+                <tr>
+                    <td style="padding: 8px; border: 1px solid #333; color: #888;">File Size:</td>
+                    <td style="padding: 8px; border: 1px solid #333; color: #00FF41;">{submission.get('file_size', 'N/A')}</td>
+                </tr>
+            </table>
+            
+            <p style="margin-top: 20px;">
+                <a href="{home_url}" style="display: inline-block; padding: 10px 20px; background-color: #00FF41; color: #000; text-decoration: none; font-weight: bold;">
+                    VIEW ON DOWNLOAD ZONE
+                </a>
+            </p>
+            
+            <p style="margin-top: 30px; font-size: 12px; color: #666;">
+                Thank you for contributing to Download Zone!
+            </p>
+        </div>
+    </body>
+    </html>
+    """
+    
+    return html_content
+
+
+def bench(label, fn, arg, number):
+    seconds = min(timeit.repeat(lambda: fn(arg), number=number, repeat=5))
+    print(f"{label:<28} {number / seconds:>12,.0f} renders/s  {seconds / number * 1e6:8.1f} us/render")
+
+
+if __name__ == "__main__":
+    print("Note: the previous builders do not escape user input; the templates do.")
+    bench("single: previous f-string", previous_submission, SUBMISSION, 20000)
+    bench("single: jinja", templates.render_submission_received, SUBMISSION, 20000)
+    bench("approval: previous f-string", previous_approval, SUBMISSION, 20000)
+    bench("approval: jinja", templates.render_submission_approved, SUBMISSION, 20000)
+    bench("bulk (50): previous f-string", previous_bulk, BATCH, 2000)
+    bench("bulk (50): jinja", templates.render_bulk_submission_received, BATCH, 2000)
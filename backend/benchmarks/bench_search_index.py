@@ -0,0 +1,63 @@
+"""
+Build time, size and query latency of the in-process search index on a
+synthetic catalog.
+
+    cd backend && python benchmarks/bench_search_index.py [documents]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+from services.search_index import CatalogSearchIndex  # noqa: E402
+
+COMMON = ("ultimate space quest retro arcade media player studio racing legends dragon shadow "
+          "tactics empire galaxy pixel office suite editor converter manager tools pro deluxe "
+          "edition remastered collection world chronicles kingdom night rider storm").split()
+SYLLABLES = "ka lo mi ra ven tor sil bex qua dri mon zel pha rus tin gor".split()
+# A few thousand rarer words, as in a real catalog
+RARE = sorted({a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES})[:4000]
+QUERIES = {
+    "common word": "galaxy",
+    "two words": "retro racing",
+    "rare word": RARE[1234],
+    "substring": "emaster",
+    "typo": "chronicels",
+}
+
+
+def make_doc(i: int, rng: random.Random) -> dict:
+    return {
+        "id": f"doc-{i}",
+        "name": " ".join(rng.sample(COMMON, 2) + rng.sample(RARE, 1)).title() + f" {i}",
+        "category": rng.choice(["Action", "Puzzle", "Utilities", "Audio"]),
+        "tags": rng.sample(COMMON, 1) + rng.sample(RARE, 1),
+        "description": " ".join(rng.choices(COMMON, k=4) + rng.choices(RARE, k=8)),
+    }
+
+
+def main(count: int) -> None:
+    rng = random.Random(42)
+    docs = [make_doc(i, rng) for i in range(count)]
+
+    started = time.perf_counter()
+    index = CatalogSearchIndex()
+    for doc in docs:
+        index.add(doc)
+    print(f"built {len(index):,} documents in {(time.perf_counter() - started) * 1000:.0f} ms: {index.stats()}")
+
+    for label, query in QUERIES.items():
+        runs = 20
+        started = time.perf_counter()
+        for _ in range(runs):
+            ids = index.search(query)
+        elapsed = (time.perf_counter() - started) / runs * 1000
+        print(f"{label:<12} {query!r:<14} {len(ids):>6} ids  {elapsed:7.2f} ms/query")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
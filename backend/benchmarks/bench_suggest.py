@@ -0,0 +1,63 @@
+"""
+Build time and per-keystroke latency of the suggestion index on a synthetic
+catalog, including pending delta entries and tombstones.
+
+    cd backend && python benchmarks/bench_suggest.py [documents]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+from services.suggest import PackedPrefixIndex, SuggestionService  # noqa: E402
+
+COMMON = ("ultimate space quest retro arcade media player studio racing legends dragon shadow "
+          "tactics empire galaxy pixel office suite editor converter manager tools pro deluxe").split()
+SYLLABLES = "ka lo mi ra ven tor sil bex qua dri mon zel pha rus tin gor".split()
+RARE = sorted({a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES})[:4000]
+
+
+def make_doc(i: int, rng: random.Random) -> dict:
+    return {
+        "id": f"doc-{i}",
+        "name": " ".join(rng.sample(COMMON, 2) + rng.sample(RARE, 1)).title() + f" {i}",
+        "tags": rng.sample(COMMON, 1) + rng.sample(RARE, 1),
+        "download_count": rng.randint(0, 100000),
+        "approved": True,
+    }
+
+
+def main(count: int) -> None:
+    rng = random.Random(7)
+    docs = [make_doc(i, rng) for i in range(count)]
+
+    service = SuggestionService(reload_seconds=300)
+    started = time.perf_counter()
+    service._packed = PackedPrefixIndex(service._entries_from(docs))
+    print(f"built {count:,} documents in {(time.perf_counter() - started) * 1000:.0f} ms: {service.stats()}")
+
+    # Pending incremental writes, as between compactions
+    service.add(make_doc(count + i, rng) for i in range(100))
+    service.remove(f"doc-{i}" for i in range(0, count, count // 100))
+
+    typed = "galaxy " + RARE[1234]
+    keystrokes = [typed[:n] for n in range(1, len(typed) + 1)]
+    timings = []
+    for _ in range(200):
+        for prefix in keystrokes:
+            t = time.perf_counter()
+            service.suggest(prefix, 8)
+            timings.append((time.perf_counter() - t) * 1000)
+    timings.sort()
+    p50, p99 = timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+    print(f"typing {typed!r} with {service.stats()['delta']} delta entries and "
+          f"{service.stats()['tombstones']} tombstones: p50 {p50:.3f} ms, p99 {p99:.3f} ms, max {timings[-1]:.3f} ms")
+    print("e.g.", [s["text"] for s in service.suggest("gal", 5)])
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -1,10 +1,20 @@
 """Pydantic models and schemas"""
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, PlainSerializer
+from typing import Annotated, Dict, List, Optional, Union
 import uuid
 from datetime import datetime, timezone
 
 
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# Timestamps are stored as BSON dates. Day fields such as submission_date are
+# stored as midnight UTC and sent to clients as YYYY-MM-DD, as before.
+Day = Annotated[datetime, PlainSerializer(lambda value: value.date().isoformat(), return_type=str, when_used="json")]
+DAY_FIELDS = ("submission_date",)
+
+
 # ===== DOWNLOAD MODELS =====
 
 class Download(BaseModel):
@@ -13,9 +23,9 @@ class Download(BaseModel):
     name: str
     download_link: str
     type: str  # game, software, movie, tv_show
-    submission_date: str
+    submission_date: Day
     approved: bool = True
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: datetime = Field(default_factory=utc_now)
     download_count: int = 0
     file_size: Optional[str] = None
     file_size_bytes: Optional[int] = None  # For filtering
@@ -36,11 +46,46 @@ class DownloadCreate(BaseModel):
     tags: Optional[List[str]] = None
 
 
+class DownloadFields(BaseModel):
+    """A download trimmed to the fields requested with fields="""
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    name: Optional[str] = None
+    download_link: Optional[str] = None
+    type: Optional[str] = None
+    submission_date: Optional[Day] = None
+    approved: Optional[bool] = None
+    created_at: Optional[datetime] = None
+    download_count: Optional[int] = None
+    file_size: Optional[str] = None
+    file_size_bytes: Optional[int] = None
+    description: Optional[str] = None
+    category: Optional[str] = None
+    tags: Optional[List[str]] = None
+    site_name: Optional[str] = None
+    site_url: Optional[str] = None
+
+
+class FacetValue(BaseModel):
+    name: str
+    count: int
+    # size_bucket only: the size_min/size_max filter values for this bucket
+    size_min: Optional[str] = None
+    size_max: Optional[str] = None
+
+
 class PaginatedDownloads(BaseModel):
-    items: List[Download]
-    total: int
+    items: List[Union[Download, DownloadFields]]
+    total: Optional[int] = None  # None when include_total=false
     page: int
-    pages: int
+    pages: Optional[int] = None
+    total_estimated: bool = False
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    # download id -> field -> escaped HTML with <mark> around matches
+    highlights: Optional[Dict[str, Dict[str, str]]] = None
+    # facet -> counts under the current filter, when requested with facets=
+    facets: Optional[Dict[str, List[FacetValue]]] = None
 
 
 # ===== SUBMISSION MODELS =====
@@ -51,9 +96,9 @@ class Submission(BaseModel):
     name: str
     download_link: str
     type: str
-    submission_date: str
+    submission_date: Day
     status: str = "pending"
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: datetime = Field(default_factory=utc_now)
     seen_by_admin: bool = False
     file_size: Optional[str] = None
     file_size_bytes: Optional[int] = None
@@ -104,7 +149,7 @@ class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     email: str
     password_hash: str
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: datetime = Field(default_factory=utc_now)
     is_verified: bool = False
 
 
@@ -129,7 +174,7 @@ class Category(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     type: str  # game, software, movie, tv_show, all
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    created_at: datetime = Field(default_factory=utc_now)
 
 
 class CategoryCreate(BaseModel):
@@ -146,8 +191,8 @@ class Captcha(BaseModel):
     num2: int
     operator: str
     answer: int
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
-    expires_at: str
+    created_at: datetime = Field(default_factory=utc_now)
+    expires_at: datetime
 
 
 # ===== THEME MODELS =====
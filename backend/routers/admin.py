@@ -1,20 +1,39 @@
 """Admin router - admin-only endpoints"""
-import asyncio
 import random
 import uuid
 from fastapi import APIRouter, HTTPException, Query
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 
-from services.database import db, ADMIN_PASSWORD, FRONTEND_URL
-from services.email import fetch_site_settings, send_email_via_resend, send_approval_email
-from services.utils import hash_password, generate_token
+from services.database import db, ADMIN_PASSWORD, FRONTEND_URL, ensure_indexes
+from services.email import send_email_via_resend, send_approval_email
+from services.email_outbox import outbox_stats
+from services.settings import fetch_site_settings, get_site_settings, save_site_settings
+from services.utils import hash_password, generate_token, as_utc
+from services.activity import sponsored_click_counts
+from services.click_tracker import click_tracker
+from services.versions import CATEGORIES_VERSION_KEY, bump_version
+from services.captcha import recaptcha_verifier
+from services.facets import rebuild_facet_counts
+from services.catalog import (
+    add_downloads, replace_downloads, count_downloads, count_search_results, parse_include_total,
+    delete_download as remove_download
+)
+from services.search import build_search_filter
+from services.search_index import search_index
+from services.suggest import suggestions
+from services.response_cache import response_cache_stats
+from services.migrations import migration_status
+from services.responses import (
+    DOWNLOAD_PROJECTION, SUBMISSION_PROJECTION, with_defaults, fast_response,
+    parse_fields, sparse_projection, sparse_items
+)
 from models.schemas import (
     AdminLogin, AdminInitRequest, AdminChangePasswordRequest,
     AdminForgotPasswordRequest, AdminUpdateEmailRequest,
     PasswordResetConfirmRequest, TokenOnlyRequest, ResendSettingsUpdate,
     SiteSettingsUpdate, PaginatedDownloads, PaginatedSubmissions,
-    Download, Category, CategoryCreate
+    Download, Submission, Category, CategoryCreate
 )
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -23,21 +42,21 @@ router = APIRouter(prefix="/admin", tags=["admin"])
 @router.post("/init")
 async def admin_init(payload: AdminInitRequest):
     """Initialize admin credentials"""
-    settings = await fetch_site_settings()
-    if settings.get("admin_password_hash"):
+    await fetch_site_settings()  # creates the settings document if missing
+    # Conditional on the stored hash, so two concurrent inits cannot both succeed
+    initialized = await save_site_settings(
+        {"admin_email": payload.email.lower(), "admin_password_hash": hash_password(payload.password)},
+        condition={"admin_password_hash": {"$in": [None, ""]}}
+    )
+    if not initialized:
         raise HTTPException(status_code=400, detail="Admin is already initialized")
-
-    settings["admin_email"] = payload.email.lower()
-    settings["admin_password_hash"] = hash_password(payload.password)
-
-    await db.site_settings.update_one({"id": "site_settings"}, {"$set": settings}, upsert=True)
     return {"success": True}
 
 
 @router.post("/login")
 async def admin_login(login: AdminLogin):
     """Admin login"""
-    settings = await fetch_site_settings()
+    settings = await get_site_settings()
     # Prefer DB-stored password hash; fallback to env for bootstrap
     if settings.get("admin_password_hash"):
         if hash_password(login.password) == settings.get("admin_password_hash"):
@@ -52,7 +71,7 @@ async def admin_login(login: AdminLogin):
 @router.post("/password/change/request")
 async def admin_request_password_change(payload: AdminChangePasswordRequest):
     """Request admin password change (requires current password)"""
-    settings = await fetch_site_settings()
+    settings = await get_site_settings()
     if not settings.get("admin_email"):
         raise HTTPException(status_code=400, detail="Admin email is not configured")
 
@@ -66,13 +85,13 @@ async def admin_request_password_change(payload: AdminChangePasswordRequest):
 
     token = generate_token()
     now = datetime.now(timezone.utc)
-    expires_at = (now + timedelta(minutes=30)).isoformat()
+    expires_at = now + timedelta(minutes=30)
 
     # store pending token
     await db.admin_password_resets.insert_one({
         "token": token,
         "new_password_hash": hash_password(payload.new_password),
-        "created_at": now.isoformat(),
+        "created_at": now,
         "expires_at": expires_at,
         "type": "change"
     })
@@ -99,7 +118,7 @@ async def admin_request_password_change(payload: AdminChangePasswordRequest):
 @router.post("/forgot-password")
 async def admin_forgot_password(payload: AdminForgotPasswordRequest):
     """Admin forgot password"""
-    settings = await fetch_site_settings()
+    settings = await get_site_settings()
 
     # Admin must be initialized first
     if not settings.get("admin_email") or not settings.get("admin_password_hash"):
@@ -111,12 +130,12 @@ async def admin_forgot_password(payload: AdminForgotPasswordRequest):
 
     token = generate_token()
     now = datetime.now(timezone.utc)
-    expires_at = (now + timedelta(minutes=30)).isoformat()
+    expires_at = now + timedelta(minutes=30)
 
     await db.admin_password_resets.insert_one({
         "token": token,
         "new_password_hash": None,
-        "created_at": now.isoformat(),
+        "created_at": now,
         "expires_at": expires_at,
         "type": "forgot"
     })
@@ -140,21 +159,16 @@ async def admin_forgot_password(payload: AdminForgotPasswordRequest):
 @router.post("/reset-password")
 async def admin_reset_password(payload: PasswordResetConfirmRequest):
     """Confirm admin password reset"""
-    settings = await fetch_site_settings()
     req = await db.admin_password_resets.find_one({"token": payload.token}, {"_id": 0})
     if not req:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
-    try:
-        exp = datetime.fromisoformat(req["expires_at"])
-    except Exception:
-        exp = datetime.now(timezone.utc)
-    if exp < datetime.now(timezone.utc):
+    exp = as_utc(req.get("expires_at"))
+    if exp is None or exp < datetime.now(timezone.utc):
         await db.admin_password_resets.delete_one({"token": payload.token})
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
-    settings["admin_password_hash"] = hash_password(payload.new_password)
-    await db.site_settings.update_one({"id": "site_settings"}, {"$set": settings}, upsert=True)
+    await save_site_settings({"admin_password_hash": hash_password(payload.new_password)})
 
     await db.admin_password_resets.delete_one({"token": payload.token})
     return {"success": True}
@@ -163,17 +177,13 @@ async def admin_reset_password(payload: PasswordResetConfirmRequest):
 @router.post("/password/change/confirm")
 async def admin_confirm_password_change(payload: TokenOnlyRequest):
     """Confirm admin password change"""
-    settings = await fetch_site_settings()
     req = await db.admin_password_resets.find_one({"token": payload.token}, {"_id": 0})
     if not req:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
     # check expiry
-    try:
-        exp = datetime.fromisoformat(req["expires_at"])
-    except Exception:
-        exp = datetime.now(timezone.utc)
-    if exp < datetime.now(timezone.utc):
+    exp = as_utc(req.get("expires_at"))
+    if exp is None or exp < datetime.now(timezone.utc):
         await db.admin_password_resets.delete_one({"token": payload.token})
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
@@ -181,8 +191,7 @@ async def admin_confirm_password_change(payload: TokenOnlyRequest):
         raise HTTPException(status_code=400, detail="Invalid token")
 
     # update admin password hash
-    settings["admin_password_hash"] = req["new_password_hash"]
-    await db.site_settings.update_one({"id": "site_settings"}, {"$set": settings}, upsert=True)
+    await save_site_settings({"admin_password_hash": req["new_password_hash"]})
 
     await db.admin_password_resets.delete_one({"token": payload.token})
     return {"success": True}
@@ -199,8 +208,7 @@ async def admin_update_email(payload: AdminUpdateEmailRequest):
         if not ADMIN_PASSWORD or payload.current_password != ADMIN_PASSWORD:
             raise HTTPException(status_code=401, detail="Invalid current password")
 
-    settings["admin_email"] = payload.new_email.lower()
-    await db.site_settings.update_one({"id": "site_settings"}, {"$set": settings}, upsert=True)
+    await save_site_settings({"admin_email": payload.new_email.lower()})
     return {"success": True}
 
 
@@ -218,7 +226,7 @@ async def get_submissions(page: int = 1, limit: int = 20, status: Optional[str]
     
     submissions = await db.submissions.find(
         query,
-        {"_id": 0}
+        SUBMISSION_PROJECTION
     ).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
 
     # mark returned submissions as seen (only for pending)
@@ -230,18 +238,18 @@ async def get_submissions(page: int = 1, limit: int = 20, status: Optional[str]
     total = await db.submissions.count_documents(query)
     pages = (total + limit - 1) // limit
 
-    return {
-        "items": submissions,
+    return fast_response({
+        "items": with_defaults(submissions, Submission),
         "total": total,
         "page": page,
         "pages": pages
-    }
+    })
 
 
 @router.get("/submissions/unseen-count")
 async def admin_unseen_submissions_count():
     """Get count of pending submissions"""
-    settings = await fetch_site_settings()
+    settings = await get_site_settings()
     if settings.get("auto_approve_submissions"):
         return {"count": 0}
 
@@ -272,13 +280,13 @@ async def approve_submission(submission_id: str):
         site_url=submission.get("site_url")
     )
     
-    await db.downloads.insert_one(download_obj.model_dump())
+    await add_downloads([download_obj.model_dump()])
     await db.submissions.update_one({"id": submission_id}, {"$set": {"status": "approved"}})
     
-    # Send approval notification email to submitter (async, non-blocking)
+    # Queue approval notification email to submitter
     submitter_email = submission.get("submitter_email")
     if submitter_email:
-        asyncio.create_task(send_approval_email(submitter_email, submission))
+        await send_approval_email(submitter_email, submission)
     
     return {"success": True, "message": "Submission approved"}
 
@@ -304,71 +312,87 @@ async def delete_submission(submission_id: str):
 # ===== DOWNLOADS MANAGEMENT =====
 
 @router.get("/downloads", response_model=PaginatedDownloads)
-async def admin_search_downloads(search: str = Query(""), page: int = Query(1, ge=1), limit: int = Query(20, ge=1, le=100)):
+async def admin_search_downloads(
+    search: str = Query(""),
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    include_total: Optional[str] = Query("true"),
+    search_mode: str = Query("substring", pattern="^(text|substring)$"),
+    fields: Optional[str] = None
+):
     """Search downloads (admin)"""
+    field_names = parse_fields(fields)
     query = {"approved": True}
-    if search:
-        query["name"] = {"$regex": search, "$options": "i"}
+    search = search.strip()
+    ranked_ids = None
+    if search and search_index.handles(search, search_mode):
+        ranked_ids, search_matches = search_index.search(search)
+        search_filter = {"id": {"$in": ranked_ids}}
+    else:
+        search_filter = build_search_filter(search, search_mode) if search else None
+    if search_filter:
+        query.update(search_filter)
 
-    total = await db.downloads.count_documents(query)
-    pages = (total + limit - 1) // limit
+    total_mode = parse_include_total(include_total)
+    if ranked_ids is not None:
+        total, total_estimated = await count_search_results(query, search, ranked_ids, search_matches, total_mode)
+    else:
+        total, total_estimated = await count_downloads(query, total_mode)
+    # Paging reaches the ranked ids only, though the total counts every match
+    reachable = min(total, len(ranked_ids)) if total is not None and ranked_ids is not None else total
+    pages = (reachable + limit - 1) // limit if reachable is not None else None
     skip = (page - 1) * limit
 
-    items = await db.downloads.find(query, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+    projection = sparse_projection(field_names, DOWNLOAD_PROJECTION)
+    items = await db.downloads.find(query, projection).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
 
-    return {
-        "items": items,
+    return fast_response({
+        "items": sparse_items(items, field_names),
         "total": total,
         "page": page,
-        "pages": pages
-    }
+        "pages": pages,
+        "total_estimated": total_estimated
+    })
 
 
 @router.delete("/downloads/{download_id}")
 async def delete_download(download_id: str):
     """Delete a download"""
-    result = await db.downloads.delete_one({"id": download_id})
-    if result.deleted_count == 0:
+    if not await remove_download(download_id):
         raise HTTPException(status_code=404, detail="Download not found")
     return {"success": True, "message": "Download deleted"}
 
 
+# ===== METRICS =====
+
+@router.get("/metrics")
+async def get_metrics():
+    """Get in-process performance counters for this worker"""
+    return {
+        "click_tracking": click_tracker.stats(),
+        "recaptcha": recaptcha_verifier.stats(),
+        "email_outbox": await outbox_stats(),
+        "search_index": search_index.stats(),
+        "suggestions": suggestions.stats(),
+        "response_cache": response_cache_stats(),
+        "migrations": await migration_status()
+    }
+
+
 # ===== SPONSORED ANALYTICS =====
 
 @router.get("/sponsored/analytics")
 async def get_sponsored_analytics():
     """Get click analytics for all sponsored downloads"""
-    settings = await fetch_site_settings()
+    settings = await get_site_settings()
     sponsored = settings.get("sponsored_downloads", [])
     
-    analytics = []
-    for item in sponsored:
-        item_id = item.get("id", "")
-        
-        # Get total clicks
-        total_clicks = await db.sponsored_clicks.count_documents({"sponsored_id": item_id})
-        
-        # Get clicks in last 24 hours
-        day_ago = (datetime.now(timezone.utc) - timedelta(hours=24)).isoformat()
-        clicks_24h = await db.sponsored_clicks.count_documents({
-            "sponsored_id": item_id,
-            "timestamp": {"$gte": day_ago}
-        })
-        
-        # Get clicks in last 7 days
-        week_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-        clicks_7d = await db.sponsored_clicks.count_documents({
-            "sponsored_id": item_id,
-            "timestamp": {"$gte": week_ago}
-        })
-        
-        analytics.append({
-            "id": item_id,
-            "name": item.get("name", "Unknown"),
-            "total_clicks": total_clicks,
-            "clicks_24h": clicks_24h,
-            "clicks_7d": clicks_7d
-        })
+    counts = await sponsored_click_counts([item.get("id", "") for item in sponsored])
+    empty = {"total_clicks": 0, "clicks_24h": 0, "clicks_7d": 0}
+    analytics = [
+        {"id": item.get("id", ""), "name": item.get("name", "Unknown"), **counts.get(item.get("id", ""), empty)}
+        for item in sponsored
+    ]
     
     return {"analytics": analytics}
 
@@ -385,6 +409,7 @@ async def create_category(category: CategoryCreate):
     
     cat_obj = Category(name=category.name, type=category.type)
     await db.categories.insert_one(cat_obj.model_dump())
+    await bump_version(CATEGORIES_VERSION_KEY)
     return cat_obj.model_dump()
 
 
@@ -394,6 +419,7 @@ async def delete_category(category_id: str):
     result = await db.categories.delete_one({"id": category_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    await bump_version(CATEGORIES_VERSION_KEY)
     return {"success": True}
 
 
@@ -402,7 +428,7 @@ async def delete_category(category_id: str):
 @router.post("/resend/test")
 async def resend_test_email():
     """Send test email via Resend"""
-    settings = await fetch_site_settings()
+    settings = await get_site_settings()
     if not settings.get("admin_email"):
         raise HTTPException(status_code=400, detail="Admin email is not configured")
 
@@ -423,18 +449,19 @@ async def resend_test_email():
 @router.put("/resend")
 async def update_resend_settings(update: ResendSettingsUpdate):
     """Update Resend settings"""
-    settings = await fetch_site_settings()
+    changes = {}
 
     if update.resend_api_key is not None:
-        settings["resend_api_key"] = update.resend_api_key.strip() or None
+        changes["resend_api_key"] = update.resend_api_key.strip() or None
 
     if update.resend_sender_email is not None:
-        settings["resend_sender_email"] = update.resend_sender_email.strip() or None
+        changes["resend_sender_email"] = update.resend_sender_email.strip() or None
 
-    await db.site_settings.update_one({"id": "site_settings"}, {"$set": settings}, upsert=True)
+    if changes:
+        await save_site_settings(changes)
+    settings = await fetch_site_settings()
 
     # never return api key in response
-    settings = dict(settings)
     settings["resend_api_key"] = None
     settings["recaptcha_secret_key"] = None
     return settings
@@ -446,87 +473,95 @@ async def update_resend_settings(update: ResendSettingsUpdate):
 async def update_site_settings(update: SiteSettingsUpdate):
     """Update site settings"""
     settings = await fetch_site_settings()
+    changes = {}
     
     if update.daily_submission_limit is not None:
-        settings["daily_submission_limit"] = max(5, min(100, update.daily_submission_limit))
+        changes["daily_submission_limit"] = max(5, min(100, update.daily_submission_limit))
     
     if update.top_downloads_enabled is not None:
-        settings["top_downloads_enabled"] = update.top_downloads_enabled
+        changes["top_downloads_enabled"] = update.top_downloads_enabled
     
     if update.top_downloads_count is not None:
-        settings["top_downloads_count"] = max(5, min(20, update.top_downloads_count))
+        changes["top_downloads_count"] = max(5, min(20, update.top_downloads_count))
     
     if update.sponsored_downloads is not None:
-        settings["sponsored_downloads"] = update.sponsored_downloads[:5]
+        changes["sponsored_downloads"] = update.sponsored_downloads[:5]
 
     if update.recaptcha_site_key is not None:
-        settings["recaptcha_site_key"] = update.recaptcha_site_key.strip() or None
+        changes["recaptcha_site_key"] = update.recaptcha_site_key.strip() or None
 
     if update.recaptcha_secret_key is not None:
-        settings["recaptcha_secret_key"] = update.recaptcha_secret_key.strip() or None
+        changes["recaptcha_secret_key"] = update.recaptcha_secret_key.strip() or None
 
     if update.recaptcha_enable_submit is not None:
-        settings["recaptcha_enable_submit"] = bool(update.recaptcha_enable_submit)
+        changes["recaptcha_enable_submit"] = bool(update.recaptcha_enable_submit)
 
     if update.recaptcha_enable_auth is not None:
-        settings["recaptcha_enable_auth"] = bool(update.recaptcha_enable_auth)
+        changes["recaptcha_enable_auth"] = bool(update.recaptcha_enable_auth)
 
     # If either toggle is enabled, require both keys
-    if (settings.get("recaptcha_enable_submit") or settings.get("recaptcha_enable_auth")) and (
-        not settings.get("recaptcha_site_key") or not settings.get("recaptcha_secret_key")
+    merged = {**settings, **changes}
+    if (merged.get("recaptcha_enable_submit") or merged.get("recaptcha_enable_auth")) and (
+        not merged.get("recaptcha_site_key") or not merged.get("recaptcha_secret_key")
     ):
         raise HTTPException(status_code=400, detail="reCAPTCHA keys are required when enabling reCAPTCHA")
 
     # Branding / typography
     if update.site_name is not None:
-        settings["site_name"] = update.site_name.strip() or None
+        changes["site_name"] = update.site_name.strip() or None
 
     if update.site_name_font_family is not None:
-        settings["site_name_font_family"] = update.site_name_font_family
+        changes["site_name_font_family"] = update.site_name_font_family
 
     if update.site_name_font_weight is not None:
-        settings["site_name_font_weight"] = update.site_name_font_weight
+        changes["site_name_font_weight"] = update.site_name_font_weight
 
     if update.site_name_font_color is not None:
-        settings["site_name_font_color"] = update.site_name_font_color
+        changes["site_name_font_color"] = update.site_name_font_color
 
     if update.body_font_family is not None:
-        settings["body_font_family"] = update.body_font_family
+        changes["body_font_family"] = update.body_font_family
 
     if update.body_font_weight is not None:
-        settings["body_font_weight"] = update.body_font_weight
+        changes["body_font_weight"] = update.body_font_weight
 
     # Footer
     if update.footer_enabled is not None:
-        settings["footer_enabled"] = bool(update.footer_enabled)
+        changes["footer_enabled"] = bool(update.footer_enabled)
 
     if update.footer_line1_template is not None:
-        settings["footer_line1_template"] = update.footer_line1_template
+        changes["footer_line1_template"] = update.footer_line1_template
 
     if update.footer_line2_template is not None:
-        settings["footer_line2_template"] = update.footer_line2_template
+        changes["footer_line2_template"] = update.footer_line2_template
 
     # Trending downloads settings
     if update.trending_downloads_enabled is not None:
-        settings["trending_downloads_enabled"] = bool(update.trending_downloads_enabled)
+        changes["trending_downloads_enabled"] = bool(update.trending_downloads_enabled)
 
     if update.trending_downloads_count is not None:
-        settings["trending_downloads_count"] = max(5, min(20, update.trending_downloads_count))
+        changes["trending_downloads_count"] = max(5, min(20, update.trending_downloads_count))
 
     # Submissions workflow
     if update.auto_approve_submissions is not None:
-        settings["auto_approve_submissions"] = bool(update.auto_approve_submissions)
+        changes["auto_approve_submissions"] = bool(update.auto_approve_submissions)
 
     # Admin email (can be updated anytime)
     if update.admin_email is not None:
-        settings["admin_email"] = update.admin_email.lower().strip() if update.admin_email else None
+        changes["admin_email"] = update.admin_email.lower().strip() if update.admin_email else None
 
-    await db.site_settings.update_one(
-        {"id": "site_settings"},
-        {"$set": settings},
-        upsert=True
-    )
-    return settings
+    if changes:
+        await save_site_settings(changes)
+    return {**settings, **changes}
+
+
+# ===== FACET COUNTS =====
+
+@router.post("/facets/rebuild")
+async def rebuild_facets():
+    """Recompute tag and facet counts from the downloads collection"""
+    await rebuild_facet_counts()
+    return {"success": True}
 
 
 # ===== SEED DATABASE =====
@@ -538,8 +573,6 @@ async def seed_database():
     if count >= 5000:
         return {"success": False, "message": f"Database already has {count} items"}
     
-    await db.downloads.delete_many({})
-    
     # Seed default categories
     default_categories = [
         {"name": "Action", "type": "game"}, {"name": "RPG", "type": "game"}, {"name": "Strategy", "type": "game"},
@@ -557,6 +590,7 @@ async def seed_database():
         if not existing:
             cat_obj = Category(name=cat["name"], type=cat["type"])
             await db.categories.insert_one(cat_obj.model_dump())
+    await bump_version(CATEGORIES_VERSION_KEY)
     
     # Sample data generators
     game_prefixes = ["Super", "Mega", "Ultra", "Epic", "Cyber", "Dark", "Shadow", "Crystal", "Dragon", "Space"]
@@ -604,9 +638,9 @@ async def seed_database():
             "name": name,
             "download_link": f"https://example.com/games/{uuid.uuid4().hex[:8]}",
             "type": "game",
-            "submission_date": date.strftime("%Y-%m-%d"),
+            "submission_date": date.replace(hour=0, minute=0, second=0, microsecond=0),
             "approved": True,
-            "created_at": date.isoformat(),
+            "created_at": date,
             "download_count": random.randint(0, 50000),
             "file_size": size,
             "file_size_bytes": size_bytes,
@@ -632,9 +666,9 @@ async def seed_database():
             "name": name,
             "download_link": f"https://example.com/software/{uuid.uuid4().hex[:8]}",
             "type": "software",
-            "submission_date": date.strftime("%Y-%m-%d"),
+            "submission_date": date.replace(hour=0, minute=0, second=0, microsecond=0),
             "approved": True,
-            "created_at": date.isoformat(),
+            "created_at": date,
             "download_count": random.randint(0, 100000),
             "file_size": size,
             "file_size_bytes": size_bytes,
@@ -665,9 +699,9 @@ async def seed_database():
             "name": name,
             "download_link": f"https://example.com/movies/{uuid.uuid4().hex[:8]}",
             "type": "movie",
-            "submission_date": date.strftime("%Y-%m-%d"),
+            "submission_date": date.replace(hour=0, minute=0, second=0, microsecond=0),
             "approved": True,
-            "created_at": date.isoformat(),
+            "created_at": date,
             "download_count": random.randint(0, 75000),
             "file_size": size,
             "file_size_bytes": size_bytes,
@@ -697,9 +731,9 @@ async def seed_database():
                     "name": name,
                     "download_link": f"https://example.com/tv/{uuid.uuid4().hex[:8]}",
                     "type": "tv_show",
-                    "submission_date": date.strftime("%Y-%m-%d"),
+                    "submission_date": date.replace(hour=0, minute=0, second=0, microsecond=0),
                     "approved": True,
-                    "created_at": date.isoformat(),
+                    "created_at": date,
                     "download_count": random.randint(0, 30000),
                     "file_size": size,
                     "file_size_bytes": size_bytes,
@@ -714,15 +748,9 @@ async def seed_database():
     
     downloads = downloads[:5000]
     
-    if downloads:
-        await db.downloads.insert_many(downloads)
+    await replace_downloads(downloads)
     
-    # Create indexes
-    await db.downloads.create_index([("name", "text")])
-    await db.downloads.create_index([("type", 1)])
-    await db.downloads.create_index([("approved", 1)])
-    await db.downloads.create_index([("category", 1)])
-    await db.downloads.create_index([("tags", 1)])
-    await db.downloads.create_index([("file_size_bytes", 1)])
+    # Indexes are normally created at startup; this covers a fresh database
+    await ensure_indexes()
     
     return {"success": True, "message": f"Seeded {len(downloads)} downloads with categories and tags"}
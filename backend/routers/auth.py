@@ -3,9 +3,10 @@ from fastapi import APIRouter, HTTPException, Request
 from datetime import datetime, timezone, timedelta
 
 from services.database import db, FRONTEND_URL
-from services.email import fetch_site_settings, send_email_via_resend
+from services.email import send_email_via_resend
+from services.settings import get_site_settings
 from services.captcha import verify_recaptcha, verify_captcha, generate_captcha_challenge
-from services.utils import hash_password, generate_token
+from services.utils import hash_password, generate_token, as_utc
 from models.schemas import (
     UserRegister, UserLogin, User,
     UserForgotPasswordRequest, PasswordResetConfirmRequest
@@ -17,7 +18,7 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 @router.post("/register")
 async def register_user(user: UserRegister, request: Request):
     """Register a new user"""
-    settings = await fetch_site_settings()
+    settings = await get_site_settings()
 
     # Verify captcha (math) OR reCAPTCHA depending on admin settings
     if settings.get("recaptcha_enable_auth"):
@@ -60,7 +61,7 @@ async def register_user(user: UserRegister, request: Request):
 @router.post("/login")
 async def login_user(user: UserLogin, request: Request):
     """Login user"""
-    settings = await fetch_site_settings()
+    settings = await get_site_settings()
 
     if settings.get("recaptcha_enable_auth"):
         if not settings.get("recaptcha_site_key") or not settings.get("recaptcha_secret_key"):
@@ -109,12 +110,12 @@ async def user_forgot_password(payload: UserForgotPasswordRequest):
 
     token = generate_token()
     now = datetime.now(timezone.utc)
-    expires_at = (now + timedelta(minutes=30)).isoformat()
+    expires_at = now + timedelta(minutes=30)
 
     await db.user_password_resets.insert_one({
         "token": token,
         "user_id": user["id"],
-        "created_at": now.isoformat(),
+        "created_at": now,
         "expires_at": expires_at
     })
 
@@ -141,11 +142,8 @@ async def user_reset_password(payload: PasswordResetConfirmRequest):
     if not req:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
-    try:
-        exp = datetime.fromisoformat(req["expires_at"])
-    except Exception:
-        exp = datetime.now(timezone.utc)
-    if exp < datetime.now(timezone.utc):
+    exp = as_utc(req.get("expires_at"))
+    if exp is None or exp < datetime.now(timezone.utc):
         await db.user_password_resets.delete_one({"token": payload.token})
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
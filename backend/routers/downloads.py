@@ -1,12 +1,27 @@
 """Downloads router - public download endpoints"""
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 
 from services.database import db
-from services.email import fetch_site_settings
-from services.utils import parse_file_size_to_bytes
-from models.schemas import PaginatedDownloads, Download, ThemeSettings, ThemeUpdate
+from services.settings import SETTINGS_VERSION_KEY, get_site_settings, public_site_settings, thaw
+from services.utils import parse_file_size_to_bytes, parse_day
+from services.pagination import fetch_keyset_page, resolve_sort
+from services.catalog import (
+    count_downloads, count_search_results, search_total, parse_include_total, get_catalog_stats
+)
+from services.click_tracker import click_tracker, download_counts_changed
+from services.versions import (
+    CATALOG_VERSION_KEY, CATEGORIES_VERSION_KEY, COUNTS_VERSION_KEY, THEME_VERSION_KEY, bump_version
+)
+from services.response_cache import cached_response
+from services.leaderboards import get_leaderboard
+from services.facets import FACETS, top_tags, top_facet_values, parse_listing_facets, fetch_page_with_facets
+from services.responses import DOWNLOAD_PROJECTION, parse_fields, sparse_projection, sparse_items, fast_response
+from services.search import build_search_filter, build_highlights, fetch_relevance_page
+from services.search_index import search_index, fetch_ranked_page
+from services.suggest import get_suggestions
+from models.schemas import PaginatedDownloads, ThemeSettings, ThemeUpdate
 
 router = APIRouter(tags=["downloads"])
 
@@ -17,6 +32,7 @@ async def root():
 
 
 @router.get("/downloads", response_model=PaginatedDownloads)
+@cached_response(CATALOG_VERSION_KEY, COUNTS_VERSION_KEY)
 async def get_downloads(
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=100),
@@ -28,15 +44,33 @@ async def get_downloads(
     size_min: Optional[str] = None,
     size_max: Optional[str] = None,
     category: Optional[str] = None,
-    tags: Optional[str] = None
+    tags: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: Optional[str] = Query("true"),
+    search_mode: str = Query("substring", pattern="^(text|substring)$"),
+    facets: Optional[str] = None,
+    fields: Optional[str] = None
 ):
     skip = (page - 1) * limit
+    facet_names = parse_listing_facets(facets)
+    field_names = parse_fields(fields)
+    # Cursors are built from the sort key, so it is read even when not requested
+    projection = sparse_projection(field_names, DOWNLOAD_PROJECTION, extra=[resolve_sort(sort_by)[1]])
     query = {"approved": True}
+    search = search.strip() if search else None
     
     if type_filter and type_filter != "all":
         query["type"] = type_filter
-    if search and search.strip():
-        query["name"] = {"$regex": search.strip(), "$options": "i"}
+    search_filter = None
+    ranked_ids = None
+    if search and search_index.handles(search, search_mode):
+        # In-memory index: matching ids, best first, filtered and paged below
+        ranked_ids, search_matches = search_index.search(search)
+        search_filter = {"id": {"$in": ranked_ids}}
+    elif search:
+        search_filter = build_search_filter(search, search_mode)
+    if search_filter:
+        query.update(search_filter)
     if category:
         query["category"] = category
     if tags:
@@ -48,9 +82,9 @@ async def get_downloads(
     if date_from or date_to:
         date_query = {}
         if date_from:
-            date_query["$gte"] = date_from
+            date_query["$gte"] = parse_day(date_from)
         if date_to:
-            date_query["$lte"] = date_to
+            date_query["$lt"] = parse_day(date_to, end_of_day=True)
         if date_query:
             query["submission_date"] = date_query
     
@@ -68,38 +102,68 @@ async def get_downloads(
         if size_query:
             query["file_size_bytes"] = size_query
     
-    # Sorting
-    sort_field = "created_at"
-    sort_order = -1
-    if sort_by == "date_desc":
-        sort_field, sort_order = "created_at", -1
-    elif sort_by == "date_asc":
-        sort_field, sort_order = "created_at", 1
-    elif sort_by == "downloads_desc":
-        sort_field, sort_order = "download_count", -1
-    elif sort_by == "downloads_asc":
-        sort_field, sort_order = "download_count", 1
-    elif sort_by == "name_asc":
-        sort_field, sort_order = "name", 1
-    elif sort_by == "name_desc":
-        sort_field, sort_order = "name", -1
-    elif sort_by == "size_desc":
-        sort_field, sort_order = "file_size_bytes", -1
-    elif sort_by == "size_asc":
-        sort_field, sort_order = "file_size_bytes", 1
-    
-    total = await db.downloads.count_documents(query)
-    pages = max((total + limit - 1) // limit, 1)
+    total_mode = parse_include_total(include_total)
+    relevance = sort_by == "relevance" and (ranked_ids is not None or (search_filter and "$text" in search_filter))
+    if relevance and cursor:
+        # Relevance is not a stored field, so it pages by offset only
+        raise HTTPException(status_code=400, detail="Cursor paging is not available for sort_by=relevance")
+
+    facet_counts = None
+    if facet_names:
+        # Page (unless ranked by relevance), counts and exact total in one aggregation
+        result = await fetch_page_with_facets(
+            db.downloads, query, projection, facet_names, sort_by, limit,
+            cursor=cursor, skip=skip, with_page=not relevance, with_total=total_mode != "none"
+        )
+        facet_counts = result["facets"]
+        total, total_estimated = result.get("total"), False
+        if ranked_ids is not None:
+            total, total_estimated = search_total(query, total, False, ranked_ids, search_matches)
+    elif ranked_ids is not None:
+        total, total_estimated = await count_search_results(query, search, ranked_ids, search_matches, total_mode)
+    else:
+        total, total_estimated = await count_downloads(query, total_mode)
+    # Paging reaches the ranked ids only, though the total counts every match
+    reachable = min(total, len(ranked_ids)) if total is not None and ranked_ids is not None else total
+    pages = max((reachable + limit - 1) // limit, 1) if reachable is not None else None
     
-    downloads = await db.downloads.find(query, {"_id": 0}).sort(sort_field, sort_order).skip(skip).limit(limit).to_list(limit)
+    if relevance:
+        if ranked_ids is not None:
+            items = await fetch_ranked_page(db.downloads, query, ranked_ids, projection, limit, skip)
+        else:
+            items = await fetch_relevance_page(db.downloads, query, projection, limit, skip)
+        result = {"items": items, "next_cursor": None, "prev_cursor": None}
+    elif not facet_names:
+        # Keyset paging when a cursor is given, offset paging otherwise
+        result = await fetch_keyset_page(
+            db.downloads, query, projection, sort_by, limit, cursor=cursor, skip=skip
+        )
     
-    return PaginatedDownloads(items=downloads, total=total, page=page, pages=pages)
+    return fast_response({
+        "items": sparse_items(result["items"], field_names),
+        "total": total,
+        "page": page,
+        "pages": pages,
+        "total_estimated": total_estimated,
+        "next_cursor": result["next_cursor"],
+        "prev_cursor": result["prev_cursor"],
+        "highlights": build_highlights(result["items"], search) if search_filter and search_mode == "text" else None,
+        "facets": facet_counts
+    })
+
+
+@router.get("/downloads/suggest")
+@cached_response(CATALOG_VERSION_KEY)
+async def suggest_downloads(q: str = Query("", max_length=100), limit: int = Query(8, ge=1, le=20)):
+    """Search-box suggestions: download names and tags matching the prefix `q`"""
+    return fast_response({"q": q, "suggestions": await get_suggestions(q, limit)})
 
 
 @router.get("/downloads/top")
-async def get_top_downloads():
+async def get_top_downloads(fields: Optional[str] = None):
     """Get top downloads including sponsored"""
-    settings = await fetch_site_settings()
+    field_names = parse_fields(fields)
+    settings = await get_site_settings()
     
     enabled = settings.get("top_downloads_enabled", True)
     count = settings.get("top_downloads_count", 5)
@@ -108,20 +172,17 @@ async def get_top_downloads():
     if not enabled:
         return {"enabled": False, "items": [], "sponsored": []}
     
+    # Served from the periodically refreshed snapshot
+    leaderboard = await get_leaderboard("top")
     remaining_count = max(0, count - len(sponsored))
-    top = []
-    if remaining_count > 0:
-        top = await db.downloads.find(
-            {"approved": True},
-            {"_id": 0}
-        ).sort("download_count", -1).limit(remaining_count).to_list(remaining_count)
     
-    return {
+    return fast_response({
         "enabled": True,
-        "sponsored": sponsored[:5],
-        "items": top,
-        "total_slots": count
-    }
+        "sponsored": thaw(sponsored[:5]),
+        "items": sparse_items(leaderboard["items"][:remaining_count], field_names),
+        "total_slots": count,
+        "generated_at": leaderboard["generated_at"]
+    })
 
 
 @router.post("/downloads/{download_id}/increment")
@@ -133,13 +194,15 @@ async def increment_download_count(download_id: str):
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Download not found")
+    await download_counts_changed()
     return {"success": True}
 
 
 @router.get("/downloads/trending")
-async def get_trending_downloads():
+async def get_trending_downloads(fields: Optional[str] = None):
     """Get trending downloads based on recent activity"""
-    settings = await fetch_site_settings()
+    field_names = parse_fields(fields)
+    settings = await get_site_settings()
     
     enabled = settings.get("trending_downloads_enabled", False)
     count = settings.get("trending_downloads_count", 5)
@@ -147,64 +210,24 @@ async def get_trending_downloads():
     if not enabled:
         return {"enabled": False, "items": []}
     
-    # Get downloads with activity in the last 7 days
-    seven_days_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-    
-    # Aggregate recent download activity
-    pipeline = [
-        {"$match": {"timestamp": {"$gte": seven_days_ago}}},
-        {"$group": {"_id": "$download_id", "recent_count": {"$sum": 1}}},
-        {"$sort": {"recent_count": -1}},
-        {"$limit": count}
-    ]
-    
-    trending_ids = []
-    async for doc in db.download_activity.aggregate(pipeline):
-        trending_ids.append(doc["_id"])
-    
-    # Fetch the actual download documents
-    trending = []
-    if trending_ids:
-        trending = await db.downloads.find(
-            {"id": {"$in": trending_ids}, "approved": True},
-            {"_id": 0}
-        ).to_list(count)
-        
-        # Sort by the order of trending_ids (most active first)
-        id_to_download = {d["id"]: d for d in trending}
-        trending = [id_to_download[tid] for tid in trending_ids if tid in id_to_download]
+    # Served from the periodically refreshed snapshot
+    leaderboard = await get_leaderboard("trending")
     
-    # If we don't have enough trending data, fall back to most downloaded overall
-    if len(trending) < count:
-        existing_ids = [t["id"] for t in trending]
-        fallback = await db.downloads.find(
-            {"approved": True, "id": {"$nin": existing_ids}},
-            {"_id": 0}
-        ).sort("download_count", -1).limit(count - len(trending)).to_list(count)
-        trending.extend(fallback)
-    
-    return {
+    return fast_response({
         "enabled": True,
-        "items": trending[:count]
-    }
+        "items": sparse_items(leaderboard["items"][:count], field_names),
+        "generated_at": leaderboard["generated_at"]
+    })
 
 
 @router.post("/downloads/{download_id}/track")
 async def track_download_activity(download_id: str):
     """Track a download click for trending calculation"""
-    # First increment the download count
-    result = await db.downloads.update_one(
-        {"id": download_id},
-        {"$inc": {"download_count": 1}}
-    )
-    if result.matched_count == 0:
+    if not await click_tracker.is_known(download_id):
         raise HTTPException(status_code=404, detail="Download not found")
     
-    # Also record the activity for trending calculation
-    await db.download_activity.insert_one({
-        "download_id": download_id,
-        "timestamp": datetime.now(timezone.utc).isoformat()
-    })
+    # Count and activity event are written in batches by the click tracker
+    click_tracker.record(download_id)
     
     return {"success": True}
 
@@ -214,13 +237,14 @@ async def track_sponsored_click(sponsored_id: str):
     """Track a click on a sponsored download"""
     await db.sponsored_clicks.insert_one({
         "sponsored_id": sponsored_id,
-        "timestamp": datetime.now(timezone.utc).isoformat()
+        "timestamp": datetime.now(timezone.utc)
     })
     return {"success": True}
 
 
 # Theme endpoints
 @router.get("/theme", response_model=ThemeSettings)
+@cached_response(THEME_VERSION_KEY)
 async def get_theme():
     """Get current theme settings"""
     theme = await db.theme.find_one({"id": "global_theme"}, {"_id": 0})
@@ -245,11 +269,13 @@ async def update_theme(update: ThemeUpdate):
         {"$set": current},
         upsert=True
     )
+    await bump_version(THEME_VERSION_KEY)
     return ThemeSettings(**current)
 
 
 # Categories and Tags
 @router.get("/categories")
+@cached_response(CATEGORIES_VERSION_KEY)
 async def get_categories(type_filter: Optional[str] = None):
     """Get all categories"""
     query = {}
@@ -260,37 +286,36 @@ async def get_categories(type_filter: Optional[str] = None):
 
 
 @router.get("/tags")
+@cached_response(CATALOG_VERSION_KEY)
 async def get_popular_tags(limit: int = Query(50, ge=1, le=100)):
     """Get popular tags from downloads"""
-    pipeline = [
-        {"$match": {"approved": True}},
-        {"$unwind": "$tags"},
-        {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": limit}
-    ]
-    tags = []
-    async for doc in db.downloads.aggregate(pipeline):
-        tags.append({"name": doc["_id"], "count": doc["count"]})
-    return tags
+    return await top_tags(limit)
+
+
+@router.get("/facets/{facet}")
+@cached_response(CATALOG_VERSION_KEY)
+async def get_facet_counts(facet: str, limit: int = Query(50, ge=1, le=100)):
+    """Get download counts per value of a facet (type or category)"""
+    if facet not in FACETS:
+        raise HTTPException(status_code=404, detail="Unknown facet")
+    return await top_facet_values(facet, limit)
 
 
 # Public settings
 @router.get("/settings")
+@cached_response(SETTINGS_VERSION_KEY)
 async def get_site_settings_public():
     """Get public site settings (excluding sensitive data)"""
-    settings = await fetch_site_settings()
+    settings = await get_site_settings()
     # Remove sensitive fields
-    settings.pop("resend_api_key", None)
-    settings.pop("recaptcha_secret_key", None)
-    settings.pop("admin_password_hash", None)
-    return settings
+    return public_site_settings(settings)
 
 
 @router.get("/recaptcha/settings")
+@cached_response(SETTINGS_VERSION_KEY)
 async def get_recaptcha_settings_public():
     """Get reCAPTCHA settings for frontend"""
-    settings = await fetch_site_settings()
+    settings = await get_site_settings()
     return {
         "site_key": settings.get("recaptcha_site_key"),
         "enable_submit": settings.get("recaptcha_enable_submit", False),
@@ -300,26 +325,7 @@ async def get_recaptcha_settings_public():
 
 # Stats
 @router.get("/stats")
+@cached_response(CATALOG_VERSION_KEY, COUNTS_VERSION_KEY)
 async def get_stats():
     """Get download statistics"""
-    total = await db.downloads.count_documents({"approved": True})
-    games = await db.downloads.count_documents({"approved": True, "type": "game"})
-    software = await db.downloads.count_documents({"approved": True, "type": "software"})
-    movies = await db.downloads.count_documents({"approved": True, "type": "movie"})
-    tv_shows = await db.downloads.count_documents({"approved": True, "type": "tv_show"})
-    
-    # Get total downloads
-    result = await db.downloads.aggregate([
-        {"$match": {"approved": True}},
-        {"$group": {"_id": None, "total_downloads": {"$sum": "$download_count"}}}
-    ]).to_list(1)
-    total_downloads = result[0]["total_downloads"] if result else 0
-    
-    return {
-        "total": total,
-        "games": games,
-        "software": software,
-        "movies": movies,
-        "tv_shows": tv_shows,
-        "total_downloads": total_downloads
-    }
+    return await get_catalog_stats()
@@ -1,15 +1,16 @@
 """Submissions router - public submission endpoints"""
-import asyncio
 from fastapi import APIRouter, HTTPException, Request
-from datetime import datetime, timezone
+from pymongo.errors import BulkWriteError, PyMongoError
 
 from services.database import db
 from services.email import (
-    fetch_site_settings, send_submission_email, 
-    send_bulk_submission_email, send_admin_submissions_summary
+    send_submission_email, send_bulk_submission_email, send_admin_submissions_summary
 )
+from services.settings import get_site_settings
 from services.captcha import verify_recaptcha, verify_captcha, generate_captcha_challenge
-from services.utils import parse_file_size_to_bytes, validate_http_url
+from services.utils import parse_file_size_to_bytes, validate_http_url, utc_today
+from services.catalog import add_downloads
+from services.rate_limit import allow_burst, reserve_submissions, release_submissions, get_used_submissions
 from models.schemas import (
     Submission, SubmissionCreate, BulkSubmissionCreate, Download
 )
@@ -26,7 +27,11 @@ async def get_captcha():
 @router.post("/submissions", response_model=Submission)
 async def create_submission(submission: SubmissionCreate, request: Request):
     """Create a new submission"""
-    settings = await fetch_site_settings()
+    client_ip = request.client.host if request.client else "anonymous"
+    if not allow_burst(client_ip):
+        raise HTTPException(status_code=429, detail="Too many requests. Please slow down.")
+
+    settings = await get_site_settings()
 
     # If reCAPTCHA is enabled, require keys to be present
     if settings.get("recaptcha_enable_submit"):
@@ -44,26 +49,17 @@ async def create_submission(submission: SubmissionCreate, request: Request):
         if not await verify_captcha(submission.captcha_id, submission.captcha_answer):
             raise HTTPException(status_code=400, detail="Invalid captcha. Please try again.")
     
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    today = utc_today()
     
     # Get rate limit settings
     daily_limit = settings.get("daily_submission_limit", 10)
     
-    # Check rate limit by IP
-    client_ip = request.client.host if request.client else "anonymous"
-    rate_entry = await db.rate_limits.find_one({"ip_address": client_ip, "date": today}, {"_id": 0})
-    
-    if rate_entry and rate_entry.get("count", 0) >= daily_limit:
+    # Check and consume the IP's daily quota in one step
+    if not await reserve_submissions(client_ip, 1, daily_limit):
         raise HTTPException(
             status_code=429, 
             detail=f"Daily submission limit ({daily_limit}) reached. Try again tomorrow."
         )
-    # Update rate limit counter
-    await db.rate_limits.update_one(
-        {"ip_address": client_ip, "date": today},
-        {"$inc": {"count": 1}},
-        upsert=True
-    )
 
     # Parse file size to bytes
     file_size_bytes = parse_file_size_to_bytes(submission.file_size) if submission.file_size else None
@@ -85,13 +81,18 @@ async def create_submission(submission: SubmissionCreate, request: Request):
     )
 
     doc = submission_obj.model_dump()
-    await db.submissions.insert_one(doc)
+    try:
+        await db.submissions.insert_one(doc)
+    except PyMongoError:
+        # Nothing was stored, so it does not count against the quota
+        await release_submissions(client_ip, 1)
+        raise
 
-    # Emails (one per request)
+    # Emails are queued in the outbox; the admin summary joins the current digest
     if submission.submitter_email:
-        asyncio.create_task(send_submission_email(submission.submitter_email, doc))
+        await send_submission_email(submission.submitter_email, doc)
 
-    asyncio.create_task(send_admin_submissions_summary([doc]))
+    await send_admin_submissions_summary([doc])
 
     # auto-approve if enabled
     if settings.get("auto_approve_submissions"):
@@ -109,7 +110,7 @@ async def create_submission(submission: SubmissionCreate, request: Request):
             site_name=doc.get("site_name"),
             site_url=doc.get("site_url")
         )
-        await db.downloads.insert_one(download_obj.model_dump())
+        await add_downloads([download_obj.model_dump()])
         await db.submissions.update_one({"id": submission_obj.id}, {"$set": {"status": "approved", "seen_by_admin": True}})
 
     return submission_obj
@@ -118,20 +119,52 @@ async def create_submission(submission: SubmissionCreate, request: Request):
 @router.post("/submissions/bulk")
 async def create_submissions_bulk(payload: BulkSubmissionCreate, request: Request):
     """Create multiple submissions at once"""
-    settings = await fetch_site_settings()
+    client_ip = request.client.host if request.client else "anonymous"
+    if not allow_burst(client_ip):
+        raise HTTPException(status_code=429, detail="Too many requests. Please slow down.")
 
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    daily_limit = settings.get("daily_submission_limit", 10)
+    settings = await get_site_settings()
 
-    client_ip = request.client.host if request.client else "anonymous"
-    rate_entry = await db.rate_limits.find_one({"ip_address": client_ip, "date": today}, {"_id": 0})
-    used = rate_entry.get("count", 0) if rate_entry else 0
+    today = utc_today()
+    daily_limit = settings.get("daily_submission_limit", 10)
 
-    requested_count = len(payload.items)
-    if requested_count <= 0:
+    if not payload.items:
         raise HTTPException(status_code=400, detail="No items provided")
 
-    if used + requested_count > daily_limit:
+    # validate the whole batch up front; invalid items are reported, not fatal
+    docs = []
+    item_indexes = []
+    failed = []
+    for index, s in enumerate(payload.items):
+        try:
+            site_url = validate_http_url(s.site_url)
+        except HTTPException as e:
+            failed.append({"index": index, "name": s.name, "error": e.detail})
+            continue
+        file_size_bytes = parse_file_size_to_bytes(s.file_size) if s.file_size else None
+        submission_obj = Submission(
+            name=s.name,
+            download_link=s.download_link,
+            type=s.type,
+            submission_date=today,
+            seen_by_admin=False,
+            file_size=s.file_size,
+            file_size_bytes=file_size_bytes,
+            description=s.description,
+            category=s.category,
+            tags=s.tags or [],
+            site_name=s.site_name,
+            site_url=site_url,
+            submitter_email=(payload.submitter_email or s.submitter_email)
+        )
+        docs.append(submission_obj.model_dump())
+        item_indexes.append(index)
+
+    if not docs:
+        raise HTTPException(status_code=400, detail=failed[0]["error"])
+
+    requested_count = len(docs)
+    if requested_count > daily_limit:
         raise HTTPException(status_code=429, detail=f"Daily submission limit ({daily_limit}) exceeded")
 
     # captcha / recaptcha verification once for whole batch
@@ -149,46 +182,39 @@ async def create_submissions_bulk(payload: BulkSubmissionCreate, request: Reques
         if not await verify_captcha(payload.captcha_id, payload.captcha_answer):
             raise HTTPException(status_code=400, detail="Invalid captcha. Please try again.")
 
-    # increment rate limit by number of items
-    await db.rate_limits.update_one(
-        {"ip_address": client_ip, "date": today},
-        {"$inc": {"count": requested_count}},
-        upsert=True
-    )
-
-    created_docs = []
-    for s in payload.items:
-        file_size_bytes = parse_file_size_to_bytes(s.file_size) if s.file_size else None
-        submission_obj = Submission(
-            name=s.name,
-            download_link=s.download_link,
-            type=s.type,
-            submission_date=today,
-            seen_by_admin=False,
-            file_size=s.file_size,
-            file_size_bytes=file_size_bytes,
-            description=s.description,
-            category=s.category,
-            tags=s.tags or [],
-            site_name=s.site_name,
-            site_url=validate_http_url(s.site_url),
-            submitter_email=(payload.submitter_email or s.submitter_email)
-        )
-        doc = submission_obj.model_dump()
-        await db.submissions.insert_one(doc)
-        created_docs.append(doc)
-
-    # emails (one per request)
-    email = (payload.submitter_email or '').strip()
-    if email:
-        asyncio.create_task(send_bulk_submission_email(email, created_docs))
+    # reserve quota for all valid items at once
+    if not await reserve_submissions(client_ip, requested_count, daily_limit):
+        raise HTTPException(status_code=429, detail=f"Daily submission limit ({daily_limit}) exceeded")
 
-    asyncio.create_task(send_admin_submissions_summary(created_docs))
+    # one round trip for the whole batch
+    failed_positions = set()
+    try:
+        await db.submissions.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for err in e.details.get("writeErrors", []):
+            failed_positions.add(err["index"])
+            failed.append({
+                "index": item_indexes[err["index"]],
+                "name": docs[err["index"]]["name"],
+                "error": "Failed to save submission"
+            })
+    if failed_positions:
+        await release_submissions(client_ip, len(failed_positions))
+    created_docs = [doc for position, doc in enumerate(docs) if position not in failed_positions]
+    failed.sort(key=lambda f: f["index"])
+
+    if created_docs:
+        # emails are queued in the outbox; the admin summary joins the current digest
+        email = (payload.submitter_email or '').strip()
+        if email:
+            await send_bulk_submission_email(email, created_docs)
+
+        await send_admin_submissions_summary(created_docs)
 
     # auto-approve if enabled
-    if settings.get("auto_approve_submissions"):
-        for doc in created_docs:
-            download_obj = Download(
+    if settings.get("auto_approve_submissions") and created_docs:
+        downloads = [
+            Download(
                 name=doc["name"],
                 download_link=doc["download_link"],
                 type=doc["type"],
@@ -201,25 +227,26 @@ async def create_submissions_bulk(payload: BulkSubmissionCreate, request: Reques
                 tags=doc.get("tags", []),
                 site_name=doc.get("site_name"),
                 site_url=doc.get("site_url")
-            )
-            await db.downloads.insert_one(download_obj.model_dump())
-            await db.submissions.update_one({"id": doc["id"]}, {"$set": {"status": "approved", "seen_by_admin": True}})
+            ).model_dump()
+            for doc in created_docs
+        ]
+        await add_downloads(downloads)
+        await db.submissions.update_many(
+            {"id": {"$in": [doc["id"] for doc in created_docs]}},
+            {"$set": {"status": "approved", "seen_by_admin": True}}
+        )
 
-    return {"success": True, "count": len(created_docs)}
+    return {"success": bool(created_docs), "count": len(created_docs), "failed": failed}
 
 
 @router.get("/submissions/remaining")
 async def get_remaining_submissions(request: Request):
     """Check remaining submissions for today"""
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    
-    settings = await fetch_site_settings()
+    settings = await get_site_settings()
     daily_limit = settings.get("daily_submission_limit", 10)
     
     client_ip = request.client.host if request.client else "anonymous"
-    rate_entry = await db.rate_limits.find_one({"ip_address": client_ip, "date": today}, {"_id": 0})
-    
-    used = rate_entry.get("count", 0) if rate_entry else 0
+    used = await get_used_submissions(client_ip)
     remaining = max(0, daily_limit - used)
     
     return {"daily_limit": daily_limit, "used": used, "remaining": remaining}
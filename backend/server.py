@@ -2,12 +2,25 @@
 Download Portal API - Main Application
 Refactored from monolithic server.py into modular structure
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, APIRouter
 from starlette.middleware.cors import CORSMiddleware
 import os
 import logging
 
-from services.database import client, shutdown_db_client
+from services.database import client, shutdown_db_client, ensure_indexes, ensure_timeseries_collections
+from services.versions import start_version_watcher, stop_version_watcher
+from services.click_tracker import click_tracker
+from services.activity import backfill_activity_rollups
+from services.leaderboards import start_leaderboard_refresher, stop_leaderboard_refresher
+from services.facets import ensure_facet_counts
+from services.search import backfill_search_terms
+from services.search_index import search_index
+from services.suggest import suggestions
+from services.captcha import recaptcha_verifier
+from services.email_outbox import start_email_workers, stop_email_workers
+from services.conditional import ConditionalGetMiddleware
+from services.migrations import start_migrations, stop_migrations
 
 # Import routers
 from routers.downloads import router as downloads_router
@@ -19,11 +32,60 @@ from routers.admin import router as admin_router
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background services on startup and stop them on shutdown"""
+    try:
+        # Before ensure_indexes, which would create the click collections as regular ones
+        await ensure_timeseries_collections()
+    except Exception as e:
+        logger.error(f"Failed to create time-series collections: {str(e)}")
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logger.error(f"Failed to ensure indexes: {str(e)}")
+    try:
+        await click_tracker.load_known_ids()
+        await backfill_activity_rollups()
+    except Exception as e:
+        logger.error(f"Failed to prepare click tracking: {str(e)}")
+    try:
+        await ensure_facet_counts()
+    except Exception as e:
+        logger.error(f"Failed to build facet counts: {str(e)}")
+    try:
+        await backfill_search_terms()
+    except Exception as e:
+        logger.error(f"Failed to backfill search terms: {str(e)}")
+    start_migrations()
+    start_version_watcher()
+    click_tracker.start()
+    start_leaderboard_refresher()
+    start_email_workers()
+    search_index.start()
+    suggestions.start()
+
+    yield
+
+    await suggestions.stop()
+    await search_index.stop()
+    await stop_email_workers()
+    await stop_migrations()
+    # Flush buffered clicks before closing the database connection
+    await stop_leaderboard_refresher()
+    await click_tracker.stop()
+    await stop_version_watcher()
+    await recaptcha_verifier.close()
+    await shutdown_db_client()
+
+
 # Create the main app
 app = FastAPI(
     title="Download Portal API",
     description="API for managing downloads, submissions, and admin functions",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Create a router with the /api prefix
@@ -38,6 +100,9 @@ api_router.include_router(admin_router)
 # Include the main api_router in the app
 app.include_router(api_router)
 
+# ETag / 304 handling; added first so CORS headers also reach 304 responses
+app.add_middleware(ConditionalGetMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -46,9 +111,3 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Close database connection on shutdown"""
-    await shutdown_db_client()
@@ -0,0 +1,96 @@
+"""Download activity rollups and click analytics
+
+Raw click events in the `download_activity` time-series collection expire
+after ACTIVITY_RETENTION_DAYS. Trending reads `download_activity_hourly`
+instead: one counter per download per hour, maintained with $inc as clicks
+are flushed, so a 7-day window touches at most 168 buckets per download no
+matter how much traffic there is. The rollups are rebuilt from the
+time-series collection when missing.
+
+Sponsored click analytics aggregate the `sponsored_clicks` time-series
+collection in one pass.
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List
+
+from pymongo import UpdateOne
+
+from services.database import db, legacy_collection
+
+logger = logging.getLogger(__name__)
+
+TRENDING_WINDOW = timedelta(days=7)
+
+
+def hour_bucket(moment: datetime) -> datetime:
+    """Start of the UTC hour containing `moment`"""
+    return moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+async def record_rollups(events: List[dict]) -> None:
+    """Add click events to their hourly buckets"""
+    counts = Counter((e["download_id"], hour_bucket(e["timestamp"])) for e in events)
+    if not counts:
+        return
+    await db.download_activity_hourly.bulk_write(
+        [UpdateOne({"download_id": download_id, "hour": hour}, {"$inc": {"count": n}}, upsert=True)
+         for (download_id, hour), n in counts.items()],
+        ordered=False
+    )
+
+
+async def trending_download_ids(limit: int, window: timedelta = TRENDING_WINDOW) -> List[str]:
+    """Most clicked download ids over the window, most active first"""
+    since = hour_bucket(datetime.now(timezone.utc) - window)
+    pipeline = [
+        {"$match": {"hour": {"$gte": since}}},
+        {"$group": {"_id": "$download_id", "recent_count": {"$sum": "$count"}}},
+        {"$sort": {"recent_count": -1}},
+        {"$limit": limit}
+    ]
+    return [doc["_id"] async for doc in db.download_activity_hourly.aggregate(pipeline)]
+
+
+async def backfill_activity_rollups(window: timedelta = TRENDING_WINDOW) -> None:
+    """Build hourly buckets from raw events when no rollups exist yet"""
+    if await db.download_activity_hourly.estimated_document_count() > 0:
+        return
+    since = datetime.now(timezone.utc) - window
+    pipeline = [
+        # Events not yet converted by the datetime migration still hold ISO strings
+        {"$match": {"$or": [{"timestamp": {"$gte": since}}, {"timestamp": {"$gte": since.isoformat()}}]}},
+        {"$group": {
+            "_id": {
+                "download_id": "$download_id",
+                "hour": {"$dateTrunc": {"date": {"$toDate": "$timestamp"}, "unit": "hour"}}
+            },
+            "count": {"$sum": 1}
+        }},
+        {"$project": {"_id": 0, "download_id": "$_id.download_id", "hour": "$_id.hour", "count": 1}},
+        # Events still waiting in the legacy collection add to the same buckets
+        {"$merge": {"into": "download_activity_hourly", "on": ["download_id", "hour"],
+                    "whenMatched": [{"$set": {"count": {"$add": ["$count", "$$new.count"]}}}],
+                    "whenNotMatched": "insert"}}
+    ]
+    legacy = legacy_collection("download_activity")
+    for name in ["download_activity"] + await db.list_collection_names(filter={"name": legacy}):
+        await db[name].aggregate(pipeline).to_list(None)
+    logger.info("Backfilled download activity rollups")
+
+
+async def sponsored_click_counts(sponsored_ids: List[str]) -> Dict[str, dict]:
+    """Total, 24-hour and 7-day click counts per sponsored id"""
+    now = datetime.now(timezone.utc)
+    day_ago, week_ago = now - timedelta(hours=24), now - timedelta(days=7)
+    pipeline = [
+        {"$match": {"sponsored_id": {"$in": sponsored_ids}}},
+        {"$group": {
+            "_id": "$sponsored_id",
+            "total_clicks": {"$sum": 1},
+            "clicks_24h": {"$sum": {"$cond": [{"$gte": ["$timestamp", day_ago]}, 1, 0]}},
+            "clicks_7d": {"$sum": {"$cond": [{"$gte": ["$timestamp", week_ago]}, 1, 0]}},
+        }}
+    ]
+    return {doc.pop("_id"): doc async for doc in db.sponsored_clicks.aggregate(pipeline)}
@@ -1,16 +1,110 @@
 """Captcha service"""
+import base64
+import hashlib
+import hmac
+import importlib.util
+import json
+import os
 import random
+import secrets
+import time
 import httpx
 import logging
+from collections import deque
 from datetime import datetime, timezone, timedelta
-from typing import Optional
+from typing import Deque, Dict, Optional, Set
 
 from services.database import db
-from services.email import fetch_site_settings
+from services.cache import TTLCache
+from services.settings import get_site_settings
+from services.utils import as_utc
 from models.schemas import Captcha
 
 logger = logging.getLogger(__name__)
 
+CAPTCHA_TTL_SECONDS = 300
+# "stateless" issues signed tokens and needs no database; "database" stores challenges
+CAPTCHA_MODE = os.environ.get('CAPTCHA_MODE', 'stateless').lower()
+CAPTCHA_SECRET = os.environ.get('CAPTCHA_SECRET', '')
+STATELESS_PREFIX = "s1."
+
+if CAPTCHA_MODE == "stateless" and not CAPTCHA_SECRET:
+    # Every worker must share the signing key, so there is no safe default
+    logger.warning("CAPTCHA_SECRET is not set, falling back to database captchas")
+    CAPTCHA_MODE = "database"
+
+
+class ReplayGuard:
+    """Remembers used token nonces until the tokens expire.
+
+    Nonces are grouped into buckets by expiry minute, and whole buckets are
+    dropped once every token in them has expired.
+    """
+
+    BUCKET_SECONDS = 60
+
+    def __init__(self):
+        self._buckets: Dict[int, Set[str]] = {}
+
+    def use(self, nonce: str, expires_at: int) -> bool:
+        """Mark a nonce as used; False if it already was"""
+        now = int(time.time())
+        for bucket in [b for b in self._buckets if (b + 1) * self.BUCKET_SECONDS < now]:
+            del self._buckets[bucket]
+
+        bucket = self._buckets.setdefault(expires_at // self.BUCKET_SECONDS, set())
+        if nonce in bucket:
+            return False
+        bucket.add(nonce)
+        return True
+
+
+_replay_guard = ReplayGuard()
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(data: bytes) -> bytes:
+    return hmac.new(CAPTCHA_SECRET.encode(), data, hashlib.sha256).digest()
+
+
+def _answer_hash(nonce: str, answer: int) -> str:
+    # Keyed so the small answer space cannot be brute-forced from the token
+    return _b64encode(_sign(f"{nonce}:{answer}".encode()))
+
+
+def _issue_token(answer: int, expires_at: int) -> str:
+    nonce = secrets.token_urlsafe(12)
+    payload = _b64encode(json.dumps(
+        {"n": nonce, "e": expires_at, "h": _answer_hash(nonce, answer)},
+        separators=(",", ":")
+    ).encode())
+    return f"{STATELESS_PREFIX}{payload}.{_b64encode(_sign(payload.encode()))}"
+
+
+def _verify_token(token: str, answer: int) -> bool:
+    try:
+        payload, signature = token[len(STATELESS_PREFIX):].split(".")
+        if not hmac.compare_digest(_b64decode(signature), _sign(payload.encode())):
+            return False
+        data = json.loads(_b64decode(payload))
+        nonce, expires_at, answer_hash = data["n"], int(data["e"]), data["h"]
+    except (ValueError, KeyError, TypeError):
+        return False
+
+    if time.time() > expires_at:
+        return False
+    # One attempt per token; the frontend fetches a new challenge after a failure
+    if not _replay_guard.use(nonce, expires_at):
+        return False
+    return hmac.compare_digest(answer_hash, _answer_hash(nonce, answer))
+
 
 async def generate_captcha_challenge() -> dict:
     """Generate a simple math captcha"""
@@ -25,12 +119,21 @@ async def generate_captcha_challenge() -> dict:
             num1, num2 = num2, num1
         answer = num1 - num2
     
+    expires = datetime.now(timezone.utc) + timedelta(seconds=CAPTCHA_TTL_SECONDS)
+
+    if CAPTCHA_MODE == "stateless":
+        return {
+            "id": _issue_token(answer, int(expires.timestamp())),
+            "challenge": f"{num1} {operator} {num2} = ?",
+            "expires_at": expires.isoformat()
+        }
+
     captcha = Captcha(
         num1=num1,
         num2=num2,
         operator=operator,
         answer=answer,
-        expires_at=(datetime.now(timezone.utc) + timedelta(minutes=5)).isoformat()
+        expires_at=expires
     )
     
     await db.captchas.insert_one(captcha.model_dump())
@@ -38,33 +141,152 @@ async def generate_captcha_challenge() -> dict:
     return {
         "id": captcha.id,
         "challenge": f"{num1} {operator} {num2} = ?",
-        "expires_at": captcha.expires_at
+        "expires_at": expires.isoformat()
     }
 
 
+class RecaptchaVerifier:
+    """reCAPTCHA siteverify client shared for the application lifetime.
+
+    Keeps one pooled keep-alive connection to the verification endpoint,
+    rejects tokens that already verified without calling it again (a solved
+    token is good for one use, as siteverify itself enforces), and opens a
+    circuit after repeated endpoint failures so requests fail fast instead
+    of waiting on timeouts.
+    """
+
+    def __init__(self, verify_url: str, pool_size: int, timeout: float, http2: bool,
+                 verdict_ttl: float, breaker_threshold: int, breaker_reset_seconds: float):
+        self.verify_url = verify_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.http2 = http2
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset_seconds = breaker_reset_seconds
+
+        self._client: Optional[httpx.AsyncClient] = None
+        # Tokens that verified, kept about as long as Google accepts them
+        self._used_tokens = TTLCache(maxsize=10000, ttl=verdict_ttl)
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+
+        self.requests = 0
+        self.errors = 0
+        self.replays_rejected = 0
+        self.short_circuited = 0
+        self._latencies_ms: Deque[float] = deque(maxlen=512)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            http2 = self.http2
+            if http2 and importlib.util.find_spec("h2") is None:
+                logger.warning("RECAPTCHA_HTTP2 is set but the h2 package is not installed, using HTTP/1.1")
+                http2 = False
+            self._client = httpx.AsyncClient(
+                http2=http2,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _record_failure(self) -> None:
+        self.errors += 1
+        self._consecutive_failures += 1
+        if self._consecutive_failures >= self.breaker_threshold:
+            self._open_until = time.monotonic() + self.breaker_reset_seconds
+            logger.warning(f"reCAPTCHA verification failing, pausing calls for {self.breaker_reset_seconds}s")
+
+    async def verify(self, token: Optional[str], remote_ip: Optional[str], secret_key: str) -> bool:
+        if not secret_key or not token:
+            return False
+
+        key = hashlib.sha256(f"{secret_key}:{token}".encode()).hexdigest()
+        if self._used_tokens.get(key):
+            self.replays_rejected += 1
+            return False
+
+        if time.monotonic() < self._open_until:
+            self.short_circuited += 1
+            return False
+
+        self.requests += 1
+        started = time.perf_counter()
+        try:
+            resp = await self._get_client().post(
+                self.verify_url,
+                data={"secret": secret_key, "response": token, "remoteip": remote_ip or ""}
+            )
+            resp.raise_for_status()
+            data = resp.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logger.error(f"reCAPTCHA verification request failed: {str(e)}")
+            self._record_failure()
+            return False
+        finally:
+            self._latencies_ms.append((time.perf_counter() - started) * 1000)
+
+        self._consecutive_failures = 0
+        success = bool(data.get("success", False))
+        if success:
+            self._used_tokens.set(key, True)
+        return success
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 2)
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "replays_rejected": self.replays_rejected,
+            "short_circuited": self.short_circuited,
+            "circuit_open": time.monotonic() < self._open_until,
+            "latency_ms_p50": percentile(0.5),
+            "latency_ms_p95": percentile(0.95),
+            "latency_ms_max": round(latencies[-1], 2) if latencies else None,
+        }
+
+
+recaptcha_verifier = RecaptchaVerifier(
+    verify_url=os.environ.get('RECAPTCHA_VERIFY_URL', 'https://www.google.com/recaptcha/api/siteverify'),
+    pool_size=int(os.environ.get('RECAPTCHA_POOL_SIZE', '20')),
+    timeout=float(os.environ.get('RECAPTCHA_TIMEOUT', '5')),
+    http2=os.environ.get('RECAPTCHA_HTTP2', 'false').lower() == 'true',
+    verdict_ttl=float(os.environ.get('RECAPTCHA_VERDICT_TTL', '120')),
+    breaker_threshold=int(os.environ.get('RECAPTCHA_BREAKER_THRESHOLD', '5')),
+    breaker_reset_seconds=float(os.environ.get('RECAPTCHA_BREAKER_RESET_SECONDS', '30')),
+)
+
+
 async def verify_recaptcha(token: str, remote_ip: Optional[str], secret_key: str) -> bool:
     """Verify Google reCAPTCHA v2 token"""
-    if not secret_key:
-        return False
-
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            "https://www.google.com/recaptcha/api/siteverify",
-            data={"secret": secret_key, "response": token, "remoteip": remote_ip or ""}
-        )
-        data = resp.json()
-        return data.get("success", False)
+    return await recaptcha_verifier.verify(token, remote_ip, secret_key)
 
 
 async def verify_captcha(captcha_id: str, answer: int) -> bool:
     """Verify math captcha answer"""
+    if not captcha_id or answer is None:
+        return False
+
+    if captcha_id.startswith(STATELESS_PREFIX):
+        return CAPTCHA_MODE == "stateless" and _verify_token(captcha_id, answer)
+
     captcha = await db.captchas.find_one({"id": captcha_id})
     if not captcha:
         return False
     
     # Check expiration
-    expires_at = datetime.fromisoformat(captcha["expires_at"].replace('Z', '+00:00'))
-    if datetime.now(timezone.utc) > expires_at:
+    expires_at = as_utc(captcha.get("expires_at"))
+    if expires_at is None or datetime.now(timezone.utc) > expires_at:
         await db.captchas.delete_one({"id": captcha_id})
         return False
     
@@ -78,7 +300,7 @@ async def verify_captcha(captcha_id: str, answer: int) -> bool:
 
 async def get_captcha_method():
     """Get current captcha method based on settings"""
-    settings = await fetch_site_settings()
+    settings = await get_site_settings()
     if settings.get("recaptcha_enable_submit") and settings.get("recaptcha_site_key"):
         return "recaptcha"
     return "math"
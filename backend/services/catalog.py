@@ -0,0 +1,191 @@
+"""Catalog service - writes to the downloads collection and derived caches"""
+import json
+import logging
+import os
+from typing import List, Optional, Tuple
+
+from services.database import db
+from services.cache import TTLCache
+from services.click_tracker import click_tracker
+from services.leaderboards import mark_leaderboards_stale
+from services.facets import apply_facet_deltas, rebuild_facet_counts
+from services.search import search_terms_for
+from services.search_index import search_index
+from services.suggest import suggestions
+from services.versions import CATALOG_VERSION_KEY, COUNTS_VERSION_KEY, bump_version, on_version_change
+
+logger = logging.getLogger(__name__)
+
+# Counts are per process; the TTL bounds staleness for writes made by other workers
+COUNT_CACHE_TTL = float(os.environ.get('COUNT_CACHE_TTL', '60'))
+COUNT_CAP = int(os.environ.get('COUNT_CAP', '10000'))
+STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', '30'))
+BASE_QUERY = {"approved": True}
+
+# Keys the stats endpoint has always returned, per type
+LEGACY_STATS_KEYS = {"game": "games", "software": "software", "movie": "movies", "tv_show": "tv_shows"}
+
+_count_cache = TTLCache(maxsize=2048, ttl=COUNT_CACHE_TTL)
+_stats_cache = TTLCache(maxsize=1, ttl=STATS_CACHE_TTL)
+
+
+def normalize_query(query: dict) -> str:
+    """Stable cache key for a Mongo filter"""
+    return json.dumps(query, sort_keys=True, default=str)
+
+
+def parse_include_total(value: Optional[str]) -> str:
+    """Map the include_total query param to 'exact', 'estimated' or 'none'"""
+    value = (value or "true").strip().lower()
+    if value in ("false", "0", "no", "none"):
+        return "none"
+    if value == "estimated":
+        return "estimated"
+    return "exact"
+
+
+async def count_downloads(query: dict, mode: str = "exact",
+                          cache_key: Optional[str] = None) -> Tuple[Optional[int], bool]:
+    """Count downloads matching `query`.
+
+    Returns (total, is_estimate). Exact counts are cached per normalized
+    filter (or `cache_key`) until the next catalog write. In 'estimated' mode
+    the unfiltered listing uses collection metadata and filtered ones stop
+    at COUNT_CAP.
+    """
+    if mode == "none":
+        return None, False
+
+    key = (mode, cache_key or normalize_query(query))
+    cached = _count_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if mode == "estimated":
+        if query == BASE_QUERY:
+            result = (await db.downloads.estimated_document_count(), True)
+        else:
+            total = await db.downloads.count_documents(query, limit=COUNT_CAP)
+            result = (total, total >= COUNT_CAP)
+    else:
+        result = (await db.downloads.count_documents(query), False)
+
+    _count_cache.set(key, result)
+    return result
+
+
+def search_total(query: dict, total: Optional[int], estimated: bool,
+                 ranked_ids: List[str], matches: int) -> Tuple[Optional[int], bool]:
+    """Correct a count taken within the search index's ranked ids.
+
+    The ids stop at SEARCH_INDEX_MAX_RESULTS while `matches` is the full
+    match count. The index holds approved downloads only, so with no other
+    filter `matches` is the total; otherwise a cut-off count is an estimate.
+    """
+    if total is None:
+        return None, False
+    if set(query) <= {"approved", "id"}:
+        return matches, False
+    return total, estimated or matches > len(ranked_ids)
+
+
+async def count_search_results(query: dict, search: str, ranked_ids: List[str], matches: int,
+                               mode: str = "exact") -> Tuple[Optional[int], bool]:
+    """count_downloads for a query filtered to the search index's ranked ids"""
+    if mode != "none" and set(query) <= {"approved", "id"}:
+        return matches, False
+    # Keyed on the search string: the id list can be thousands of ids long
+    rest = {key: value for key, value in query.items() if key != "id"}
+    total, estimated = await count_downloads(query, mode, cache_key=normalize_query({**rest, "$search": search}))
+    return search_total(query, total, estimated, ranked_ids, matches)
+
+
+async def get_catalog_stats() -> dict:
+    """Per-type counts and the download total, from one pass over the catalog"""
+    stats = _stats_cache.get("stats")
+    if stats is not None:
+        return stats
+
+    by_type = {}
+    total = 0
+    total_downloads = 0
+    async for doc in db.downloads.aggregate([
+        {"$match": BASE_QUERY},
+        {"$group": {"_id": "$type", "count": {"$sum": 1}, "downloads": {"$sum": "$download_count"}}}
+    ]):
+        by_type[doc["_id"]] = doc["count"]
+        total += doc["count"]
+        total_downloads += doc["downloads"]
+
+    stats = {"total": total, "by_type": by_type, "total_downloads": total_downloads}
+    for type_name, key in LEGACY_STATS_KEYS.items():
+        stats[key] = by_type.get(type_name, 0)
+
+    _stats_cache.set("stats", stats)
+    return stats
+
+
+def _drop_catalog_caches() -> None:
+    _count_cache.clear()
+    _stats_cache.clear()
+
+
+on_version_change(CATALOG_VERSION_KEY, _drop_catalog_caches)
+# Stats sum download counts
+on_version_change(COUNTS_VERSION_KEY, _stats_cache.clear)
+
+
+async def catalog_changed() -> None:
+    """Drop everything derived from the downloads collection, in every worker"""
+    _drop_catalog_caches()
+    mark_leaderboards_stale()
+    await bump_version(CATALOG_VERSION_KEY)
+
+
+async def add_downloads(docs: List[dict]) -> None:
+    """Insert approved downloads"""
+    if not docs:
+        return
+    for doc in docs:
+        doc["search_terms"] = search_terms_for(doc)
+    if len(docs) == 1:
+        await db.downloads.insert_one(docs[0])
+    else:
+        await db.downloads.insert_many(docs)
+    click_tracker.remember(doc["id"] for doc in docs)
+    search_index.add(docs)
+    suggestions.add(docs)
+    await apply_facet_deltas(docs, 1)
+    await catalog_changed()
+
+
+async def delete_download(download_id: str) -> bool:
+    """Delete a download, returning False if it does not exist"""
+    doc = await db.downloads.find_one_and_delete(
+        {"id": download_id},
+        projection={"_id": 0, "approved": 1, "type": 1, "category": 1, "tags": 1}
+    )
+    if doc is None:
+        return False
+    click_tracker.forget([download_id])
+    search_index.remove([download_id])
+    suggestions.remove([download_id])
+    await apply_facet_deltas([doc], -1)
+    await catalog_changed()
+    return True
+
+
+async def replace_downloads(docs: List[dict]) -> None:
+    """Replace the whole catalog (used by the seeder)"""
+    await db.downloads.delete_many({})
+    for doc in docs:
+        doc["search_terms"] = search_terms_for(doc)
+    if docs:
+        await db.downloads.insert_many(docs)
+    click_tracker.reset_known_ids(doc["id"] for doc in docs)
+    if search_index.enabled:
+        await search_index.rebuild()
+    if suggestions.ready:
+        await suggestions.reload()
+    await rebuild_facet_counts()
+    await catalog_changed()
@@ -0,0 +1,202 @@
+"""Write-behind batching for download click tracking
+
+Clicks are buffered in memory and written every CLICK_FLUSH_INTERVAL_MS or
+once CLICK_FLUSH_MAX_EVENTS clicks are pending: one bulk_write of $inc
+updates per download, one insert_many of activity events and one bulk_write
+into the hourly trending rollups. The buffer is bounded by
+CLICK_MAX_PENDING_EVENTS; clicks beyond it are dropped and counted.
+Pending clicks are flushed on shutdown.
+
+Each flush first checks the clicked ids still exist, so a download deleted
+through another worker stops being tracked (and answers 404) here within
+one flush interval.
+
+Count changes move the catalog version (and so the ETag of listings) at
+most once every COUNTS_VERSION_SECONDS.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from services.database import db
+from services.cache import TTLCache
+from services.activity import record_rollups
+from services.versions import COUNTS_VERSION_KEY, bump_version_throttled
+
+logger = logging.getLogger(__name__)
+
+CLICK_FLUSH_INTERVAL_MS = int(os.environ.get('CLICK_FLUSH_INTERVAL_MS', '500'))
+CLICK_FLUSH_MAX_EVENTS = int(os.environ.get('CLICK_FLUSH_MAX_EVENTS', '500'))
+CLICK_MAX_PENDING_EVENTS = int(os.environ.get('CLICK_MAX_PENDING_EVENTS', '50000'))
+COUNTS_VERSION_SECONDS = float(os.environ.get('COUNTS_VERSION_SECONDS', '30'))
+
+
+async def download_counts_changed() -> None:
+    """Move the counts version after download counts changed, throttled"""
+    await bump_version_throttled(COUNTS_VERSION_KEY, COUNTS_VERSION_SECONDS)
+
+
+class ClickAggregator:
+    def __init__(self, flush_interval_ms: int, flush_max_events: int, max_pending_events: int):
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_max_events = flush_max_events
+        self.max_pending_events = max_pending_events
+
+        self._increments: Dict[str, int] = {}
+        self._events: List[dict] = []
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = asyncio.Event()
+        self._task = None
+
+        # ids that exist, so unknown ids still get a 404 without a DB read per click
+        self._known_ids: set = set()
+        self._unknown_ids = TTLCache(maxsize=10000, ttl=30)
+
+        self.flushed_events = 0
+        self.dropped_events = 0
+        self.discarded_events = 0
+        self.failed_flushes = 0
+        self.flushes = 0
+
+    # ----- known ids -----
+
+    async def load_known_ids(self) -> None:
+        ids = set()
+        async for doc in db.downloads.find({}, {"_id": 0, "id": 1}):
+            if doc.get("id"):
+                ids.add(doc["id"])
+        self._known_ids = ids
+
+    def remember(self, download_ids: Iterable[str]) -> None:
+        for download_id in download_ids:
+            self._known_ids.add(download_id)
+            self._unknown_ids.pop(download_id)
+
+    def forget(self, download_ids: Iterable[str]) -> None:
+        for download_id in download_ids:
+            self._known_ids.discard(download_id)
+
+    def reset_known_ids(self, download_ids: Iterable[str]) -> None:
+        self._known_ids = set(download_ids)
+        self._unknown_ids.clear()
+
+    async def is_known(self, download_id: str) -> bool:
+        if download_id in self._known_ids:
+            return True
+        if self._unknown_ids.get(download_id):
+            return False
+        # Written by another worker since our set was loaded?
+        doc = await db.downloads.find_one({"id": download_id}, {"_id": 0, "id": 1})
+        if doc:
+            self._known_ids.add(download_id)
+            return True
+        self._unknown_ids.set(download_id, True)
+        return False
+
+    # ----- buffering -----
+
+    @property
+    def pending_events(self) -> int:
+        return len(self._events)
+
+    def record(self, download_id: str) -> bool:
+        """Buffer one click. Returns False if it was dropped"""
+        if len(self._events) >= self.max_pending_events:
+            self.dropped_events += 1
+            return False
+        self._increments[download_id] = self._increments.get(download_id, 0) + 1
+        self._events.append({
+            "download_id": download_id,
+            "timestamp": datetime.now(timezone.utc)
+        })
+        if len(self._events) >= self.flush_max_events:
+            self._wake.set()
+        return True
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._events:
+                return
+            increments, self._increments = self._increments, {}
+            events, self._events = self._events, []
+
+            try:
+                # Known ids are per worker; a download deleted through another
+                # worker is only noticed here, and its clicks are discarded
+                existing = {doc["id"] async for doc in db.downloads.find(
+                    {"id": {"$in": list(increments)}}, {"_id": 0, "id": 1}
+                )}
+                gone = set(increments) - existing
+                if gone:
+                    self.forget(gone)
+                    self.discarded_events += sum(increments[k] for k in gone)
+                    increments = {k: n for k, n in increments.items() if k not in gone}
+                    events = [e for e in events if e["download_id"] not in gone]
+                if increments:
+                    await db.downloads.bulk_write(
+                        [UpdateOne({"id": download_id}, {"$inc": {"download_count": n}})
+                         for download_id, n in increments.items()],
+                        ordered=False
+                    )
+                    await db.download_activity.insert_many(events, ordered=False)
+                    await record_rollups(events)
+            except PyMongoError as e:
+                self.failed_flushes += 1
+                logger.error(f"Click flush failed, {len(events)} events lost: {str(e)}")
+                self.dropped_events += len(events)
+                return
+
+            self.flushes += 1
+            self.flushed_events += len(events)
+            try:
+                await download_counts_changed()
+            except PyMongoError as e:
+                logger.warning(f"Catalog version bump failed: {str(e)}")
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Click flush loop error: {str(e)}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write whatever is still buffered"""
+        if self._task is not None:
+            # Not cancelled: a flush in progress would lose the events it swapped out
+            self._stopping.set()
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending_events": len(self._events),
+            "pending_downloads": len(self._increments),
+            "flushed_events": self.flushed_events,
+            "dropped_events": self.dropped_events,
+            "discarded_events": self.discarded_events,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "known_ids": len(self._known_ids),
+        }
+
+
+click_tracker = ClickAggregator(CLICK_FLUSH_INTERVAL_MS, CLICK_FLUSH_MAX_EVENTS, CLICK_MAX_PENDING_EVENTS)
@@ -0,0 +1,113 @@
+"""ETags and conditional GET for public read endpoints
+
+The ETag of a cacheable endpoint is made of the version counters of the data
+it reads (see services.versions). Those counters are held in memory, so a
+request whose If-None-Match still matches is answered with 304 before the
+route runs and without touching the database. Other responses get the
+ETag and a Cache-Control header allowing shared caches to serve them for
+CACHE_MAX_AGE seconds and a stale copy for CACHE_STALE_WHILE_REVALIDATE
+more while they revalidate.
+
+Until the counters have been read once after startup no ETag is sent.
+"""
+import os
+from typing import Dict, Optional, Tuple
+
+from services.settings import SETTINGS_VERSION_KEY
+from services.versions import (
+    CATALOG_VERSION_KEY, CATEGORIES_VERSION_KEY, COUNTS_VERSION_KEY, THEME_VERSION_KEY, current_version,
+    versions_loaded
+)
+
+CONDITIONAL_GET_ENABLED = os.environ.get('CONDITIONAL_GET_ENABLED', 'true').lower() == 'true'
+CACHE_MAX_AGE = int(os.environ.get('CACHE_MAX_AGE', '10'))
+CACHE_STALE_WHILE_REVALIDATE = int(os.environ.get('CACHE_STALE_WHILE_REVALIDATE', '60'))
+
+# path -> version counters its response depends on
+VERSIONED_ROUTES: Dict[str, Tuple[str, ...]] = {
+    "/api/downloads": (CATALOG_VERSION_KEY, COUNTS_VERSION_KEY),
+    "/api/downloads/suggest": (CATALOG_VERSION_KEY,),
+    "/api/stats": (CATALOG_VERSION_KEY, COUNTS_VERSION_KEY),
+    "/api/tags": (CATALOG_VERSION_KEY,),
+    "/api/categories": (CATEGORIES_VERSION_KEY,),
+    "/api/settings": (SETTINGS_VERSION_KEY,),
+    "/api/recaptcha/settings": (SETTINGS_VERSION_KEY,),
+    "/api/theme": (THEME_VERSION_KEY,),
+}
+VERSIONED_PREFIXES: Dict[str, Tuple[str, ...]] = {
+    "/api/facets/": (CATALOG_VERSION_KEY,),
+}
+
+
+def versions_for(path: str) -> Optional[Tuple[str, ...]]:
+    keys = VERSIONED_ROUTES.get(path.rstrip("/") or path)
+    if keys is not None:
+        return keys
+    for prefix, keys in VERSIONED_PREFIXES.items():
+        if path.startswith(prefix):
+            return keys
+    return None
+
+
+def etag_for(keys: Tuple[str, ...]) -> str:
+    return 'W/"' + ".".join(f"{key}{current_version(key)}" for key in keys) + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison against an If-None-Match header value"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:]
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+CACHE_CONTROL = f"public, max-age={CACHE_MAX_AGE}, stale-while-revalidate={CACHE_STALE_WHILE_REVALIDATE}"
+
+
+class ConditionalGetMiddleware:
+    """ASGI middleware answering matching If-None-Match requests with 304"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("GET", "HEAD")
+            or not CONDITIONAL_GET_ENABLED
+            or not versions_loaded()
+        ):
+            await self.app(scope, receive, send)
+            return
+        keys = versions_for(scope["path"])
+        if keys is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Taken before the route runs: a write meanwhile makes it stale, never too new
+        etag = etag_for(keys)
+        headers = [(b"etag", etag.encode()), (b"cache-control", CACHE_CONTROL.encode())]
+        for name, value in scope["headers"]:
+            if name == b"if-none-match":
+                if etag_matches(value.decode("latin-1"), etag):
+                    await send({"type": "http.response.start", "status": 304, "headers": headers})
+                    await send({"type": "http.response.body", "body": b""})
+                    return
+                break
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                present = {name.lower() for name, _ in message.get("headers", [])}
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [h for h in headers if h[0] not in present],
+                }
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
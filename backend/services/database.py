@@ -1,6 +1,10 @@
 """Database connection and initialization"""
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import CollectionInvalid, OperationFailure
+import logging
 import os
+from typing import Optional
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -9,7 +13,8 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Dates come back as aware UTC datetimes, comparable with datetime.now(timezone.utc)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
 # Environment variables
@@ -18,6 +23,287 @@ RESEND_API_KEY = os.environ.get('RESEND_API_KEY', '')
 SENDER_EMAIL = os.environ.get('SENDER_EMAIL', 'onboarding@resend.dev')
 FRONTEND_URL = os.environ.get('FRONTEND_URL')
 ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL', '')
+ACTIVITY_RETENTION_DAYS = int(os.environ.get('ACTIVITY_RETENTION_DAYS', '30'))
+ROLLUP_RETENTION_DAYS = int(os.environ.get('ROLLUP_RETENTION_DAYS', '30'))
+# 0 keeps sponsored clicks forever, so total_clicks stays an all-time count
+SPONSORED_CLICK_RETENTION_DAYS = int(os.environ.get('SPONSORED_CLICK_RETENTION_DAYS', '0'))
+
+logger = logging.getLogger(__name__)
+
+
+# Index registry: collection -> indexes the application relies on.
+# Listing sorts in get_downloads page on (sort key, id), so each sort gets a
+# compound index that also serves the reversed direction.
+INDEXES = {
+    "downloads": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Only one text index is allowed per collection; ensure_indexes
+        # replaces an older one (such as the former name-only index)
+        IndexModel(
+            [("name", TEXT), ("description", TEXT), ("tags", TEXT), ("category", TEXT)],
+            weights={"name": 10, "tags": 5, "category": 3, "description": 1},
+            name="downloads_text_search",
+        ),
+        IndexModel([("approved", ASCENDING), ("search_terms", ASCENDING)]),
+        IndexModel([("approved", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("approved", ASCENDING), ("type", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("approved", ASCENDING), ("download_count", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("approved", ASCENDING), ("type", ASCENDING), ("download_count", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("approved", ASCENDING), ("name", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("approved", ASCENDING), ("file_size_bytes", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("approved", ASCENDING), ("category", ASCENDING)]),
+        IndexModel([("tags", ASCENDING)]),
+    ],
+    "submissions": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "rate_limits": [
+        IndexModel([("ip_address", ASCENDING), ("date", ASCENDING)], unique=True),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "response_cache": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "captchas": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+    "categories": [
+        IndexModel([("type", ASCENDING), ("name", ASCENDING)]),
+    ],
+    # Time-series collections (see TIMESERIES_COLLECTIONS): expiry is a
+    # collection option, and secondary indexes may only use meta and time fields
+    "download_activity": [
+        IndexModel([("download_id", ASCENDING), ("timestamp", ASCENDING)]),
+    ],
+    "download_activity_hourly": [
+        IndexModel([("download_id", ASCENDING), ("hour", ASCENDING)], unique=True),
+        IndexModel([("hour", ASCENDING)], expireAfterSeconds=ROLLUP_RETENTION_DAYS * 86400),
+    ],
+    "sponsored_clicks": [
+        IndexModel([("sponsored_id", ASCENDING), ("timestamp", ASCENDING)]),
+    ],
+    "tag_counts": [
+        IndexModel([("name", ASCENDING)], unique=True),
+        IndexModel([("count", DESCENDING)]),
+    ],
+    "facet_counts": [
+        IndexModel([("facet", ASCENDING), ("value", ASCENDING)], unique=True),
+        IndexModel([("facet", ASCENDING), ("count", DESCENDING)]),
+    ],
+    "leaderboards": [
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+    "locks": [
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+    "email_outbox": [
+        IndexModel([("idempotency_key", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "admin_password_resets": [
+        IndexModel([("token", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "user_password_resets": [
+        IndexModel([("token", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "migrations": [
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+}
+
+
+# Click events, stored as time-series collections: MongoDB keeps the events
+# of one meta value in compressed buckets spanning a time range, so a window
+# aggregation skips whole buckets by their time bounds, and expired events
+# are removed a bucket at a time. A retention of 0 days never expires them.
+TIMESERIES_COLLECTIONS = {
+    "download_activity": {
+        "timeField": "timestamp", "metaField": "download_id", "granularity": "hours",
+        "retention_days": ACTIVITY_RETENTION_DAYS,
+    },
+    "sponsored_clicks": {
+        "timeField": "timestamp", "metaField": "sponsored_id", "granularity": "hours",
+        "retention_days": SPONSORED_CLICK_RETENTION_DAYS,
+    },
+}
+
+
+def legacy_collection(name: str) -> str:
+    """Where a regular collection is moved when it is replaced by a time-series one"""
+    return f"{name}_legacy"
+
+
+async def _collection_info(name: str) -> Optional[dict]:
+    cursor = await db.list_collections(filter={"name": name})
+    found = await cursor.to_list(1)
+    return found[0] if found else None
+
+
+async def _ensure_expiry_index(name: str, spec: dict) -> bool:
+    """Apply the retention of a regular click collection with a TTL index; returns whether it changed"""
+    expire = spec["retention_days"] * 86400
+    field = spec["timeField"]
+    collection = db[name]
+    existing = await collection.index_information()
+    current = next((idx for idx, info in existing.items() if info["key"] == [(field, ASCENDING)]), None)
+    if current is None:
+        if not expire:
+            return False
+        await collection.create_index([(field, ASCENDING)], expireAfterSeconds=expire)
+    elif not expire:
+        await collection.drop_index(current)
+    elif existing[current].get("expireAfterSeconds") != expire:
+        await db.command("collMod", name, index={"name": current, "expireAfterSeconds": expire})
+    else:
+        return False
+    return True
+
+
+async def ensure_timeseries_collections() -> dict:
+    """Create the registered time-series collections.
+
+    Must run before ensure_indexes, which would create regular collections.
+    An existing regular collection is renamed to its legacy name and a
+    time-series collection takes its place; services.migrations copies the
+    old events over. A changed retention is applied to existing collections.
+    Before MongoDB 5.0 the collections stay regular and a TTL index on the
+    time field applies the retention instead.
+    """
+    report = {"created": [], "renamed": [], "updated": [], "failed": []}
+    version = (await client.server_info()).get("versionArray", [0])
+    if version[:1] < [5]:
+        # No time-series collections before MongoDB 5.0; keep the regular ones
+        logger.warning("MongoDB 5.0 or later is needed for time-series click collections")
+        report["failed"].extend(TIMESERIES_COLLECTIONS)
+        for name, spec in TIMESERIES_COLLECTIONS.items():
+            try:
+                if await _ensure_expiry_index(name, spec):
+                    report["updated"].append(f"{name}: TTL index on {spec['timeField']}")
+            except OperationFailure as e:
+                logger.warning(f"TTL index on {name} not applied: {e}")
+        return report
+
+    for name, spec in TIMESERIES_COLLECTIONS.items():
+        expire = spec["retention_days"] * 86400
+        info = await _collection_info(name)
+        try:
+            if info is not None and info.get("type") == "timeseries":
+                current = info.get("options", {}).get("expireAfterSeconds")
+                if current != (expire or None):
+                    await db.command("collMod", name, expireAfterSeconds=expire or "off")
+                    report["updated"].append(name)
+                continue
+            if info is not None:
+                legacy = legacy_collection(name)
+                if await _collection_info(legacy) is not None:
+                    # An earlier copy has not finished; leave both for it
+                    report["failed"].append(f"{name}: {legacy} already exists")
+                    continue
+                await db[name].rename(legacy)
+                report["renamed"].append(f"{name} -> {legacy}")
+            options = {"expireAfterSeconds": expire} if expire else {}
+            await db.create_collection(name, timeseries={
+                "timeField": spec["timeField"], "metaField": spec["metaField"], "granularity": spec["granularity"]
+            }, **options)
+            report["created"].append(name)
+        except CollectionInvalid:
+            # Another worker created it first
+            continue
+        except OperationFailure as e:
+            report["failed"].append(f"{name}: {e}")
+
+    if report["created"]:
+        logger.info(f"Created time-series collections: {', '.join(report['created'])}")
+    if report["renamed"]:
+        logger.info(f"Moved regular collections aside: {', '.join(report['renamed'])}")
+    if report["updated"]:
+        logger.info(f"Changed time-series retention: {', '.join(report['updated'])}")
+    for failure in report["failed"]:
+        logger.warning(f"Time-series collection not created: {failure}")
+    return report
+
+
+def _key_of(spec) -> tuple:
+    return tuple((field, direction) for field, direction in spec.items())
+
+
+def _is_text_index(key) -> bool:
+    return any(direction == TEXT or field == "_fts" for field, direction in key)
+
+
+async def _unused_indexes(collection) -> list:
+    """Index names with no recorded accesses since the server started"""
+    try:
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(None)
+    except OperationFailure as e:
+        logger.info(f"$indexStats unavailable for {collection.name}: {e}")
+        return []
+    return [s["name"] for s in stats if s["name"] != "_id_" and s.get("accesses", {}).get("ops", 0) == 0]
+
+
+async def ensure_indexes() -> dict:
+    """Create every registered index that does not exist yet.
+
+    Safe to call repeatedly. Returns and logs a report of indexes that were
+    missing, replaced (a text index with other fields), failed to build, are
+    present but unregistered, or unused.
+    """
+    report = {"created": [], "replaced": [], "failed": [], "unregistered": [], "unused": []}
+
+    for name, models in INDEXES.items():
+        collection = db[name]
+        existing = await collection.index_information()
+        existing_keys = {tuple(info["key"]): idx for idx, info in existing.items()}
+        registered_keys = set()
+        registered_names = set()
+
+        for model in models:
+            # Text indexes report internal keys, so match those by name
+            key = _key_of(model.document["key"])
+            registered_keys.add(key)
+            registered_names.add(model.document["name"])
+            if key in existing_keys or model.document["name"] in existing:
+                continue
+            if _is_text_index(key):
+                for idx in [idx for idx, info in existing.items() if _is_text_index(info["key"])]:
+                    await collection.drop_index(idx)
+                    del existing[idx]
+                    existing_keys = {k: v for k, v in existing_keys.items() if v != idx}
+                    report["replaced"].append(f"{name}.{idx}")
+            try:
+                await collection.create_indexes([model])
+                report["created"].append(f"{name}.{model.document['name']}")
+            except OperationFailure as e:
+                report["failed"].append(f"{name}.{model.document['name']}: {e}")
+
+        for key, idx in existing_keys.items():
+            if idx != "_id_" and key not in registered_keys and idx not in registered_names:
+                report["unregistered"].append(f"{name}.{idx}")
+
+        if existing:
+            report["unused"].extend(f"{name}.{idx}" for idx in await _unused_indexes(collection))
+
+    if report["created"]:
+        logger.info(f"Created missing indexes: {', '.join(report['created'])}")
+    if report["replaced"]:
+        logger.info(f"Dropped conflicting text indexes: {', '.join(report['replaced'])}")
+    for failure in report["failed"]:
+        logger.warning(f"Index build failed: {failure}")
+    if report["unregistered"]:
+        logger.info(f"Indexes not in registry: {', '.join(report['unregistered'])}")
+    if report["unused"]:
+        logger.info(f"Indexes unused since server start: {', '.join(report['unused'])}")
+    return report
 
 
 async def shutdown_db_client():
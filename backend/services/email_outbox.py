@@ -0,0 +1,308 @@
+"""Durable outbound email queue
+
+Messages are written to the `email_outbox` collection and delivered by a
+bounded pool of async workers, so a restart does not lose them. Workers
+claim one message at a time with a lease, retry failures with exponential
+backoff, and share a rate limiter toward the provider. Every message has an
+idempotency key; enqueueing the same key twice is a no-op.
+
+Digest messages collect items under one key per time window and are
+rendered by a registered renderer when the window closes.
+
+The provider is pluggable: EMAIL_PROVIDER=resend (default) or fake, which
+records messages in memory for tests and local development.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import resend
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from services.database import db, RESEND_API_KEY, SENDER_EMAIL
+from services.settings import get_site_settings
+
+logger = logging.getLogger(__name__)
+
+EMAIL_PROVIDER = os.environ.get('EMAIL_PROVIDER', 'resend').lower()
+EMAIL_WORKERS = int(os.environ.get('EMAIL_WORKERS', '4'))
+EMAIL_RATE_PER_SECOND = float(os.environ.get('EMAIL_RATE_PER_SECOND', '2'))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', '6'))
+EMAIL_RETRY_BASE_SECONDS = float(os.environ.get('EMAIL_RETRY_BASE_SECONDS', '30'))
+EMAIL_POLL_SECONDS = float(os.environ.get('EMAIL_POLL_SECONDS', '5'))
+EMAIL_LEASE_SECONDS = 120
+EMAIL_SENT_RETENTION_DAYS = 7
+
+
+class EmailNotConfigured(Exception):
+    """The provider cannot send because configuration is missing"""
+
+
+# ===== PROVIDERS =====
+
+class ResendProvider:
+    """Sends through Resend on a small dedicated thread pool"""
+
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="resend")
+
+    async def send(self, to_email: str, subject: str, html: str, idempotency_key: str) -> None:
+        settings = await get_site_settings()
+        api_key = settings.get("resend_api_key") or RESEND_API_KEY
+        sender = settings.get("resend_sender_email") or SENDER_EMAIL
+        if not api_key or not sender or not to_email:
+            raise EmailNotConfigured("missing Resend configuration or recipient")
+
+        resend.api_key = api_key
+        params = {
+            "from": sender,
+            "to": [to_email],
+            "subject": subject,
+            "html": html,
+        }
+        await asyncio.get_running_loop().run_in_executor(self._executor, resend.Emails.send, params)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+class FakeSinkProvider:
+    """Keeps sent messages in memory instead of delivering them"""
+
+    def __init__(self, max_messages: int = 1000):
+        self.max_messages = max_messages
+        self.messages: List[dict] = []
+
+    async def send(self, to_email: str, subject: str, html: str, idempotency_key: str) -> None:
+        if not to_email:
+            raise EmailNotConfigured("missing recipient")
+        self.messages.append({"to": to_email, "subject": subject, "html": html, "idempotency_key": idempotency_key})
+        del self.messages[:-self.max_messages]
+        logger.info(f"Fake email sink: {subject} -> {to_email}")
+
+    def close(self) -> None:
+        pass
+
+
+def _build_provider():
+    if EMAIL_PROVIDER == "fake":
+        return FakeSinkProvider()
+    return ResendProvider(max_workers=EMAIL_WORKERS)
+
+
+provider = _build_provider()
+
+
+class RateLimiter:
+    """Spaces calls so at most `rate` start per second across all workers"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+_rate_limiter = RateLimiter(EMAIL_RATE_PER_SECOND)
+
+
+async def send_now(to_email: str, subject: str, html: str) -> bool:
+    """Deliver immediately, for flows that must report failure to the caller"""
+    await _rate_limiter.acquire()
+    try:
+        await provider.send(to_email, subject, html, uuid.uuid4().hex)
+        return True
+    except EmailNotConfigured as e:
+        logger.info(f"Email not sent: {str(e)}")
+    except Exception as e:
+        logger.error(f"Failed to send email: {str(e)}")
+    return False
+
+
+# ===== QUEUE =====
+
+# kind -> renderer(items) returning (to_email, subject, html) or None to skip
+DigestRenderer = Callable[[List[dict]], Awaitable[Optional[Tuple[str, str, str]]]]
+_renderers: Dict[str, DigestRenderer] = {}
+_wake = asyncio.Event()
+_workers: List[asyncio.Task] = []
+_stats = {"sent": 0, "retried": 0, "failed": 0, "skipped": 0}
+
+
+def register_digest_renderer(kind: str, renderer: DigestRenderer) -> None:
+    _renderers[kind] = renderer
+
+
+async def enqueue_email(to_email: str, subject: str, html: str, idempotency_key: Optional[str] = None) -> None:
+    """Persist a message for delivery. Duplicate idempotency keys are ignored"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.email_outbox.insert_one({
+            "id": str(uuid.uuid4()),
+            "idempotency_key": idempotency_key or str(uuid.uuid4()),
+            "kind": "message",
+            "to": to_email,
+            "subject": subject,
+            "html": html,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        })
+    except DuplicateKeyError:
+        return
+    _wake.set()
+
+
+async def enqueue_digest_items(kind: str, items: List[dict], window_seconds: int) -> None:
+    """Add items to the digest of the current window, sent when it closes"""
+    now = datetime.now(timezone.utc)
+    window_start = int(now.timestamp()) // window_seconds * window_seconds
+    send_at = datetime.fromtimestamp(window_start + window_seconds, timezone.utc)
+    key = f"{kind}:{window_start}"
+    update = {
+        "$push": {"digest_items": {"$each": items}},
+        "$setOnInsert": {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "attempts": 0,
+            "next_attempt_at": send_at,
+            "created_at": now,
+        }
+    }
+    try:
+        await db.email_outbox.update_one({"idempotency_key": key, "status": "pending"}, update, upsert=True)
+    except DuplicateKeyError:
+        # The window's digest is already being sent; start a follow-up one
+        await db.email_outbox.update_one(
+            {"idempotency_key": f"{key}:{uuid.uuid4().hex[:8]}", "status": "pending"}, update, upsert=True
+        )
+
+
+async def _claim() -> Optional[dict]:
+    now = datetime.now(timezone.utc)
+    return await db.email_outbox.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            # A worker died mid-send
+            {"status": "sending", "lease_until": {"$lt": now}},
+        ]},
+        {"$set": {"status": "sending", "lease_until": now + timedelta(seconds=EMAIL_LEASE_SECONDS)},
+         "$inc": {"attempts": 1}},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _finish(job: dict, status: str, error: Optional[str] = None) -> None:
+    now = datetime.now(timezone.utc)
+    update = {"status": status, "finished_at": now, "expires_at": now + timedelta(days=EMAIL_SENT_RETENTION_DAYS)}
+    if error:
+        update["last_error"] = error
+    await db.email_outbox.update_one({"id": job["id"]}, {"$set": update, "$unset": {"lease_until": ""}})
+    _stats[status] += 1
+
+
+async def _deliver(job: dict) -> None:
+    if job.get("kind", "message") == "message":
+        message = (job.get("to"), job.get("subject"), job.get("html"))
+    else:
+        renderer = _renderers.get(job["kind"])
+        message = await renderer(job.get("digest_items", [])) if renderer else None
+        if message is None:
+            await _finish(job, "skipped")
+            return
+
+    to_email, subject, html = message
+    await _rate_limiter.acquire()
+    try:
+        await provider.send(to_email, subject, html, job["idempotency_key"])
+    except EmailNotConfigured as e:
+        logger.info(f"Email not sent: {str(e)}")
+        await _finish(job, "skipped", str(e))
+        return
+    except Exception as e:
+        await _retry_or_fail(job, str(e))
+        return
+
+    await _finish(job, "sent")
+
+
+async def _retry_or_fail(job: dict, error: str) -> None:
+    """Schedule the next attempt with exponential backoff, or give up"""
+    if job["attempts"] >= EMAIL_MAX_ATTEMPTS:
+        logger.error(f"Giving up on email {job['id']} after {job['attempts']} attempts: {error}")
+        await _finish(job, "failed", error)
+        return
+    delay = EMAIL_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1)
+    await db.email_outbox.update_one({"id": job["id"]}, {
+        "$set": {"status": "pending", "last_error": error,
+                 "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=delay)},
+        "$unset": {"lease_until": ""}
+    })
+    _stats["retried"] += 1
+
+
+async def _worker() -> None:
+    while True:
+        try:
+            job = await _claim()
+        except PyMongoError as e:
+            logger.warning(f"Email outbox poll failed: {str(e)}")
+            job = None
+
+        if job is None:
+            try:
+                await asyncio.wait_for(_wake.wait(), timeout=EMAIL_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            _wake.clear()
+            continue
+
+        try:
+            await _deliver(job)
+        except PyMongoError as e:
+            # The lease expires and another attempt picks the job up
+            logger.warning(f"Email outbox update failed: {str(e)}")
+        except Exception as e:
+            # A renderer or template failed; release the job instead of the worker
+            logger.error(f"Email {job['id']} failed before sending: {str(e)}")
+            try:
+                await _retry_or_fail(job, str(e))
+            except PyMongoError as e:
+                logger.warning(f"Email outbox update failed: {str(e)}")
+
+
+def start_email_workers() -> None:
+    if not _workers:
+        _workers.extend(asyncio.create_task(_worker()) for _ in range(EMAIL_WORKERS))
+
+
+async def stop_email_workers() -> None:
+    for task in _workers:
+        task.cancel()
+    for task in _workers:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _workers.clear()
+    provider.close()
+
+
+async def outbox_stats() -> dict:
+    pending = await db.email_outbox.count_documents({"status": {"$in": ["pending", "sending"]}})
+    return {"pending": pending, "workers": len(_workers), **_stats}
@@ -0,0 +1,183 @@
+"""Incrementally maintained tag and facet counts
+
+`tag_counts` holds one document per tag and `facet_counts` one per
+(facet, value) for the type and category facets, both over approved
+downloads. Catalog writes adjust them with $inc, so listings are an indexed
+read of the top N. rebuild_facet_counts() recomputes both from scratch.
+
+Listings can also ask for facet counts under their own filter
+(LISTING_FACETS); those are computed live by fetch_page_with_facets() in the
+same $facet aggregation as the page.
+"""
+import logging
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+
+from services.database import db
+from services.pagination import plan_keyset_page, finish_keyset_page
+
+logger = logging.getLogger(__name__)
+
+FACETS = ("type", "category")
+LISTING_FACETS = ("type", "category", "tags", "size_bucket")
+LISTING_FACET_LIMIT = 20
+
+# (label, size_min, size_max) in the units the size_min/size_max filters take
+SIZE_BUCKETS: List[Tuple[str, Optional[str], Optional[str]]] = [
+    ("under_100mb", None, "100MB"),
+    ("100mb_1gb", "100MB", "1GB"),
+    ("1gb_10gb", "1GB", "10GB"),
+    ("over_10gb", "10GB", None),
+]
+_SIZE_BOUNDARIES = [0, 100 * 1024 ** 2, 1024 ** 3, 10 * 1024 ** 3, 2 ** 62]
+
+
+async def apply_facet_deltas(docs: Iterable[dict], sign: int) -> None:
+    """Add (sign=1) or remove (sign=-1) downloads from the counts"""
+    tags = Counter()
+    facets = Counter()
+    for doc in docs:
+        if not doc.get("approved", True):
+            continue
+        tags.update(set(doc.get("tags") or []))
+        for facet in FACETS:
+            if doc.get(facet):
+                facets[(facet, doc[facet])] += 1
+
+    if tags:
+        await db.tag_counts.bulk_write(
+            [UpdateOne({"name": name}, {"$inc": {"count": sign * n}}, upsert=True) for name, n in tags.items()],
+            ordered=False
+        )
+    if facets:
+        await db.facet_counts.bulk_write(
+            [UpdateOne({"facet": facet, "value": value}, {"$inc": {"count": sign * n}}, upsert=True)
+             for (facet, value), n in facets.items()],
+            ordered=False
+        )
+    if sign < 0:
+        await db.tag_counts.delete_many({"count": {"$lte": 0}})
+        await db.facet_counts.delete_many({"count": {"$lte": 0}})
+
+
+async def rebuild_facet_counts() -> None:
+    """Recompute all counts from the downloads collection"""
+    await db.downloads.aggregate([
+        {"$match": {"approved": True}},
+        {"$unwind": "$tags"},
+        {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+        {"$project": {"_id": 0, "name": "$_id", "count": 1}},
+        {"$out": "tag_counts"}
+    ]).to_list(None)
+
+    await db.downloads.aggregate([
+        {"$match": {"approved": True}},
+        {"$project": {"_id": 0, "pairs": [
+            {"facet": "type", "value": "$type"},
+            {"facet": "category", "value": "$category"}
+        ]}},
+        {"$unwind": "$pairs"},
+        {"$match": {"pairs.value": {"$nin": [None, ""]}}},
+        {"$group": {"_id": {"facet": "$pairs.facet", "value": "$pairs.value"}, "count": {"$sum": 1}}},
+        {"$project": {"_id": 0, "facet": "$_id.facet", "value": "$_id.value", "count": 1}},
+        {"$out": "facet_counts"}
+    ]).to_list(None)
+    logger.info("Rebuilt tag and facet counts")
+
+
+async def ensure_facet_counts() -> None:
+    """Build the counts once for a database that has never had them"""
+    if await db.tag_counts.estimated_document_count() == 0 and await db.downloads.estimated_document_count() > 0:
+        await rebuild_facet_counts()
+
+
+async def top_tags(limit: int) -> List[dict]:
+    docs = await db.tag_counts.find({"count": {"$gt": 0}}, {"_id": 0}).sort("count", -1).limit(limit).to_list(limit)
+    return [{"name": d["name"], "count": d["count"]} for d in docs]
+
+
+async def top_facet_values(facet: str, limit: int) -> List[dict]:
+    docs = await db.facet_counts.find(
+        {"facet": facet, "count": {"$gt": 0}}, {"_id": 0}
+    ).sort("count", -1).limit(limit).to_list(limit)
+    return [{"name": d["value"], "count": d["count"]} for d in docs]
+
+
+def parse_listing_facets(value: Optional[str]) -> List[str]:
+    """Facet names from a comma separated `facets` query param"""
+    if not value:
+        return []
+    facets = list(dict.fromkeys(f.strip() for f in value.split(",") if f.strip()))
+    unknown = [f for f in facets if f not in LISTING_FACETS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown facet: {', '.join(unknown)}")
+    return facets
+
+
+def _facet_stages(facet: str) -> List[dict]:
+    if facet == "size_bucket":
+        return [{"$bucket": {
+            "groupBy": "$file_size_bytes",
+            "boundaries": _SIZE_BOUNDARIES,
+            "default": "unknown",
+            "output": {"count": {"$sum": 1}},
+        }}]
+    stages = []
+    if facet == "tags":
+        stages.append({"$unwind": "$tags"})
+    return stages + [
+        {"$match": {facet: {"$nin": [None, ""]}}},
+        {"$sortByCount": f"${facet}"},
+        {"$limit": LISTING_FACET_LIMIT},
+    ]
+
+
+def _facet_values(facet: str, buckets: List[dict]) -> List[dict]:
+    if facet != "size_bucket":
+        return [{"name": b["_id"], "count": b["count"]} for b in buckets]
+    counts = {b["_id"]: b["count"] for b in buckets}
+    values = [
+        {"name": label, "count": counts.get(lower, 0), "size_min": size_min, "size_max": size_max}
+        for (label, size_min, size_max), lower in zip(SIZE_BUCKETS, _SIZE_BOUNDARIES)
+    ]
+    if counts.get("unknown"):
+        values.append({"name": "unknown", "count": counts["unknown"], "size_min": None, "size_max": None})
+    return values
+
+
+async def fetch_page_with_facets(collection, query: dict, projection: dict, facets: List[str],
+                                 sort_by: Optional[str], limit: int, cursor: Optional[str] = None,
+                                 skip: int = 0, with_page: bool = True, with_total: bool = True) -> dict:
+    """One page, its facet counts and the total from a single aggregation.
+
+    Counts cover everything matching `query`, not just the page. The page
+    is keyset or offset paged like fetch_keyset_page(); with_page=False
+    leaves it out for callers that order the page another way.
+    """
+    branches = {f"facet_{facet}": _facet_stages(facet) for facet in facets}
+    plan = None
+    if with_page:
+        plan = plan_keyset_page(query, sort_by, cursor, skip)
+        page_stages = [] if plan["query"] is query else [{"$match": plan["query"]}]
+        branches["items"] = page_stages + [
+            {"$sort": dict(plan["sort"])},
+            {"$skip": plan["skip"]},
+            {"$limit": limit + 1},
+            {"$project": projection},
+        ]
+    if with_total:
+        branches["total"] = [{"$count": "n"}]
+
+    docs = await collection.aggregate([{"$match": query}, {"$facet": branches}]).to_list(1)
+    result = docs[0] if docs else {}
+
+    out = {"facets": {facet: _facet_values(facet, result.get(f"facet_{facet}", [])) for facet in facets}}
+    if plan is not None:
+        out.update(finish_keyset_page(plan, result.get("items", []), limit))
+    if with_total:
+        total = result.get("total")
+        out["total"] = total[0]["n"] if total else 0
+    return out
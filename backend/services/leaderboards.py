@@ -0,0 +1,163 @@
+"""Precomputed top and trending leaderboards
+
+A background task recomputes both lists every LEADERBOARD_REFRESH_SECONDS
+and stores them in the `leaderboards` collection. A lease in the `locks`
+collection makes sure only one worker or node recomputes at a time; the
+others load the stored snapshot. A catalog write, here or on another worker
+(services.versions), makes the lease holder recompute right away. Endpoints
+serve the in-memory snapshot and slice it to the count configured in site
+settings.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from services.database import db
+from services.versions import CATALOG_VERSION_KEY, on_version_change
+from services.activity import trending_download_ids
+from services.responses import DOWNLOAD_PROJECTION
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_REFRESH_SECONDS = float(os.environ.get('LEADERBOARD_REFRESH_SECONDS', '60'))
+# Settings allow up to 20 items per list
+LEADERBOARD_SIZE = int(os.environ.get('LEADERBOARD_SIZE', '20'))
+LOCK_ID = "leaderboards_refresh"
+
+_worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+_snapshots: Dict[str, dict] = {}
+_stale = asyncio.Event()
+_task = None
+
+
+async def compute_top() -> List[dict]:
+    return await db.downloads.find(
+        {"approved": True},
+        DOWNLOAD_PROJECTION
+    ).sort("download_count", -1).limit(LEADERBOARD_SIZE).to_list(LEADERBOARD_SIZE)
+
+
+async def compute_trending() -> List[dict]:
+    trending_ids = await trending_download_ids(LEADERBOARD_SIZE)
+
+    trending = []
+    if trending_ids:
+        docs = await db.downloads.find(
+            {"id": {"$in": trending_ids}, "approved": True},
+            DOWNLOAD_PROJECTION
+        ).to_list(LEADERBOARD_SIZE)
+
+        # Sort by the order of trending_ids (most active first)
+        id_to_download = {d["id"]: d for d in docs}
+        trending = [id_to_download[tid] for tid in trending_ids if tid in id_to_download]
+
+    # If we don't have enough trending data, fall back to most downloaded overall
+    if len(trending) < LEADERBOARD_SIZE:
+        existing_ids = [t["id"] for t in trending]
+        fallback = await db.downloads.find(
+            {"approved": True, "id": {"$nin": existing_ids}},
+            DOWNLOAD_PROJECTION
+        ).sort("download_count", -1).limit(LEADERBOARD_SIZE - len(trending)).to_list(LEADERBOARD_SIZE)
+        trending.extend(fallback)
+
+    return trending
+
+
+COMPUTERS = {"top": compute_top, "trending": compute_trending}
+
+
+async def _acquire_lock() -> bool:
+    """Take or renew the refresh lease"""
+    now = datetime.now(timezone.utc)
+    try:
+        doc = await db.locks.find_one_and_update(
+            {"id": LOCK_ID, "$or": [{"expires_at": {"$lt": now}}, {"owner": _worker_id}]},
+            {"$set": {"owner": _worker_id, "expires_at": now + timedelta(seconds=LEADERBOARD_REFRESH_SECONDS * 2)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # Held by someone else
+        return False
+    return doc is not None and doc.get("owner") == _worker_id
+
+
+async def _load_stored() -> None:
+    async for doc in db.leaderboards.find({"id": {"$in": list(COMPUTERS)}}, {"_id": 0}):
+        _snapshots[doc["id"]] = {"items": doc.get("items", []), "generated_at": doc.get("generated_at")}
+
+
+async def refresh_leaderboards() -> None:
+    """Recompute if we hold the lock, otherwise pick up the stored snapshot"""
+    if not await _acquire_lock():
+        await _load_stored()
+        return
+
+    for name, compute in COMPUTERS.items():
+        items = await compute()
+        generated_at = datetime.now(timezone.utc)
+        await db.leaderboards.update_one(
+            {"id": name},
+            {"$set": {"items": items, "generated_at": generated_at}},
+            upsert=True
+        )
+        _snapshots[name] = {"items": items, "generated_at": generated_at}
+
+
+async def get_leaderboard(name: str) -> dict:
+    """Current snapshot of a leaderboard, computing it if none exists yet"""
+    snapshot = _snapshots.get(name)
+    if snapshot is None:
+        await _load_stored()
+        snapshot = _snapshots.get(name)
+    if snapshot is None:
+        snapshot = {"items": await COMPUTERS[name](), "generated_at": datetime.now(timezone.utc)}
+        _snapshots[name] = snapshot
+    return snapshot
+
+
+def mark_leaderboards_stale() -> None:
+    """Ask the refresher to run early, e.g. after a catalog write"""
+    _stale.set()
+
+
+# Writes on other workers reach the lease holder through the catalog version
+on_version_change(CATALOG_VERSION_KEY, mark_leaderboards_stale, remote_only=True)
+
+
+async def _run() -> None:
+    while True:
+        try:
+            await refresh_leaderboards()
+        except PyMongoError as e:
+            logger.warning(f"Leaderboard refresh failed: {str(e)}")
+        try:
+            # A stale mark refreshes early, still under the lease
+            await asyncio.wait_for(_stale.wait(), timeout=LEADERBOARD_REFRESH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _stale.clear()
+
+
+def start_leaderboard_refresher() -> None:
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_run())
+
+
+async def stop_leaderboard_refresher() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -0,0 +1,275 @@
+"""Background data migrations
+
+Timestamps used to be stored as ISO strings and day fields as YYYY-MM-DD
+strings. convert_datetimes() rewrites them as BSON dates so range filters
+compare dates, indexes on them stay compact and TTL indexes apply.
+
+Each collection is walked in _id order in batches of MIGRATION_BATCH_SIZE,
+converting only fields that are still strings, so re-running is harmless.
+Progress (the last _id done) is saved in the `migrations` collection after
+every batch; a restarted worker resumes where the last one stopped, and a
+finished migration is skipped. Between batches the migration sleeps for
+MIGRATION_BATCH_PAUSE_SECONDS to leave room for request traffic.
+
+Click events moved from regular collections to time-series ones
+(services.database.TIMESERIES_COLLECTIONS). copy_timeseries() copies the
+events left in each `<name>_legacy` collection into the new one the same
+way, batch by batch from the saved position. One worker copies at a time,
+holding a lease in the `locks` collection renewed every batch. Events
+without a usable timestamp cannot be copied; they are counted as `skipped`
+and the legacy collection is kept for inspection, otherwise it is dropped
+once every event has been copied. If the copy is interrupted between
+inserting a batch and saving its position, that batch is copied again on
+resume.
+
+Run in the background at startup, or to completion from the command line:
+
+    cd backend && python -m services.migrations
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from services.database import TIMESERIES_COLLECTIONS, db, ensure_timeseries_collections, legacy_collection
+from services.versions import CATALOG_VERSION_KEY, bump_version
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = int(os.environ.get('MIGRATION_BATCH_SIZE', '500'))
+MIGRATION_BATCH_PAUSE_SECONDS = float(os.environ.get('MIGRATION_BATCH_PAUSE_SECONDS', '0.05'))
+MIGRATION_LEASE_SECONDS = float(os.environ.get('MIGRATION_LEASE_SECONDS', '60'))
+DATETIME_MIGRATION = "datetimes_v1"
+TIMESERIES_MIGRATION = "timeseries_v1"
+
+# collection -> fields holding ISO timestamps or YYYY-MM-DD days
+DATETIME_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "downloads": ("created_at", "submission_date"),
+    "submissions": ("created_at", "submission_date"),
+    "users": ("created_at",),
+    "categories": ("created_at",),
+    "captchas": ("created_at", "expires_at"),
+    "admin_password_resets": ("created_at", "expires_at"),
+    "user_password_resets": ("created_at", "expires_at"),
+    "download_activity": ("timestamp",),
+    "sponsored_clicks": ("timestamp",),
+    "leaderboards": ("generated_at",),
+}
+
+_worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+_task: Optional[asyncio.Task] = None
+
+
+def parse_stored_datetime(value: str) -> Optional[datetime]:
+    """Datetime for an ISO timestamp or YYYY-MM-DD day string, in UTC"""
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+async def _convert_collection(name: str, fields: Tuple[str, ...]) -> int:
+    """Convert one collection from its saved position; returns documents updated"""
+    collection = db[name]
+    state_id = f"{DATETIME_MIGRATION}:{name}"
+    state = await db.migrations.find_one({"id": state_id}) or {}
+    if state.get("done"):
+        return 0
+
+    last_id = state.get("last_id")
+    updated = 0
+    string_filter = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    while True:
+        query = string_filter if last_id is None else {"$and": [{"_id": {"$gt": last_id}}, string_filter]}
+        docs = await collection.find(
+            query, {field: 1 for field in fields}
+        ).sort("_id", 1).limit(MIGRATION_BATCH_SIZE).to_list(MIGRATION_BATCH_SIZE)
+        if not docs:
+            break
+
+        ops = []
+        for doc in docs:
+            changes = {}
+            for field in fields:
+                if isinstance(doc.get(field), str):
+                    parsed = parse_stored_datetime(doc[field])
+                    if parsed is not None:
+                        changes[field] = parsed
+            if changes:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": changes}))
+        if ops:
+            await collection.bulk_write(ops, ordered=False)
+            updated += len(ops)
+
+        last_id = docs[-1]["_id"]
+        await db.migrations.update_one(
+            {"id": state_id},
+            {"$set": {"last_id": last_id}, "$inc": {"converted": len(ops)}},
+            upsert=True
+        )
+        await asyncio.sleep(MIGRATION_BATCH_PAUSE_SECONDS)
+
+    await db.migrations.update_one(
+        {"id": state_id},
+        {"$set": {"done": True, "finished_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    if updated:
+        logger.info(f"Converted timestamps of {updated} documents in {name}")
+    return updated
+
+
+async def convert_datetimes() -> Dict[str, int]:
+    """Convert every registered collection; returns documents updated per collection"""
+    report = {}
+    for name, fields in DATETIME_FIELDS.items():
+        report[name] = await _convert_collection(name, fields)
+    if report.get("downloads"):
+        # Listings serialize the converted values; let caches and ETags move on
+        await bump_version(CATALOG_VERSION_KEY)
+    return report
+
+
+async def _acquire_lease(lock_id: str) -> bool:
+    """Take or renew a migration lease"""
+    now = datetime.now(timezone.utc)
+    try:
+        doc = await db.locks.find_one_and_update(
+            {"id": lock_id, "$or": [{"expires_at": {"$lt": now}}, {"owner": _worker_id}]},
+            {"$set": {"owner": _worker_id, "expires_at": now + timedelta(seconds=MIGRATION_LEASE_SECONDS)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # Held by another worker
+        return False
+    return doc is not None and doc.get("owner") == _worker_id
+
+
+async def _copy_collection(name: str, spec: dict) -> int:
+    """Copy one legacy collection into its time-series collection; returns events copied"""
+    legacy = legacy_collection(name)
+    if legacy not in await db.list_collection_names(filter={"name": legacy}):
+        return 0
+    state_id = f"{TIMESERIES_MIGRATION}:{name}"
+    if not await _acquire_lease(state_id):
+        return 0
+    try:
+        return await _copy_events(name, spec, legacy, state_id)
+    finally:
+        await db.locks.delete_one({"id": state_id, "owner": _worker_id})
+
+
+async def _copy_events(name: str, spec: dict, legacy: str, state_id: str) -> int:
+    # Read after taking the lease, so it includes the previous holder's progress
+    state = await db.migrations.find_one({"id": state_id}) or {}
+    if state.get("done"):
+        return 0
+
+    time_field, meta_field = spec["timeField"], spec["metaField"]
+    last_id = state.get("last_id")
+    copied = 0
+    while True:
+        query = {} if last_id is None else {"_id": {"$gt": last_id}}
+        docs = await db[legacy].find(
+            query, {time_field: 1, meta_field: 1}
+        ).sort("_id", 1).limit(MIGRATION_BATCH_SIZE).to_list(MIGRATION_BATCH_SIZE)
+        if not docs:
+            break
+
+        events = []
+        for doc in docs:
+            moment = doc.get(time_field)
+            if isinstance(moment, str):
+                moment = parse_stored_datetime(moment)
+            # The time field is required; events without a usable one are left behind
+            if isinstance(moment, datetime):
+                events.append({meta_field: doc.get(meta_field), time_field: moment})
+        if events:
+            await db[name].insert_many(events, ordered=False)
+            copied += len(events)
+
+        last_id = docs[-1]["_id"]
+        await db.migrations.update_one(
+            {"id": state_id},
+            {"$set": {"last_id": last_id}, "$inc": {"converted": len(events), "skipped": len(docs) - len(events)}},
+            upsert=True
+        )
+        if not await _acquire_lease(state_id):
+            # Expired while copying; whoever holds it now resumes from the saved position
+            logger.warning(f"Lost the copy lease for {legacy} after {copied} events")
+            return copied
+        await asyncio.sleep(MIGRATION_BATCH_PAUSE_SECONDS)
+
+    state = await db.migrations.find_one_and_update(
+        {"id": state_id},
+        {"$set": {"done": True, "finished_at": datetime.now(timezone.utc)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    logger.info(f"Copied {copied} events from {legacy} into time-series collection {name}")
+    skipped = state.get("skipped", 0)
+    if skipped:
+        logger.warning(f"Kept {legacy}: {skipped} events have no usable {time_field}")
+    else:
+        await db[legacy].drop()
+    return copied
+
+
+async def copy_timeseries() -> Dict[str, int]:
+    """Copy every legacy click collection; returns events copied per collection"""
+    report = {}
+    for name, spec in TIMESERIES_COLLECTIONS.items():
+        report[name] = await _copy_collection(name, spec)
+    return report
+
+
+async def _run() -> None:
+    try:
+        await convert_datetimes()
+    except PyMongoError as e:
+        # Progress is saved per batch; the next start resumes
+        logger.warning(f"Datetime migration interrupted: {str(e)}")
+    try:
+        await copy_timeseries()
+    except PyMongoError as e:
+        logger.warning(f"Time-series copy interrupted: {str(e)}")
+
+
+def start_migrations() -> None:
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_run())
+
+
+async def stop_migrations() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+async def migration_status() -> list:
+    return await db.migrations.find({}, {"_id": 0, "last_id": 0}).to_list(None)
+
+
+if __name__ == "__main__":
+    async def main():
+        await ensure_timeseries_collections()
+        return {"datetimes": await convert_datetimes(), "timeseries": await copy_timeseries()}
+
+    logging.basicConfig(level=logging.INFO)
+    print(asyncio.run(main()))
@@ -0,0 +1,161 @@
+"""Keyset (cursor) pagination helpers"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException
+
+# sort_by option -> (field, order)
+SORT_OPTIONS = {
+    "date_desc": ("created_at", -1),
+    "date_asc": ("created_at", 1),
+    "downloads_desc": ("download_count", -1),
+    "downloads_asc": ("download_count", 1),
+    "name_asc": ("name", 1),
+    "name_desc": ("name", -1),
+    "size_desc": ("file_size_bytes", -1),
+    "size_asc": ("file_size_bytes", 1),
+}
+DEFAULT_SORT = "date_desc"
+
+
+def resolve_sort(sort_by: Optional[str]) -> Tuple[str, str, int]:
+    """Return (sort_by, field, order), falling back to the default sort"""
+    if sort_by not in SORT_OPTIONS:
+        sort_by = DEFAULT_SORT
+    field, order = SORT_OPTIONS[sort_by]
+    return sort_by, field, order
+
+
+def _encode_value(value: Any) -> Any:
+    # Dates keep their type so the keyset filter compares dates with dates
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if set(value) != {"$date"} or not isinstance(value["$date"], str):
+            raise ValueError("malformed cursor")
+        return datetime.fromisoformat(value["$date"])
+    return value
+
+
+def encode_cursor(sort_by: str, doc: dict, direction: str) -> str:
+    """Build an opaque cursor from the active sort key plus the document id"""
+    field, _ = SORT_OPTIONS[sort_by]
+    payload = {"s": sort_by, "v": _encode_value(doc.get(field)), "id": doc["id"], "d": direction}
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str) -> dict:
+    """Decode a cursor and check it belongs to the requested sort"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(payload, dict) or not isinstance(payload.get("id"), str):
+            raise ValueError("malformed cursor")
+        if payload.get("d") not in ("next", "prev"):
+            raise ValueError("malformed cursor")
+        payload["v"] = _decode_value(payload.get("v"))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if payload.get("s") != sort_by:
+        raise HTTPException(status_code=400, detail="Cursor does not match sort_by")
+    return payload
+
+
+def keyset_filter(field: str, order: int, value, last_id: str) -> dict:
+    """Filter for documents strictly after (value, last_id) in the given order.
+
+    Missing/null sort values sort lowest in MongoDB, so they come last on
+    descending sorts and first on ascending ones.
+    """
+    if order == -1:
+        if value is None:
+            return {field: None, "id": {"$lt": last_id}}
+        return {"$or": [
+            {field: {"$lt": value}},
+            {field: value, "id": {"$lt": last_id}},
+            {field: None},
+        ]}
+
+    if value is None:
+        return {"$or": [
+            {field: None, "id": {"$gt": last_id}},
+            {field: {"$ne": None}},
+        ]}
+    return {"$or": [
+        {field: {"$gt": value}},
+        {field: value, "id": {"$gt": last_id}},
+    ]}
+
+
+def plan_keyset_page(query: dict, sort_by: str, cursor: Optional[str] = None, skip: int = 0) -> dict:
+    """Work out the filter, sort and skip for one page ordered by (sort key, id)"""
+    sort_by, field, order = resolve_sort(sort_by)
+    direction = "next"
+    find_query = query
+
+    if cursor:
+        payload = decode_cursor(cursor, sort_by)
+        direction = payload["d"]
+        # Walking backwards is the same walk with the order flipped
+        walk_order = order if direction == "next" else -order
+        find_query = {"$and": [query, keyset_filter(field, walk_order, payload.get("v"), payload["id"])]}
+        skip = 0
+    else:
+        walk_order = order
+
+    return {
+        "sort_by": sort_by,
+        "query": find_query,
+        "sort": [(field, walk_order), ("id", walk_order)],
+        "skip": skip,
+        "direction": direction,
+        "cursor": cursor,
+    }
+
+
+def finish_keyset_page(plan: dict, docs: list, limit: int) -> dict:
+    """Turn the limit + 1 documents fetched for `plan` into items and cursors"""
+    sort_by = plan["sort_by"]
+    direction = plan["direction"]
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if direction == "prev":
+        docs.reverse()
+
+    next_cursor = None
+    prev_cursor = None
+    if docs:
+        if direction == "next":
+            if has_more:
+                next_cursor = encode_cursor(sort_by, docs[-1], "next")
+            if plan["cursor"] or plan["skip"] > 0:
+                prev_cursor = encode_cursor(sort_by, docs[0], "prev")
+        else:
+            next_cursor = encode_cursor(sort_by, docs[-1], "next")
+            if has_more:
+                prev_cursor = encode_cursor(sort_by, docs[0], "prev")
+
+    return {"items": docs, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
+
+async def fetch_keyset_page(collection, query: dict, projection: dict, sort_by: str,
+                            limit: int, cursor: Optional[str] = None, skip: int = 0) -> dict:
+    """Fetch one page ordered by (sort key, id).
+
+    With a cursor the page is located through the index instead of skipping,
+    so latency does not depend on depth. Without a cursor `skip` is used for
+    classic offset paging. Returns items plus next/prev cursors.
+    """
+    plan = plan_keyset_page(query, sort_by, cursor, skip)
+    docs = await collection.find(plan["query"], projection).sort(
+        plan["sort"]
+    ).skip(plan["skip"]).limit(limit + 1).to_list(limit + 1)
+    return finish_keyset_page(plan, docs, limit)
@@ -0,0 +1,111 @@
+"""Submission rate limiting
+
+Daily per-IP quotas live in `rate_limits`, one document per (ip, day).
+reserve_submissions() checks and consumes quota in a single conditional
+find_one_and_update, so concurrent requests cannot overshoot the limit. Only
+when no document exists yet for the day is a fresh one inserted; the unique
+(ip_address, date) index turns a concurrent first insert into a retry of the
+conditional update. Without that index two racing first requests may each
+insert a document, but a rejection never depends on a write failing.
+Documents carry an `expires_at` date and are removed by a TTL index.
+
+An optional in-process token bucket in front of it (RATE_LIMIT_BURST_ENABLED,
+off by default) rejects bursts from a single IP before any database work.
+"""
+import os
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from services.database import db
+from services.utils import utc_today
+
+RATE_LIMIT_BURST_ENABLED = os.environ.get('RATE_LIMIT_BURST_ENABLED', 'false').lower() == 'true'
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', '10'))
+RATE_LIMIT_REFILL_PER_SECOND = float(os.environ.get('RATE_LIMIT_REFILL_PER_SECOND', '0.5'))
+RATE_LIMIT_MAX_TRACKED_IPS = int(os.environ.get('RATE_LIMIT_MAX_TRACKED_IPS', '100000'))
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets, least recently used keys are evicted first"""
+
+    def __init__(self, capacity: float, refill_per_second: float, max_keys: int):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def allow(self, key: str, cost: float = 1.0) -> bool:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [self.capacity, now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            tokens, last = bucket
+            bucket[0] = min(self.capacity, tokens + (now - last) * self.refill_per_second)
+            bucket[1] = now
+
+        if bucket[0] < cost:
+            return False
+        bucket[0] -= cost
+        return True
+
+
+burst_limiter = TokenBucketLimiter(RATE_LIMIT_BURST, RATE_LIMIT_REFILL_PER_SECOND, RATE_LIMIT_MAX_TRACKED_IPS)
+
+
+def allow_burst(client_ip: str) -> bool:
+    """In-process check, no database access"""
+    if not RATE_LIMIT_BURST_ENABLED:
+        return True
+    return burst_limiter.allow(client_ip)
+
+
+async def reserve_submissions(client_ip: str, count: int, daily_limit: int) -> bool:
+    """Atomically consume `count` units of today's quota. False if over the limit"""
+    if count > daily_limit:
+        return False
+
+    day = utc_today()
+    key = {"ip_address": client_ip, "date": day.strftime("%Y-%m-%d")}
+    for _ in range(2):
+        doc = await db.rate_limits.find_one_and_update(
+            {**key, "count": {"$lte": daily_limit - count}},
+            {"$inc": {"count": count}},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is not None:
+            return True
+        if await db.rate_limits.find_one(key, {"_id": 1}) is not None:
+            return False
+        try:
+            await db.rate_limits.insert_one({**key, "count": count, "expires_at": day + timedelta(days=2)})
+            return True
+        except DuplicateKeyError:
+            # A concurrent first request for the day inserted it; apply the limit to that
+            continue
+    return False
+
+
+async def release_submissions(client_ip: str, count: int) -> None:
+    """Give back `count` units of today's quota, e.g. for items that failed to save"""
+    await db.rate_limits.update_one(
+        {"ip_address": client_ip, "date": utc_today().strftime("%Y-%m-%d")},
+        {"$inc": {"count": -count}}
+    )
+
+
+async def get_used_submissions(client_ip: str) -> int:
+    """Units of today's quota already used"""
+    entry = await db.rate_limits.find_one(
+        {"ip_address": client_ip, "date": utc_today().strftime("%Y-%m-%d")},
+        {"_id": 0, "count": 1}
+    )
+    return entry.get("count", 0) if entry else 0
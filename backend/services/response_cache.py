@@ -0,0 +1,188 @@
+"""Response cache for public GET routes
+
+@cached_response(tags) caches the encoded response of a route, keyed on the
+route name plus its parsed parameters (so ?limit=50 and no limit share an
+entry) and the current version of each tag. Tags are cache version names
+(services.versions); every write path already bumps them, so a write makes
+older entries unreachable in every worker, and local entries of the tag are
+dropped when its version moves.
+
+Lookups go to an in-process LRU with TTL first, then to the shared backend
+when RESPONSE_CACHE_BACKEND=mongo (entries in the `response_cache`
+collection, expired by a TTL index). The default `local` backend keeps
+everything in process.
+
+Concurrent misses for the same key are coalesced: the first request runs
+the route and the others wait for its result (single-flight).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from functools import wraps
+from typing import Dict, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from pymongo.errors import PyMongoError
+
+from services.cache import TTLCache
+from services.database import db
+from services.responses import FastJSONResponse
+from services.versions import current_version, on_version_change
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'local').lower()
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', '30'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '1024'))
+
+# (status code, media type, body)
+CachedResponse = Tuple[int, str, bytes]
+
+
+class LocalBackend:
+    """Stand-in shared backend: nothing is shared beyond the route's LRU"""
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        return None
+
+    async def set(self, key: str, value: CachedResponse, ttl: float) -> None:
+        pass
+
+
+class MongoBackend:
+    """Entries shared by all workers in the `response_cache` collection"""
+
+    @staticmethod
+    def _id(key: str) -> str:
+        # Keys embed search strings; a digest keeps the _id index small
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        doc = await db.response_cache.find_one({"_id": self._id(key), "expires_at": {"$gt": datetime.now(timezone.utc)}})
+        if doc is None:
+            return None
+        return doc["status"], doc["media_type"], doc["body"]
+
+    async def set(self, key: str, value: CachedResponse, ttl: float) -> None:
+        status, media_type, body = value
+        await db.response_cache.replace_one({"_id": self._id(key)}, {
+            "status": status,
+            "media_type": media_type,
+            "body": body,
+            "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl),
+        }, upsert=True)
+
+
+def _build_backend():
+    if RESPONSE_CACHE_BACKEND == "mongo":
+        return MongoBackend()
+    return LocalBackend()
+
+
+backend = _build_backend()
+
+
+class RouteCache:
+    """Entries, in-flight computations and counters of one route"""
+
+    def __init__(self, name: str, tags: Tuple[str, ...], ttl: float):
+        self.name = name
+        self.tags = tags
+        self.ttl = ttl
+        self.entries = TTLCache(maxsize=RESPONSE_CACHE_MAX_ENTRIES, ttl=ttl)
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "shared_hits": 0, "misses": 0, "coalesced": 0, "backend_errors": 0}
+
+    def key(self, params: dict) -> str:
+        versions = ",".join(f"{tag}{current_version(tag)}" for tag in self.tags)
+        encoded = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+        return f"{self.name}|{versions}|{encoded}"
+
+
+_routes: Dict[str, RouteCache] = {}
+_watched_tags = set()
+
+
+def invalidate_tag(tag: str) -> None:
+    """Drop the local entries of every route tagged `tag`"""
+    for route in _routes.values():
+        if tag in route.tags:
+            route.entries.clear()
+
+
+def _encode(result) -> CachedResponse:
+    if isinstance(result, Response):
+        return result.status_code, result.media_type, bytes(result.body)
+    response = FastJSONResponse(jsonable_encoder(result))
+    return response.status_code, response.media_type, bytes(response.body)
+
+
+async def _compute(route: RouteCache, key: str, endpoint, kwargs: dict) -> CachedResponse:
+    try:
+        cached = await backend.get(key)
+    except PyMongoError as e:
+        route.stats["backend_errors"] += 1
+        logger.warning(f"Response cache read failed: {str(e)}")
+        cached = None
+    if cached is not None:
+        route.stats["shared_hits"] += 1
+        route.entries.set(key, cached)
+        return cached
+
+    route.stats["misses"] += 1
+    cached = _encode(await endpoint(**kwargs))
+    route.entries.set(key, cached)
+    try:
+        await backend.set(key, cached, route.ttl)
+    except PyMongoError as e:
+        route.stats["backend_errors"] += 1
+        logger.warning(f"Response cache write failed: {str(e)}")
+    return cached
+
+
+def cached_response(*tags: str, ttl: float = RESPONSE_CACHE_TTL):
+    """Cache a GET route's response until `ttl` passes or a tag's version moves"""
+    def decorator(endpoint):
+        route = RouteCache(endpoint.__name__, tags, ttl)
+        _routes[route.name] = route
+        for tag in set(tags) - _watched_tags:
+            _watched_tags.add(tag)
+            on_version_change(tag, lambda tag=tag: invalidate_tag(tag))
+
+        # functools.wraps keeps the signature FastAPI reads the parameters from
+        @wraps(endpoint)
+        async def wrapper(**kwargs):
+            if not RESPONSE_CACHE_ENABLED:
+                return await endpoint(**kwargs)
+            key = route.key(kwargs)
+            cached = route.entries.get(key)
+            if cached is not None:
+                route.stats["hits"] += 1
+            else:
+                future = route.in_flight.get(key)
+                if future is not None:
+                    route.stats["coalesced"] += 1
+                else:
+                    # A separate task, so a client disconnecting does not cancel it for the others
+                    future = asyncio.ensure_future(_compute(route, key, endpoint, kwargs))
+                    route.in_flight[key] = future
+                    future.add_done_callback(lambda _: route.in_flight.pop(key, None))
+                cached = await asyncio.shield(future)
+            status, media_type, body = cached
+            return Response(content=body, status_code=status, media_type=media_type)
+
+        return wrapper
+    return decorator
+
+
+def response_cache_stats() -> dict:
+    return {
+        "enabled": RESPONSE_CACHE_ENABLED,
+        "backend": type(backend).__name__,
+        "routes": {name: {**route.stats, "entries": len(route.entries)} for name, route in _routes.items()},
+    }
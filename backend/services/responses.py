@@ -0,0 +1,115 @@
+"""Fast-path JSON responses for read endpoints
+
+Read endpoints fetch documents with a projection limited to the fields of
+the response model and return them in a FastJSONResponse. FastAPI does not
+re-validate a returned Response, so the per-item model construction and
+jsonable_encoder pass are skipped and orjson does the encoding. When orjson
+is not installed the stdlib json encoder is used instead.
+
+FAST_RESPONSES_ENABLED=false restores response_model validation, which is
+useful when checking stored documents against the schema.
+
+Listings take a `fields=` parameter (sparse fieldsets). The projection then
+covers only the requested fields plus `id`, so less BSON is read and
+decoded, and sparse_items() trims each item to exactly those fields.
+"""
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Type
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+from models.schemas import Download, Submission, DAY_FIELDS
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+FAST_RESPONSES_ENABLED = os.environ.get('FAST_RESPONSES_ENABLED', 'true').lower() == 'true'
+
+
+def _default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_default)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def trusted_projection(model: Type[BaseModel]) -> Dict[str, int]:
+    """Mongo projection returning exactly the model's fields"""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+
+def _static_defaults(model: Type[BaseModel]) -> Dict[str, Any]:
+    # Factory defaults (id, created_at) are always stored with the document
+    return {
+        name: field.default for name, field in model.model_fields.items()
+        if field.default is not PydanticUndefined
+    }
+
+
+DOWNLOAD_PROJECTION = trusted_projection(Download)
+SUBMISSION_PROJECTION = trusted_projection(Submission)
+_DEFAULTS = {Download: _static_defaults(Download), Submission: _static_defaults(Submission)}
+
+
+def _format_days(item: dict) -> dict:
+    # Day fields are stored as dates but sent as YYYY-MM-DD, like the models do
+    for name in DAY_FIELDS:
+        value = item.get(name)
+        if isinstance(value, datetime):
+            item[name] = value.date().isoformat()
+    return item
+
+
+def with_defaults(docs, model: Type[BaseModel]) -> list:
+    """Fill fields older documents lack, as model validation would"""
+    defaults = _DEFAULTS[model]
+    return [_format_days({**defaults, **doc}) for doc in docs]
+
+
+def parse_fields(value: Optional[str], model: Type[BaseModel] = Download) -> Optional[List[str]]:
+    """Field names from a comma separated `fields` param; None means all fields"""
+    if not value:
+        return None
+    fields = list(dict.fromkeys(f.strip() for f in value.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field: {', '.join(unknown)}")
+    # Items are keyed and paged by id, so it is always returned
+    if "id" not in fields:
+        fields.insert(0, "id")
+    return fields
+
+
+def sparse_projection(fields: Optional[List[str]], full: Dict[str, int], extra: Iterable[str] = ()) -> Dict[str, int]:
+    """Projection for the requested fields, plus `extra` fields needed internally"""
+    if fields is None:
+        return full
+    return {"_id": 0, **{name: 1 for name in fields}, **{name: 1 for name in extra}}
+
+
+def sparse_items(docs, fields: Optional[List[str]], model: Type[BaseModel] = Download) -> list:
+    """with_defaults() for full items; otherwise exactly the requested fields"""
+    if fields is None:
+        return with_defaults(docs, model)
+    defaults = _DEFAULTS[model]
+    return [_format_days({name: doc.get(name, defaults.get(name)) for name in fields}) for doc in docs]
+
+
+def fast_response(content: Any):
+    """Return content encoded directly, or as-is for response_model validation"""
+    if FAST_RESPONSES_ENABLED:
+        return FastJSONResponse(content)
+    return content
@@ -0,0 +1,186 @@
+"""Catalog search
+
+By default a search is a case-insensitive substring match on the name.
+With search_mode=text it uses the weighted text index over name,
+description, tags and category instead, and the query syntax supports:
+
+- bare terms, matched by the text index (stemmed, any term matches)
+- "quoted phrases", which must appear as written
+- prefix* terms, matched against the lowercased `search_terms` array with
+  an anchored regex so the index on that field is used
+
+With SEARCH_INDEX_ENABLED, services.search_index answers both modes from
+memory, except text searches with phrases or prefixes.
+
+`search_terms` holds the tokens of name, category and tags. It is set by
+the catalog write path and filled in for older documents by
+backfill_search_terms().
+"""
+import html
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from services.database import db
+
+logger = logging.getLogger(__name__)
+
+MIN_PREFIX_LENGTH = 2
+SNIPPET_CHARS = 160
+BACKFILL_BATCH_SIZE = 1000
+
+_WORD = re.compile(r"\w+")
+_QUERY_PART = re.compile(r'"([^"]*)"|(\S+)')
+
+
+@dataclass
+class ParsedSearch:
+    terms: List[str] = field(default_factory=list)
+    phrases: List[str] = field(default_factory=list)
+    prefixes: List[str] = field(default_factory=list)
+
+    @property
+    def uses_text_index(self) -> bool:
+        return bool(self.terms or self.phrases)
+
+    def __bool__(self) -> bool:
+        return bool(self.terms or self.phrases or self.prefixes)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _WORD.findall(text.lower()) if text else []
+
+
+def search_terms_for(doc: dict) -> List[str]:
+    """Tokens that prefix search matches against"""
+    tokens = set(tokenize(doc.get("name")))
+    tokens.update(tokenize(doc.get("category")))
+    for tag in doc.get("tags") or []:
+        tokens.update(tokenize(tag))
+    return sorted(tokens)
+
+
+def parse_search(search: str) -> ParsedSearch:
+    parsed = ParsedSearch()
+    for phrase, word in _QUERY_PART.findall(search):
+        if phrase:
+            if phrase.strip():
+                parsed.phrases.append(phrase.strip())
+            continue
+        tokens = tokenize(word)
+        if word.endswith("*") and tokens and len(tokens[-1]) >= MIN_PREFIX_LENGTH:
+            parsed.terms.extend(tokens[:-1])
+            parsed.prefixes.append(tokens[-1])
+        else:
+            parsed.terms.extend(tokens)
+    return parsed
+
+
+def build_search_filter(search: str, mode: str = "substring") -> Optional[dict]:
+    """Mongo filter for a search string, or None when nothing is searchable"""
+    if mode == "substring":
+        return {"name": {"$regex": re.escape(search), "$options": "i"}}
+
+    parsed = parse_search(search)
+    if not parsed:
+        return None
+    query = {}
+    if parsed.uses_text_index:
+        parts = [f'"{p}"' for p in parsed.phrases] + parsed.terms
+        query["$text"] = {"$search": " ".join(parts)}
+    if parsed.prefixes:
+        query["$and"] = [{"search_terms": {"$regex": f"^{re.escape(p)}"}} for p in parsed.prefixes]
+    return query
+
+
+async def fetch_relevance_page(collection, query: dict, projection: dict, limit: int, skip: int = 0) -> List[dict]:
+    """One page ordered by text score, best match first"""
+    docs = await collection.find(
+        query, {**projection, "score": {"$meta": "textScore"}}
+    ).sort([("score", {"$meta": "textScore"}), ("id", 1)]).skip(skip).limit(limit).to_list(limit)
+    for doc in docs:
+        doc.pop("score", None)
+    return docs
+
+
+def _highlight_pattern(parsed: ParsedSearch) -> Optional[re.Pattern]:
+    # Words starting with a term also cover the stems the text index matched
+    needles = [re.escape(p) for p in parsed.phrases]
+    needles += [rf"\b{re.escape(t)}\w*" for t in parsed.terms + parsed.prefixes]
+    if not needles:
+        return None
+    return re.compile("|".join(sorted(needles, key=len, reverse=True)), re.IGNORECASE)
+
+
+def _mark(text: str, pattern: re.Pattern) -> Optional[str]:
+    out = []
+    last = 0
+    for match in pattern.finditer(text):
+        if match.start() == match.end():
+            continue
+        out.append(html.escape(text[last:match.start()]))
+        out.append(f"<mark>{html.escape(match.group())}</mark>")
+        last = match.end()
+    if not out:
+        return None
+    out.append(html.escape(text[last:]))
+    return "".join(out)
+
+
+def _snippet(text: str, pattern: re.Pattern) -> Optional[str]:
+    match = pattern.search(text)
+    if not match:
+        return None
+    start = max(0, match.start() - SNIPPET_CHARS // 2)
+    end = min(len(text), start + SNIPPET_CHARS)
+    snippet = _mark(text[start:end], pattern)
+    if snippet is None:
+        return None
+    return ("…" if start else "") + snippet + ("…" if end < len(text) else "")
+
+
+def build_highlights(docs: Iterable[dict], search: str) -> Dict[str, Dict[str, str]]:
+    """Escaped HTML with <mark> around matches, keyed by download id"""
+    pattern = _highlight_pattern(parse_search(search))
+    if pattern is None:
+        return {}
+    highlights = {}
+    for doc in docs:
+        fields = {}
+        if doc.get("name"):
+            marked = _mark(doc["name"], pattern)
+            if marked:
+                fields["name"] = marked
+        if doc.get("description"):
+            snippet = _snippet(doc["description"], pattern)
+            if snippet:
+                fields["description"] = snippet
+        matched_tags = [tag for tag in doc.get("tags") or [] if pattern.search(tag)]
+        if matched_tags:
+            fields["tags"] = ", ".join(_mark(tag, pattern) for tag in matched_tags)
+        if fields:
+            highlights[doc["id"]] = fields
+    return highlights
+
+
+async def backfill_search_terms() -> int:
+    """Set `search_terms` on downloads written before the field existed"""
+    updated = 0
+    while True:
+        docs = await db.downloads.find(
+            {"search_terms": {"$exists": False}},
+            {"_id": 1, "name": 1, "category": 1, "tags": 1}
+        ).limit(BACKFILL_BATCH_SIZE).to_list(BACKFILL_BATCH_SIZE)
+        if not docs:
+            break
+        await db.downloads.bulk_write(
+            [UpdateOne({"_id": doc["_id"]}, {"$set": {"search_terms": search_terms_for(doc)}}) for doc in docs],
+            ordered=False
+        )
+        updated += len(docs)
+    if updated:
+        logger.info(f"Backfilled search terms for {updated} downloads")
+    return updated
@@ -0,0 +1,370 @@
+"""In-process search index over approved downloads
+
+Optional (SEARCH_INDEX_ENABLED=true). Each worker keeps an inverted index
+in memory and answers `search` without a regex scan:
+
+- token postings: word -> slots of documents containing it (name, category,
+  tags and description)
+- name trigrams: trigram -> slots, used for substring matches, verified
+  against the lowercased name
+- vocabulary trigrams: trigram -> words, used to find words within a small
+  edit distance when a query word matches nothing (typo tolerance)
+
+Documents are stored by integer slot so postings stay compact. The catalog
+write path updates the index incrementally. When another worker moves the
+catalog version (services.versions), the index is rebuilt and callers fall
+back to the database until it is; a periodic rebuild runs as well. Rebuilds
+are built in a thread, one at a time, and swapped in, replaying any
+incremental updates made meanwhile.
+
+search() returns the ids of the best SEARCH_INDEX_MAX_RESULTS matches,
+ranked by score, and the full number of matches. Callers filter, page and
+hydrate the ids with an `id $in` query. Query words are matched as whole
+words, substrings of the name or, failing both, close spellings. The index
+answers substring searches and plain text-mode searches; text-mode searches
+using quoted phrases or the prefix* syntax go to MongoDB (see handles()).
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo.errors import PyMongoError
+
+from services.database import db
+from services.search import parse_search, tokenize
+from services.versions import CATALOG_VERSION_KEY, on_version_change
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_ENABLED = os.environ.get('SEARCH_INDEX_ENABLED', 'false').lower() == 'true'
+SEARCH_INDEX_REBUILD_SECONDS = float(os.environ.get('SEARCH_INDEX_REBUILD_SECONDS', '300'))
+SEARCH_INDEX_MAX_RESULTS = int(os.environ.get('SEARCH_INDEX_MAX_RESULTS', '5000'))
+
+INDEX_PROJECTION = {"_id": 0, "id": 1, "name": 1, "category": 1, "tags": 1, "description": 1}
+
+# Score per query word by how it matched
+EXACT_NAME_SCORE = 4
+EXACT_SCORE = 2
+FUZZY_SCORE = 1
+
+_EMPTY: Set[int] = frozenset()
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, returning limit + 1 once it is exceeded"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class CatalogSearchIndex:
+    def __init__(self):
+        self._ids: List[Optional[str]] = []
+        self._names: List[Optional[str]] = []
+        self._slot_of: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._name_tokens: Dict[str, Set[int]] = defaultdict(set)
+        self._tokens: Dict[str, Set[int]] = defaultdict(set)
+        self._name_trigrams: Dict[str, Set[int]] = defaultdict(set)
+        self._vocab_trigrams: Dict[str, Set[str]] = defaultdict(set)
+        self._doc_tokens: List[Optional[tuple]] = []
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def add(self, doc: dict) -> None:
+        if doc["id"] in self._slot_of:
+            self.remove(doc["id"])
+        name = (doc.get("name") or "").lower()
+        name_tokens = set(tokenize(name))
+        tokens = set(name_tokens)
+        tokens.update(tokenize(doc.get("category")))
+        tokens.update(tokenize(doc.get("description")))
+        for tag in doc.get("tags") or []:
+            tokens.update(tokenize(tag))
+
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot] = doc["id"]
+            self._names[slot] = name
+            self._doc_tokens[slot] = (name_tokens, tokens)
+        else:
+            slot = len(self._ids)
+            self._ids.append(doc["id"])
+            self._names.append(name)
+            self._doc_tokens.append((name_tokens, tokens))
+        self._slot_of[doc["id"]] = slot
+
+        for token in name_tokens:
+            self._name_tokens[token].add(slot)
+        for token in tokens:
+            postings = self._tokens[token]
+            if not postings:
+                for gram in trigrams(token):
+                    self._vocab_trigrams[gram].add(token)
+            postings.add(slot)
+        for gram in trigrams(name):
+            self._name_trigrams[gram].add(slot)
+
+    def remove(self, download_id: str) -> None:
+        slot = self._slot_of.pop(download_id, None)
+        if slot is None:
+            return
+        name_tokens, tokens = self._doc_tokens[slot]
+        for token in name_tokens:
+            self._discard(self._name_tokens, token, slot)
+        for token in tokens:
+            self._discard(self._tokens, token, slot)
+            if token not in self._tokens:
+                for gram in trigrams(token):
+                    self._discard(self._vocab_trigrams, gram, token)
+        for gram in trigrams(self._names[slot]):
+            self._discard(self._name_trigrams, gram, slot)
+        self._ids[slot] = None
+        self._names[slot] = None
+        self._doc_tokens[slot] = None
+        self._free.append(slot)
+
+    @staticmethod
+    def _discard(postings: dict, key, value) -> None:
+        entries = postings.get(key)
+        if entries is not None:
+            entries.discard(value)
+            if not entries:
+                del postings[key]
+
+    def _substring_slots(self, word: str) -> Set[int]:
+        grams = trigrams(word)
+        # Leading/trailing padding only matches at word edges; use inner grams
+        inner = [g for g in grams if " " not in g] or list(grams)
+        postings = sorted((self._name_trigrams.get(g, set()) for g in inner), key=len)
+        if not postings or not postings[0]:
+            return set()
+        candidates = set.intersection(*postings)
+        return {slot for slot in candidates if word in self._names[slot]}
+
+    def _fuzzy_tokens(self, word: str) -> List[str]:
+        limit = 1 if len(word) < 8 else 2
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in trigrams(word):
+            for token in self._vocab_trigrams.get(gram, ()):
+                shared[token] += 1
+        return [token for token, _ in sorted(shared.items(), key=lambda kv: -kv[1])[:200]
+                if edit_distance(word, token, limit) <= limit]
+
+    def search(self, query: str, limit: int = SEARCH_INDEX_MAX_RESULTS) -> List[str]:
+        """Ids of documents matching every query word, best first"""
+        return self.match(query, limit)[0]
+
+    def match(self, query: str, limit: int = SEARCH_INDEX_MAX_RESULTS) -> Tuple[List[str], int]:
+        """The best `limit` matching ids, best first, and the number of matches"""
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words:
+            return [], 0
+        # Scores are accumulated with Counter.update, which runs in C
+        scores = Counter()
+        matches = []
+        for word in words:
+            matched = self._tokens.get(word) or set()
+            if len(word) >= 3:
+                matched = matched | self._substring_slots(word)
+            weight = EXACT_SCORE
+            if not matched and len(word) >= 4:
+                matched = set().union(*(self._tokens[token] for token in self._fuzzy_tokens(word)))
+                weight = FUZZY_SCORE
+            if not matched:
+                return [], 0
+            matches.append(matched)
+            for _ in range(weight):
+                scores.update(matched)
+            for _ in range(EXACT_NAME_SCORE - EXACT_SCORE):
+                scores.update(self._name_tokens.get(word, _EMPTY))
+
+        candidates = set.intersection(*sorted(matches, key=len))
+        ranked = sorted(candidates, key=scores.__getitem__, reverse=True)[:limit]
+        return [self._ids[slot] for slot in ranked], len(candidates)
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self._slot_of),
+            "tokens": len(self._tokens),
+            "name_trigrams": len(self._name_trigrams),
+        }
+
+
+class SearchIndexService:
+    """Owns the live index, its rebuilds and the incremental update hooks"""
+
+    def __init__(self, enabled: bool, rebuild_seconds: float):
+        self.enabled = enabled
+        self.rebuild_seconds = rebuild_seconds
+        self.index: Optional[CatalogSearchIndex] = None
+        self._pending: Optional[list] = None
+        # The periodic rebuild and replace_downloads must not share _pending
+        self._rebuild_lock = asyncio.Lock()
+        # Catalog changes seen / reflected by the live index
+        self._generation = 0
+        self._loaded_generation = 0
+        self._catch_up: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self._built_at: Optional[float] = None
+        self._build_ms: Optional[float] = None
+        self._queries = 0
+        self._query_ms_total = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self.enabled and self.index is not None and self._loaded_generation == self._generation
+
+    async def rebuild(self) -> None:
+        async with self._rebuild_lock:
+            generation = self._generation
+            await self._rebuild()
+            self._loaded_generation = generation
+
+    def handles(self, search: str, mode: str) -> bool:
+        """Whether search() can answer `search` in search mode `mode`"""
+        if not self.ready:
+            return False
+        if mode == "substring":
+            return True
+        # Phrases and prefixes need the text index semantics
+        parsed = parse_search(search)
+        return not (parsed.phrases or parsed.prefixes)
+
+    def catalog_changed(self) -> None:
+        """Stop answering from memory until a rebuild has picked up the change"""
+        if self.index is None:
+            return
+        self._generation += 1
+        if self._catch_up is None or self._catch_up.done():
+            self._catch_up = asyncio.create_task(self._rebuild_changed())
+
+    async def _rebuild_changed(self) -> None:
+        while self._loaded_generation != self._generation:
+            try:
+                await self.rebuild()
+            except PyMongoError as e:
+                # The periodic rebuild retries
+                logger.warning(f"Search index rebuild failed: {str(e)}")
+                return
+
+    @staticmethod
+    def _build(docs: List[dict]) -> CatalogSearchIndex:
+        index = CatalogSearchIndex()
+        for doc in docs:
+            index.add(doc)
+        return index
+
+    async def _rebuild(self) -> None:
+        started = time.perf_counter()
+        # Updates made while scanning and building are replayed onto the new index
+        self._pending = []
+        try:
+            docs = await db.downloads.find({"approved": True}, INDEX_PROJECTION).to_list(None)
+            index = await asyncio.to_thread(self._build, docs)
+            for op, arg in self._pending:
+                if op == "add":
+                    index.add(arg)
+                else:
+                    index.remove(arg)
+        finally:
+            self._pending = None
+        self.index = index
+        self._built_at = time.time()
+        self._build_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Search index built: {len(index)} documents in {self._build_ms:.0f} ms")
+
+    def add(self, docs: Iterable[dict]) -> None:
+        if not self.enabled:
+            return
+        for doc in docs:
+            if not doc.get("approved", True):
+                continue
+            if self.index is not None:
+                self.index.add(doc)
+            if self._pending is not None:
+                self._pending.append(("add", doc))
+
+    def remove(self, download_ids: Iterable[str]) -> None:
+        if not self.enabled:
+            return
+        for download_id in download_ids:
+            if self.index is not None:
+                self.index.remove(download_id)
+            if self._pending is not None:
+                self._pending.append(("remove", download_id))
+
+    def search(self, query: str) -> Tuple[List[str], int]:
+        """Ranked ids of the best matches and the full number of matches"""
+        started = time.perf_counter()
+        ids, matches = self.index.match(query)
+        self._queries += 1
+        self._query_ms_total += (time.perf_counter() - started) * 1000
+        return ids, matches
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.rebuild()
+            except PyMongoError as e:
+                logger.warning(f"Search index rebuild failed: {str(e)}")
+            await asyncio.sleep(self.rebuild_seconds)
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._catch_up is not None:
+            self._catch_up.cancel()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "ready": self.ready,
+            **(self.index.stats() if self.index is not None else {}),
+            "built_at": self._built_at,
+            "build_ms": self._build_ms,
+            "queries": self._queries,
+            "avg_query_ms": self._query_ms_total / self._queries if self._queries else None,
+        }
+
+
+async def fetch_ranked_page(collection, query: dict, ranked_ids: List[str], projection: dict,
+                            limit: int, skip: int = 0) -> List[dict]:
+    """One page of `query` results in the order of `ranked_ids`"""
+    matched = {doc["id"] async for doc in collection.find(query, {"_id": 0, "id": 1})}
+    page_ids = [i for i in ranked_ids if i in matched][skip:skip + limit]
+    docs = await collection.find({"id": {"$in": page_ids}}, projection).to_list(limit)
+    by_id = {doc["id"]: doc for doc in docs}
+    return [by_id[i] for i in page_ids if i in by_id]
+
+
+search_index = SearchIndexService(SEARCH_INDEX_ENABLED, SEARCH_INDEX_REBUILD_SECONDS)
+on_version_change(CATALOG_VERSION_KEY, search_index.catalog_changed, remote_only=True)
@@ -0,0 +1,112 @@
+"""Cached site settings
+
+Settings are read on almost every request but change a few times a month,
+so they are loaded once per process and served from memory. Writers read
+the stored document with fetch_site_settings(), never the snapshot, and
+save_site_settings() $sets only the fields they change, so concurrent
+writes on other workers are not overwritten. Saving bumps the
+`site_settings` cache version so other workers reload on their next read.
+"""
+import asyncio
+import os
+import time
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+from services.database import db
+from services.versions import bump_version, on_version_change
+from models.schemas import SiteSettings
+
+SETTINGS_VERSION_KEY = "site_settings"
+# Backstop in case a version change is missed
+SETTINGS_CACHE_TTL = float(os.environ.get('SETTINGS_CACHE_TTL', '300'))
+
+SENSITIVE_FIELDS = ("resend_api_key", "recaptcha_secret_key", "admin_password_hash")
+
+_snapshot: Optional[Mapping[str, Any]] = None
+_loaded_at = 0.0
+# Moved by every invalidation, so a load that overlapped one is not kept
+_generation = 0
+_load_lock = asyncio.Lock()
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Plain dict/list copy of a (part of a) frozen snapshot"""
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+def invalidate_site_settings() -> None:
+    """Drop the cached settings of this process"""
+    global _snapshot, _generation
+    _snapshot = None
+    _generation += 1
+
+
+on_version_change(SETTINGS_VERSION_KEY, invalidate_site_settings)
+
+
+async def get_site_settings() -> Mapping[str, Any]:
+    """Read-only snapshot of site settings, loaded at most once per TTL"""
+    global _snapshot, _loaded_at
+    if _snapshot is not None and time.monotonic() - _loaded_at < SETTINGS_CACHE_TTL:
+        return _snapshot
+
+    async with _load_lock:
+        if _snapshot is not None and time.monotonic() - _loaded_at < SETTINGS_CACHE_TTL:
+            return _snapshot
+        generation = _generation
+        settings = await db.site_settings.find_one({"id": "site_settings"}, {"_id": 0})
+        if not settings:
+            settings = SiteSettings().model_dump()
+            await db.site_settings.insert_one(dict(settings))
+        if generation != _generation:
+            # A write landed while reading; the document may predate it
+            return _freeze(settings)
+        _snapshot = _freeze(settings)
+        _loaded_at = time.monotonic()
+        return _snapshot
+
+
+async def fetch_site_settings() -> dict:
+    """Site settings as stored right now, for callers about to change them"""
+    settings = await db.site_settings.find_one({"id": "site_settings"}, {"_id": 0})
+    if settings:
+        return settings
+    settings = SiteSettings().model_dump()
+    defaults = {k: v for k, v in settings.items() if k != "id"}
+    await db.site_settings.update_one({"id": "site_settings"}, {"$setOnInsert": defaults}, upsert=True)
+    return settings
+
+
+async def save_site_settings(changes: dict, condition: Optional[dict] = None) -> bool:
+    """Set the changed fields and invalidate cached copies in every worker.
+
+    With a condition, the fields are only set if the stored document also
+    matches it; returns False when it did not.
+    """
+    if condition is None:
+        await db.site_settings.update_one({"id": "site_settings"}, {"$set": changes}, upsert=True)
+    else:
+        result = await db.site_settings.update_one({"id": "site_settings", **condition}, {"$set": changes})
+        if not result.matched_count:
+            return False
+    invalidate_site_settings()
+    await bump_version(SETTINGS_VERSION_KEY)
+    return True
+
+
+def public_site_settings(settings: Mapping[str, Any]) -> dict:
+    """Settings without secrets, as a plain dict"""
+    return {k: thaw(v) for k, v in settings.items() if k not in SENSITIVE_FIELDS}
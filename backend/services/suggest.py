@@ -0,0 +1,346 @@
+"""Search-box suggestions from an in-memory prefix index
+
+Keys are normalized download names, the name from each later word onwards
+("vlc media player", "media player", "player") and tags. They are packed
+into one sorted list, so every prefix is a contiguous range found with two
+binary searches. Entries (text, id, score) live in parallel arrays and are
+ranked by download_count; a tag scores the sum over its downloads.
+
+Every prefix matching more than SCAN_LIMIT keys (the nodes of the implied
+trie with large subtrees) has its best entries precomputed, so it is a dict
+lookup; any other prefix scans at most SCAN_LIMIT keys. When removals leave
+a precomputed list short, its whole range is scanned until compaction.
+
+Catalog writes do not rebuild the packed arrays. Additions go to a small
+unsorted delta list and removals to a tombstone set, both consulted at query
+time; once they grow past COMPACT_THRESHOLD the arrays are rebuilt from
+memory. When another worker moves the catalog version (services.versions),
+the index is reloaded from the database and callers fall back to the
+database until it is. A periodic reload picks up download_count changes.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import re
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo.errors import PyMongoError
+
+from services.database import db
+from services.versions import CATALOG_VERSION_KEY, on_version_change
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_RELOAD_SECONDS = float(os.environ.get('SUGGEST_RELOAD_SECONDS', '300'))
+TOP_K_STORED = 20
+SCAN_LIMIT = 256
+MAX_KEY_WORDS = 6
+MAX_KEY_CHARS = 48
+COMPACT_THRESHOLD = 500
+
+_NON_WORD = re.compile(r"[^\w]+")
+# Sorts after every character a normalized key can contain
+_HIGH = "\U0010ffff"
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase, strip accents and collapse punctuation into single spaces"""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", stripped.lower()).strip()
+
+
+def keys_for_name(name: str) -> List[str]:
+    words = normalize(name).split()
+    return [" ".join(words[i:])[:MAX_KEY_CHARS] for i in range(min(len(words), MAX_KEY_WORDS))]
+
+
+class PackedPrefixIndex:
+    """Immutable sorted-key index with precomputed top entries per short prefix"""
+
+    def __init__(self, entries: List[Tuple[str, Optional[str], int, List[str]]]):
+        # entries: (text, download id or None for tags, score, keys)
+        self.texts: List[str] = []
+        self.ids: List[Optional[str]] = []
+        self.scores = array("q")
+        pairs = []
+        for text, download_id, score, keys in entries:
+            entry = len(self.texts)
+            self.texts.append(text)
+            self.ids.append(download_id)
+            self.scores.append(score)
+            pairs.extend((key, entry) for key in set(keys))
+        pairs.sort()
+        self.keys: List[str] = [key for key, _ in pairs]
+        self.key_entries = array("I", (entry for _, entry in pairs))
+
+        # Any prefix matching more than SCAN_LIMIT keys gets its top entries
+        # precomputed, so a query never scans more than SCAN_LIMIT keys
+        self.top: Dict[str, array] = {}
+        n = len(self.keys)
+        depth = 1
+        while True:
+            found = False
+            i = 0
+            while i < n:
+                key = self.keys[i]
+                if len(key) < depth:
+                    i += 1
+                    continue
+                prefix = key[:depth]
+                j = bisect_left(self.keys, prefix + _HIGH, i)
+                if j - i > SCAN_LIMIT:
+                    found = True
+                    self.top[prefix] = array("I", heapq.nlargest(
+                        TOP_K_STORED, set(self.key_entries[i:j]), key=self.scores.__getitem__
+                    ))
+                i = j
+            if not found:
+                break
+            depth += 1
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def candidates(self, prefix: str, count: int, scan: bool = False) -> Iterable[int]:
+        """Entry numbers for `prefix`, best first.
+
+        Precomputed prefixes hold only TOP_K_STORED entries; `scan` ranks
+        the whole prefix range instead.
+        """
+        top = None if scan else self.top.get(prefix)
+        if top is not None:
+            return top
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + _HIGH, lo)
+        return heapq.nlargest(count, set(self.key_entries[lo:hi]), key=self.scores.__getitem__)
+
+
+class SuggestionService:
+    def __init__(self, reload_seconds: float):
+        self.reload_seconds = reload_seconds
+        self._packed: Optional[PackedPrefixIndex] = None
+        self._delta: List[Tuple[str, Optional[str], int, List[str]]] = []
+        self._tombstones: set = set()
+        self._task: Optional[asyncio.Task] = None
+        self._loaded_at: Optional[float] = None
+        self._rebuilding = False
+        self._compaction: Optional[asyncio.Task] = None
+        self._compactions = 0
+        # Catalog changes seen / reflected by the loaded index
+        self._generation = 0
+        self._loaded_generation = 0
+        self._reload_lock = asyncio.Lock()
+        self._catch_up: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._packed is not None and self._loaded_generation == self._generation
+
+    @staticmethod
+    def _entries_from(docs: Iterable[dict]) -> list:
+        entries = []
+        tag_scores: Dict[str, int] = defaultdict(int)
+        tag_texts: Dict[str, str] = {}
+        for doc in docs:
+            score = doc.get("download_count") or 0
+            entries.append((doc.get("name") or "", doc["id"], score, keys_for_name(doc.get("name"))))
+            for tag in doc.get("tags") or []:
+                key = normalize(tag)
+                if key:
+                    tag_scores[key] += score
+                    tag_texts.setdefault(key, tag)
+        entries.extend((tag_texts[key], None, score, [key[:MAX_KEY_CHARS]]) for key, score in tag_scores.items())
+        return entries
+
+    async def _rebuild(self, build) -> None:
+        """Build a new packed index off the event loop and swap it in.
+
+        Writes made meanwhile are kept in the delta and tombstones.
+        """
+        self._rebuilding = True
+        delta_before = len(self._delta)
+        tombstones_before = set(self._tombstones)
+        try:
+            packed = await build(self._delta[:delta_before], tombstones_before)
+        finally:
+            self._rebuilding = False
+        self._packed = packed
+        self._delta = self._delta[delta_before:]
+        self._tombstones -= tombstones_before
+
+    async def reload(self) -> None:
+        async with self._reload_lock:
+            generation = self._generation
+            await self._reload()
+            self._loaded_generation = generation
+
+    async def _reload(self) -> None:
+        started = time.perf_counter()
+        if self._compaction is not None and not self._compaction.done():
+            await self._compaction
+
+        async def build(delta, tombstones):
+            docs = await db.downloads.find(
+                {"approved": True}, {"_id": 0, "id": 1, "name": 1, "tags": 1, "download_count": 1}
+            ).to_list(None)
+            return await asyncio.to_thread(PackedPrefixIndex, self._entries_from(docs))
+
+        await self._rebuild(build)
+        self._loaded_at = time.time()
+        logger.info(f"Suggestion index loaded: {len(self._packed)} entries in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    async def compact(self) -> None:
+        """Fold the delta and tombstones into the packed index, from memory"""
+        packed = self._packed
+
+        def build_compacted(delta, tombstones):
+            # Entries keep the keys they were indexed under
+            entry_keys: Dict[int, List[str]] = defaultdict(list)
+            for key, entry in zip(packed.keys, packed.key_entries):
+                entry_keys[entry].append(key)
+            live = [
+                (packed.texts[i], packed.ids[i], packed.scores[i], entry_keys[i])
+                for i in range(len(packed)) if packed.ids[i] not in tombstones
+            ]
+            return PackedPrefixIndex(live + delta)
+
+        async def build(delta, tombstones):
+            return await asyncio.to_thread(build_compacted, delta, tombstones)
+
+        await self._rebuild(build)
+        self._compactions += 1
+
+    def catalog_changed(self) -> None:
+        """Stop answering from memory until a reload has picked up the change"""
+        if self._packed is None:
+            return
+        self._generation += 1
+        if self._catch_up is None or self._catch_up.done():
+            self._catch_up = asyncio.create_task(self._reload_changed())
+
+    async def _reload_changed(self) -> None:
+        while self._loaded_generation != self._generation:
+            try:
+                await self.reload()
+            except PyMongoError as e:
+                # The periodic reload retries
+                logger.warning(f"Suggestion index reload failed: {str(e)}")
+                return
+
+    def _maybe_compact(self) -> None:
+        if not self._rebuilding and len(self._delta) + len(self._tombstones) > COMPACT_THRESHOLD:
+            self._rebuilding = True
+            self._compaction = asyncio.create_task(self.compact())
+
+    def add(self, docs: Iterable[dict]) -> None:
+        if self._packed is None:
+            return
+        # Tag totals are refreshed by the next reload; new tags appear right away
+        self._delta.extend(self._entries_from(doc for doc in docs if doc.get("approved", True)))
+        self._maybe_compact()
+
+    def remove(self, download_ids: Iterable[str]) -> None:
+        if self._packed is None:
+            return
+        self._tombstones.update(download_ids)
+        self._delta = [entry for entry in self._delta if entry[1] not in self._tombstones]
+        self._maybe_compact()
+
+    def suggest(self, q: str, limit: int) -> List[dict]:
+        prefix = normalize(q)[:MAX_KEY_CHARS]
+        if not prefix or self._packed is None:
+            return []
+        packed = self._packed
+        results: Dict[str, Tuple[int, dict]] = {}
+
+        def offer(text: str, download_id: Optional[str], score: int) -> None:
+            key = text.lower()
+            if key not in results or results[key][0] < score:
+                results[key] = (score, {
+                    "text": text,
+                    "type": "download" if download_id else "tag",
+                    "id": download_id,
+                })
+
+        wanted = limit + len(self._tombstones)
+        scan = False
+        while True:
+            for entry in packed.candidates(prefix, wanted, scan):
+                if packed.ids[entry] in self._tombstones:
+                    continue
+                offer(packed.texts[entry], packed.ids[entry], packed.scores[entry])
+                if len(results) >= wanted:
+                    break
+            # Tombstones can leave a precomputed list short; rank the range instead
+            if scan or len(results) >= limit or not self._tombstones or prefix not in packed.top:
+                break
+            scan = True
+        for text, download_id, score, keys in self._delta:
+            if any(key.startswith(prefix) for key in keys):
+                offer(text, download_id, score)
+
+        ranked = sorted(results.values(), key=lambda item: -item[0])
+        return [item for _, item in ranked[:limit]]
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reload()
+            except PyMongoError as e:
+                logger.warning(f"Suggestion index reload failed: {str(e)}")
+            await asyncio.sleep(self.reload_seconds)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._compaction is not None:
+            self._compaction.cancel()
+        if self._catch_up is not None:
+            self._catch_up.cancel()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "entries": len(self._packed) if self._packed is not None else 0,
+            "keys": len(self._packed.keys) if self._packed is not None else 0,
+            "delta": len(self._delta),
+            "tombstones": len(self._tombstones),
+            "compactions": self._compactions,
+            "loaded_at": self._loaded_at,
+        }
+
+
+suggestions = SuggestionService(SUGGEST_RELOAD_SECONDS)
+on_version_change(CATALOG_VERSION_KEY, suggestions.catalog_changed, remote_only=True)
+
+
+async def get_suggestions(q: str, limit: int) -> List[dict]:
+    """Suggestions from memory, or from the search_terms index until it is loaded"""
+    if suggestions.ready:
+        return suggestions.suggest(q, limit)
+    words = normalize(q).split()
+    if not words:
+        return []
+    docs = await db.downloads.find(
+        {"approved": True, "search_terms": {"$regex": f"^{re.escape(words[-1])}"}},
+        {"_id": 0, "id": 1, "name": 1}
+    ).sort("download_count", -1).limit(limit).to_list(limit)
+    return [{"text": doc["name"], "type": "download", "id": doc["id"]} for doc in docs]
@@ -0,0 +1,69 @@
+"""Email templates
+
+Templates live in backend/templates/email and are compiled once when this
+module is imported. Autoescaping is on, so user-supplied submission fields
+cannot inject markup. FRONTEND_URL and the links derived from it are bound
+as globals instead of being looked up per render.
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, select_autoescape
+
+from services.database import FRONTEND_URL
+
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "templates" / "email"
+TEMPLATE_NAMES = (
+    "submission_received.html",
+    "bulk_submission_received.html",
+    "submission_approved.html",
+    "admin_submissions_digest.html",
+)
+# Upper bound on rows listed in one mail
+MAX_LISTED_ITEMS = 50
+
+_env = Environment(
+    loader=FileSystemLoader(str(TEMPLATE_DIR)),
+    autoescape=select_autoescape(["html"]),
+    # Templates ship with the code; never stat the files again after loading
+    auto_reload=False,
+    undefined=StrictUndefined,
+    trim_blocks=True,
+    lstrip_blocks=True,
+)
+_env.globals.update(
+    frontend_url=FRONTEND_URL,
+    submit_url=f"{FRONTEND_URL}/submit" if FRONTEND_URL else None,
+)
+_templates = {name: _env.get_template(name) for name in TEMPLATE_NAMES}
+
+
+def _fields(doc: dict) -> dict:
+    # StrictUndefined would reject missing keys; absent fields render as N/A
+    fields = {key: doc.get(key) for key in ("name", "type", "category", "file_size", "submission_date", "created_at")}
+    if isinstance(fields["submission_date"], datetime):
+        fields["submission_date"] = fields["submission_date"].date().isoformat()
+    if isinstance(fields["created_at"], datetime):
+        fields["created_at"] = fields["created_at"].isoformat()
+    return fields
+
+
+def render_submission_received(submission: dict) -> str:
+    return _templates["submission_received.html"].render(submission=_fields(submission))
+
+
+def render_bulk_submission_received(submissions: List[dict]) -> str:
+    return _templates["bulk_submission_received.html"].render(
+        submissions=[_fields(s) for s in submissions[:MAX_LISTED_ITEMS]]
+    )
+
+
+def render_submission_approved(submission: dict) -> str:
+    return _templates["submission_approved.html"].render(submission=_fields(submission))
+
+
+def render_admin_submissions_digest(items: List[dict]) -> str:
+    return _templates["admin_submissions_digest.html"].render(
+        count=len(items), items=[_fields(s) for s in items[:MAX_LISTED_ITEMS]]
+    )
@@ -1,7 +1,8 @@
 """Utility functions"""
 import hashlib
 import secrets
-from typing import Optional
+from datetime import datetime, timezone, timedelta
+from typing import Any, Optional
 from fastapi import HTTPException
 
 
@@ -43,3 +44,31 @@ def validate_http_url(url: str) -> str:
     if not (url.startswith("http://") or url.startswith("https://")):
         raise HTTPException(status_code=400, detail="Site URL must start with http:// or https://")
     return url
+
+
+def utc_today() -> datetime:
+    """Midnight UTC of the current day, the stored form of day fields"""
+    return datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def parse_day(value: str, end_of_day: bool = False) -> datetime:
+    """Parse a YYYY-MM-DD query param; end_of_day gives the start of the next day"""
+    try:
+        day = datetime.strptime(value.strip()[:10], "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be formatted YYYY-MM-DD")
+    return day + timedelta(days=1) if end_of_day else day
+
+
+def as_utc(value: Any) -> Optional[datetime]:
+    """Aware UTC datetime from a stored date or a not yet migrated ISO string"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
@@ -0,0 +1,168 @@
+"""Cross-worker cache versions
+
+Each cached data set (site settings, catalog, ...) has a version counter
+stored in the `cache_versions` collection. Writers bump it; every worker
+watches the collection and drops its local caches when a counter moves.
+Download counts have their own counter, so the many count flushes leave
+caches of catalog content alone. The
+watcher uses a change stream when the deployment supports one and falls
+back to polling on a single interval otherwise, so request paths never read
+it. The counters also make up the ETags of public read endpoints.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure, PyMongoError
+
+from services.database import db
+
+logger = logging.getLogger(__name__)
+
+VERSION_POLL_SECONDS = float(os.environ.get('VERSION_POLL_SECONDS', '2'))
+
+CATALOG_VERSION_KEY = "catalog"
+COUNTS_VERSION_KEY = "counts"
+CATEGORIES_VERSION_KEY = "categories"
+THEME_VERSION_KEY = "theme"
+
+_versions: Dict[str, int] = {}
+# name -> (callback, remote_only)
+_listeners: Dict[str, List[Tuple[Callable[[], None], bool]]] = {}
+_watcher_task = None
+_loaded = False
+_last_bump: Dict[str, float] = {}
+_deferred_bumps: Dict[str, asyncio.Task] = {}
+
+
+def on_version_change(name: str, callback: Callable[[], None], remote_only: bool = False) -> None:
+    """Register a callback run when the version of `name` changes.
+
+    With `remote_only` it is skipped for bumps made by this process, whose
+    write paths have already updated local state.
+    """
+    _listeners.setdefault(name, []).append((callback, remote_only))
+
+
+def current_version(name: str) -> int:
+    """Last known version of `name` in this process"""
+    return _versions.get(name, 0)
+
+
+def versions_loaded() -> bool:
+    """Whether the counters have been read from the database at least once"""
+    return _loaded
+
+
+def _apply(name: str, version: int, remote: bool = True) -> None:
+    # Counters only grow; an older change event arriving late is ignored
+    if version <= _versions.get(name, -1):
+        return
+    _versions[name] = version
+    for callback, remote_only in _listeners.get(name, []):
+        if remote_only and not remote:
+            continue
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Version listener for {name} failed: {str(e)}")
+
+
+async def bump_version(name: str) -> int:
+    """Increment the version of `name` and notify local listeners"""
+    doc = await db.cache_versions.find_one_and_update(
+        {"id": name},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    _last_bump[name] = time.monotonic()
+    # Skipping a number means another process bumped it too, unseen so far
+    _apply(name, doc["version"], remote=doc["version"] > current_version(name) + 1)
+    return doc["version"]
+
+
+async def _deferred_bump(name: str, delay: float) -> None:
+    try:
+        await asyncio.sleep(delay)
+        await bump_version(name)
+    except PyMongoError as e:
+        logger.warning(f"Deferred version bump of {name} failed: {str(e)}")
+    finally:
+        _deferred_bumps.pop(name, None)
+
+
+async def bump_version_throttled(name: str, interval: float) -> None:
+    """Bump the version of `name` at most once per `interval` seconds.
+
+    For high-frequency writes such as download counts. A change inside the
+    interval schedules one bump at its end, so it is never lost.
+    """
+    if name in _deferred_bumps:
+        return
+    wait = _last_bump.get(name, float("-inf")) + interval - time.monotonic()
+    if wait <= 0:
+        await bump_version(name)
+    else:
+        _deferred_bumps[name] = asyncio.create_task(_deferred_bump(name, wait))
+
+
+async def refresh_versions() -> None:
+    """Read all version counters once"""
+    global _loaded
+    async for doc in db.cache_versions.find({}, {"_id": 0}):
+        _apply(doc["id"], doc.get("version", 0))
+    _loaded = True
+
+
+async def _poll_versions() -> None:
+    while True:
+        await asyncio.sleep(VERSION_POLL_SECONDS)
+        try:
+            await refresh_versions()
+        except PyMongoError as e:
+            logger.warning(f"Version poll failed: {str(e)}")
+
+
+async def _watch_versions() -> None:
+    try:
+        await refresh_versions()
+        async with db.cache_versions.watch(full_document="updateLookup") as stream:
+            async for change in stream:
+                doc = change.get("fullDocument")
+                if doc:
+                    _apply(doc["id"], doc.get("version", 0))
+    except OperationFailure as e:
+        # Standalone servers have no change streams
+        logger.info(f"Change streams unavailable ({e.code}), polling cache versions")
+        await _poll_versions()
+    except PyMongoError as e:
+        logger.warning(f"Version change stream failed: {str(e)}, polling cache versions")
+        await _poll_versions()
+
+
+def start_version_watcher() -> None:
+    global _watcher_task
+    if _watcher_task is None:
+        _watcher_task = asyncio.create_task(_watch_versions())
+
+
+async def stop_version_watcher() -> None:
+    global _watcher_task
+    # Apply pending throttled bumps now rather than dropping them
+    for name, task in list(_deferred_bumps.items()):
+        task.cancel()
+        try:
+            await bump_version(name)
+        except PyMongoError as e:
+            logger.warning(f"Version bump of {name} failed: {str(e)}")
+    if _watcher_task is not None:
+        _watcher_task.cancel()
+        try:
+            await _watcher_task
+        except asyncio.CancelledError:
+            pass
+        _watcher_task = None
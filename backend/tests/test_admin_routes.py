@@ -0,0 +1,96 @@
+"""
+Tests for admin route handlers, no database required
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+import routers.admin as admin  # noqa: E402
+from services.search_index import CatalogSearchIndex, SearchIndexService  # noqa: E402
+
+
+class TestDeleteDownload:
+    """The delete route hands off to the catalog helper"""
+
+    def test_delete_download(self, monkeypatch):
+        """Test an existing download is removed through the catalog"""
+        removed = []
+
+        async def remove_download(download_id):
+            removed.append(download_id)
+            return True
+        monkeypatch.setattr(admin, "remove_download", remove_download)
+        assert asyncio.run(admin.delete_download("abc"))["success"] is True
+        assert removed == ["abc"]
+
+    def test_delete_missing_download(self, monkeypatch):
+        """Test a missing download is reported as 404"""
+        async def remove_download(download_id):
+            return False
+        monkeypatch.setattr(admin, "remove_download", remove_download)
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(admin.delete_download("missing"))
+        assert error.value.status_code == 404
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        return self
+
+    def skip(self, count):
+        return self
+
+    def limit(self, count):
+        return self
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeDownloads:
+    def __init__(self):
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        return FakeCursor([])
+
+
+class FakeDb:
+    def __init__(self):
+        self.downloads = FakeDownloads()
+
+
+class TestSearchDownloads:
+    """Searches go to the in-memory index when it can answer them"""
+
+    def search(self, monkeypatch, search, mode):
+        index = SearchIndexService(True, 300)
+        index.index = CatalogSearchIndex()
+        index.index.add({"id": "vlc", "name": "VLC Media Player"})
+        fake = FakeDb()
+        monkeypatch.setattr(admin, "search_index", index)
+        monkeypatch.setattr(admin, "db", fake)
+        asyncio.run(admin.admin_search_downloads(search=search, page=1, limit=20, include_total="false",
+                                                 search_mode=mode, fields=None))
+        return fake.downloads.queries[0]
+
+    def test_substring_mode(self, monkeypatch):
+        """Test the default substring search is answered by the index"""
+        assert self.search(monkeypatch, "media", "substring")["id"] == {"$in": ["vlc"]}
+
+    def test_text_mode(self, monkeypatch):
+        """Test plain text searches use the index, phrases and prefixes the text index"""
+        assert self.search(monkeypatch, "media", "text")["id"] == {"$in": ["vlc"]}
+        assert "$text" in self.search(monkeypatch, '"media player"', "text")
+        assert "$and" in self.search(monkeypatch, "pla*", "text")
@@ -0,0 +1,122 @@
+"""
+Tests for failed saves of single and bulk submissions, no database required
+"""
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+import pytest  # noqa: E402
+from pymongo.errors import BulkWriteError, PyMongoError  # noqa: E402
+
+import routers.submissions as submissions  # noqa: E402
+from models.schemas import BulkSubmissionCreate, SubmissionCreate  # noqa: E402
+
+REQUEST = SimpleNamespace(client=SimpleNamespace(host="203.0.113.7"))
+
+
+def item(name, site_url="https://example.com"):
+    return {"name": name, "download_link": f"https://example.com/{name}", "type": "game",
+            "site_name": "Example", "site_url": site_url}
+
+
+class FakeSubmissions:
+    """Inserts that fail the documents at the given positions"""
+
+    def __init__(self, failing_positions):
+        self.failing_positions = failing_positions
+        self.inserted = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.inserted = [doc for i, doc in enumerate(docs) if i not in self.failing_positions]
+        if self.failing_positions:
+            raise BulkWriteError({"writeErrors": [{"index": i, "code": 11000} for i in self.failing_positions]})
+
+    async def insert_one(self, doc):
+        if self.failing_positions:
+            raise PyMongoError("insert failed")
+        self.inserted.append(doc)
+
+
+def patch_routes(monkeypatch, failing_positions=()):
+    quota = {"reserved": 0, "released": 0}
+
+    async def reserve_submissions(client_ip, count, daily_limit):
+        quota["reserved"] += count
+        return True
+
+    async def release_submissions(client_ip, count):
+        quota["released"] += count
+
+    async def get_site_settings():
+        return {"daily_submission_limit": 10}
+
+    async def passes(*args, **kwargs):
+        return True
+
+    async def nothing(*args, **kwargs):
+        return None
+
+    fake = FakeSubmissions(set(failing_positions))
+    monkeypatch.setattr(submissions, "db", SimpleNamespace(submissions=fake))
+    monkeypatch.setattr(submissions, "get_site_settings", get_site_settings)
+    monkeypatch.setattr(submissions, "verify_captcha", passes)
+    monkeypatch.setattr(submissions, "reserve_submissions", reserve_submissions)
+    monkeypatch.setattr(submissions, "release_submissions", release_submissions)
+    monkeypatch.setattr(submissions, "send_bulk_submission_email", nothing)
+    monkeypatch.setattr(submissions, "send_admin_submissions_summary", nothing)
+    monkeypatch.setattr(submissions, "send_submission_email", nothing)
+    monkeypatch.setattr(submissions, "allow_burst", lambda client_ip: True)
+    return quota, fake
+
+
+def run_bulk(monkeypatch, items, failing_positions=()):
+    quota, fake = patch_routes(monkeypatch, failing_positions)
+    payload = BulkSubmissionCreate(items=items, captcha_id="c", captcha_answer=1)
+    result = asyncio.run(submissions.create_submissions_bulk(payload, REQUEST))
+    return result, quota, fake
+
+
+class TestBulkSubmissions:
+    """Invalid and unsaved items are reported per item"""
+
+    def test_invalid_items_are_reported(self, monkeypatch):
+        """Test an invalid URL fails its item only and uses no quota"""
+        items = [item("a"), item("b", site_url="ftp://example.com"), item("c")]
+        result, quota, fake = run_bulk(monkeypatch, items)
+        assert result["count"] == 2
+        assert result["failed"] == [
+            {"index": 1, "name": "b", "error": "Site URL must start with http:// or https://"}
+        ]
+        assert quota == {"reserved": 2, "released": 0}
+        assert [doc["name"] for doc in fake.inserted] == ["a", "c"]
+
+    def test_failed_inserts_release_quota(self, monkeypatch):
+        """Test items that fail to save are reported at their request index and give quota back"""
+        items = [item("a"), item("b", site_url="nope"), item("c"), item("d")]
+        # positions among the valid documents a, c, d
+        result, quota, fake = run_bulk(monkeypatch, items, failing_positions=[1])
+        assert result["success"] is True
+        assert result["count"] == 2
+        assert result["failed"] == [
+            {"index": 1, "name": "b", "error": "Site URL must start with http:// or https://"},
+            {"index": 2, "name": "c", "error": "Failed to save submission"},
+        ]
+        assert quota == {"reserved": 3, "released": 1}
+
+
+class TestSingleSubmission:
+    """A submission that is not stored does not use quota"""
+
+    def test_failed_insert_releases_quota(self, monkeypatch):
+        """Test a failed insert gives its quota back and is reported as an error"""
+        quota, fake = patch_routes(monkeypatch, failing_positions=[0])
+        payload = SubmissionCreate(**item("a"), captcha_id="c", captcha_answer=1)
+        with pytest.raises(PyMongoError):
+            asyncio.run(submissions.create_submission(payload, REQUEST))
+        assert quota == {"reserved": 1, "released": 1}
+        assert fake.inserted == []
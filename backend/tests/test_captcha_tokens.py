@@ -0,0 +1,87 @@
+"""
+Tests for the stateless HMAC-signed math captcha, no database required
+"""
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+import services.captcha as captcha  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def stateless(monkeypatch):
+    monkeypatch.setattr(captcha, "CAPTCHA_MODE", "stateless")
+    monkeypatch.setattr(captcha, "CAPTCHA_SECRET", "test-secret")
+    monkeypatch.setattr(captcha, "_replay_guard", captcha.ReplayGuard())
+
+
+def verify(token, answer):
+    return asyncio.run(captcha.verify_captcha(token, answer))
+
+
+def solve(challenge: str) -> int:
+    left, operator, right = challenge.split()[:3]
+    left, right = int(left), int(right)
+    assert operator == "+"
+    return left + right
+
+
+def fresh_token(answer=7, ttl=60):
+    return captcha._issue_token(answer, int(time.time()) + ttl)
+
+
+class TestStatelessCaptcha:
+    """Signed tokens: validity, tampering, expiry, answers and replays"""
+
+    def test_issued_challenge_verifies(self, monkeypatch):
+        """Test a generated challenge is accepted with its answer"""
+        # The first operator, addition, so the shown challenge gives the answer
+        monkeypatch.setattr(captcha.random, "choice", lambda options: options[0])
+        challenge = asyncio.run(captcha.generate_captcha_challenge())
+        assert challenge["id"].startswith(captcha.STATELESS_PREFIX)
+        assert verify(challenge["id"], solve(challenge["challenge"]))
+
+    def test_tampered_signature_rejected(self):
+        """Test a token with an altered signature or payload is rejected"""
+        token = fresh_token()
+        payload, signature = token[len(captcha.STATELESS_PREFIX):].split(".")
+        flipped = ("A" if signature[0] != "A" else "B") + signature[1:]
+        assert not verify(f"{captcha.STATELESS_PREFIX}{payload}.{flipped}", 7)
+        other = fresh_token(ttl=3600)[len(captcha.STATELESS_PREFIX):].split(".")[0]
+        assert not verify(f"{captcha.STATELESS_PREFIX}{other}.{signature}", 7)
+        assert not verify(f"{captcha.STATELESS_PREFIX}garbage", 7)
+
+    def test_other_secret_rejected(self, monkeypatch):
+        """Test a token signed with another key is rejected"""
+        token = fresh_token()
+        monkeypatch.setattr(captcha, "CAPTCHA_SECRET", "rotated")
+        assert not verify(token, 7)
+
+    def test_expired_token_rejected(self):
+        """Test a token past its expiry is rejected even with the right answer"""
+        assert not verify(fresh_token(ttl=-1), 7)
+
+    def test_wrong_answer_spends_the_token(self):
+        """Test a wrong answer fails and the token cannot be retried"""
+        token = fresh_token()
+        assert not verify(token, 8)
+        assert not verify(token, 7)
+
+    def test_replayed_token_rejected(self):
+        """Test a solved token is accepted once only"""
+        token = fresh_token()
+        assert verify(token, 7)
+        assert not verify(token, 7)
+
+    def test_database_mode_refuses_stateless_tokens(self, monkeypatch):
+        """Test signed tokens are not accepted once stateless mode is off"""
+        token = fresh_token()
+        monkeypatch.setattr(captcha, "CAPTCHA_MODE", "database")
+        assert not verify(token, 7)
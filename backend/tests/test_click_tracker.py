@@ -0,0 +1,78 @@
+"""
+Tests for the click aggregator, no database required
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+import services.click_tracker as click_tracker_module  # noqa: E402
+from services.click_tracker import ClickAggregator  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeDownloads:
+    def find(self, query, projection=None):
+        return FakeCursor([{"id": download_id} for download_id in query["id"]["$in"]])
+
+    async def bulk_write(self, ops, ordered=True):
+        pass
+
+
+class FakeActivity:
+    def __init__(self):
+        self.events = []
+
+    async def insert_many(self, events, ordered=True):
+        # Slow enough for stop() to arrive mid-flush
+        await asyncio.sleep(0.05)
+        self.events.extend(events)
+
+
+class FakeDb:
+    def __init__(self):
+        self.downloads = FakeDownloads()
+        self.download_activity = FakeActivity()
+
+
+class TestClickAggregator:
+    """Buffered clicks reach the database on shutdown"""
+
+    def test_stop_during_flush_keeps_events(self, monkeypatch):
+        """Test stopping while a flush is writing loses no events"""
+        fake = FakeDb()
+
+        async def noop(*args):
+            pass
+        monkeypatch.setattr(click_tracker_module, "db", fake)
+        monkeypatch.setattr(click_tracker_module, "record_rollups", noop)
+        monkeypatch.setattr(click_tracker_module, "download_counts_changed", noop)
+
+        async def run():
+            tracker = ClickAggregator(flush_interval_ms=10, flush_max_events=500, max_pending_events=1000)
+            tracker.start()
+            for _ in range(3):
+                tracker.record("vlc")
+            await asyncio.sleep(0.03)
+            tracker.record("vlc")
+            await tracker.stop()
+            return tracker
+
+        tracker = asyncio.run(run())
+        assert len(fake.download_activity.events) == 4
+        assert tracker.flushed_events == 4
+        assert tracker.dropped_events == 0
@@ -0,0 +1,71 @@
+"""
+Tests for ETag / conditional GET handling, no database required
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from services import versions  # noqa: E402
+from services.conditional import ConditionalGetMiddleware, etag_matches  # noqa: E402
+
+calls = []
+app = FastAPI()
+app.add_middleware(ConditionalGetMiddleware)
+
+
+@app.get("/api/stats")
+async def stats():
+    calls.append(1)
+    return {"total": 1}
+
+
+@app.get("/api/other")
+async def other():
+    return {}
+
+
+def make_client(catalog_version: int) -> TestClient:
+    versions._versions[versions.CATALOG_VERSION_KEY] = catalog_version
+    versions._loaded = True
+    return TestClient(app)
+
+
+class TestConditionalGet:
+    """ETag headers and 304 short-circuiting"""
+
+    def test_matching_etag_skips_the_route(self):
+        """Test a matching If-None-Match returns 304 without running the route"""
+        client = make_client(7)
+        response = client.get("/api/stats")
+        assert response.status_code == 200
+        assert "stale-while-revalidate" in response.headers["cache-control"]
+        etag = response.headers["etag"]
+
+        calls.clear()
+        response = client.get("/api/stats", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert calls == []
+
+    def test_version_bump_changes_etag(self):
+        """Test a new catalog version invalidates the old ETag"""
+        etag = make_client(7).get("/api/stats").headers["etag"]
+        response = make_client(8).get("/api/stats", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    def test_unversioned_routes_untouched(self):
+        """Test routes without versions get no ETag"""
+        assert "etag" not in make_client(7).get("/api/other").headers
+
+    def test_etag_matching(self):
+        """Test weak comparison and lists in If-None-Match"""
+        assert etag_matches('"a", W/"catalog3"', 'W/"catalog3"')
+        assert etag_matches("*", 'W/"catalog3"')
+        assert not etag_matches('W/"catalog4"', 'W/"catalog3"')
@@ -0,0 +1,47 @@
+"""
+Tests for native datetime handling, no database required
+"""
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+from models.schemas import Download  # noqa: E402
+from services.migrations import parse_stored_datetime  # noqa: E402
+from services.pagination import decode_cursor, encode_cursor  # noqa: E402
+from services.responses import with_defaults  # noqa: E402
+from services.utils import as_utc  # noqa: E402
+
+MIDNIGHT = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+class TestDatetimes:
+    """Migration parsing, cursors and API formatting of stored dates"""
+
+    def test_parse_stored_strings(self):
+        """Test ISO timestamps and day strings convert to UTC datetimes"""
+        assert parse_stored_datetime("2024-03-01") == MIDNIGHT
+        assert parse_stored_datetime("2024-03-01T02:00:00+02:00") == MIDNIGHT
+        assert parse_stored_datetime("2024-03-01T00:00:00Z") == MIDNIGHT
+        assert parse_stored_datetime("not a date") is None
+
+    def test_cursor_keeps_datetime_type(self):
+        """Test a created_at cursor decodes back to a datetime"""
+        cursor = encode_cursor("date_desc", {"created_at": MIDNIGHT, "id": "a"}, "next")
+        assert decode_cursor(cursor, "date_desc")["v"] == MIDNIGHT
+
+    def test_day_fields_keep_their_api_format(self):
+        """Test submission_date is sent as YYYY-MM-DD on both response paths"""
+        doc = {"id": "a", "name": "A", "download_link": "l", "type": "game",
+               "submission_date": MIDNIGHT, "created_at": MIDNIGHT}
+        assert with_defaults([doc], Download)[0]["submission_date"] == "2024-03-01"
+        assert Download(**doc).model_dump(mode="json")["submission_date"] == "2024-03-01"
+
+    def test_as_utc_accepts_both_forms(self):
+        """Test expiry checks read migrated and unmigrated values"""
+        assert as_utc(MIDNIGHT.replace(tzinfo=None)) == MIDNIGHT
+        assert as_utc("2024-03-01T00:00:00+00:00") == MIDNIGHT
+        assert as_utc(None) is None
@@ -0,0 +1,164 @@
+"""
+Tests for the email outbox queue, provider and rate limiter, no database required
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+from pymongo.errors import DuplicateKeyError  # noqa: E402
+
+import services.email_outbox as outbox  # noqa: E402
+from services.email_outbox import FakeSinkProvider, RateLimiter, EmailNotConfigured  # noqa: E402
+
+
+class TestEmailOutbox:
+    """Fake sink delivery and provider rate limiting"""
+
+    def test_fake_sink_records_messages(self):
+        """Test the fake provider keeps the most recent messages"""
+        async def run():
+            sink = FakeSinkProvider(max_messages=2)
+            for i in range(3):
+                await sink.send("user@example.com", f"subject {i}", "<p>hi</p>", f"key-{i}")
+            assert [m["idempotency_key"] for m in sink.messages] == ["key-1", "key-2"]
+            with pytest.raises(EmailNotConfigured):
+                await sink.send("", "subject", "<p>hi</p>", "key-x")
+        asyncio.run(run())
+
+    def test_rate_limiter_spaces_sends(self):
+        """Test concurrent acquires are spread at the configured rate"""
+        async def run():
+            limiter = RateLimiter(rate=20)
+            started = time.monotonic()
+            await asyncio.gather(*(limiter.acquire() for _ in range(5)))
+            return time.monotonic() - started
+        assert asyncio.run(run()) >= 0.19
+
+
+class FakeOutbox:
+    """Equality filters, the update operators the outbox uses and a unique idempotency key"""
+
+    def __init__(self):
+        self.docs = []
+
+    def _find(self, query):
+        return next((d for d in self.docs if all(d.get(k) == v for k, v in query.items())), None)
+
+    def _check_unique(self, doc):
+        if any(d is not doc and d["idempotency_key"] == doc["idempotency_key"] for d in self.docs):
+            raise DuplicateKeyError("idempotency_key")
+
+    async def insert_one(self, doc):
+        self._check_unique(doc)
+        self.docs.append(dict(doc))
+
+    async def update_one(self, query, update, upsert=False):
+        doc = self._find(query)
+        if doc is None:
+            if not upsert:
+                return
+            doc = {**query, **update.get("$setOnInsert", {})}
+            self._check_unique(doc)
+            self.docs.append(doc)
+        doc.update(update.get("$set", {}))
+        for key in update.get("$unset", {}):
+            doc.pop(key, None)
+        for key, value in update.get("$push", {}).items():
+            doc.setdefault(key, []).extend(value["$each"])
+
+
+class FakeDb:
+    def __init__(self):
+        self.email_outbox = FakeOutbox()
+
+
+class FailingProvider:
+    async def send(self, to_email, subject, html, idempotency_key):
+        raise RuntimeError("provider down")
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    fake = FakeDb()
+    monkeypatch.setattr(outbox, "db", fake)
+    monkeypatch.setattr(outbox, "_rate_limiter", RateLimiter(rate=0))
+    return fake
+
+
+def claimed(attempts, **fields):
+    return {"id": "job", "idempotency_key": "key", "kind": "message", "to": "user@example.com",
+            "subject": "s", "html": "<p>hi</p>", "status": "sending", "attempts": attempts, **fields}
+
+
+class TestOutboxQueue:
+    """Idempotency, digest coalescing, retries and worker resilience"""
+
+    def test_idempotency_key_deduplicates(self, fake_db):
+        """Test enqueueing the same idempotency key twice stores one message"""
+        async def run():
+            await outbox.enqueue_email("user@example.com", "s", "<p>1</p>", idempotency_key="once")
+            await outbox.enqueue_email("user@example.com", "s", "<p>2</p>", idempotency_key="once")
+        asyncio.run(run())
+        assert [d["html"] for d in fake_db.email_outbox.docs] == ["<p>1</p>"]
+
+    def test_digest_items_coalesce_per_window(self, fake_db):
+        """Test items of one window share a digest and a claimed one starts a follow-up"""
+        async def run():
+            await outbox.enqueue_digest_items("admin_digest", [{"name": "a"}], 3600)
+            await outbox.enqueue_digest_items("admin_digest", [{"name": "b"}], 3600)
+            assert len(fake_db.email_outbox.docs) == 1
+            fake_db.email_outbox.docs[0]["status"] = "sending"
+            await outbox.enqueue_digest_items("admin_digest", [{"name": "c"}], 3600)
+        asyncio.run(run())
+        first, follow_up = fake_db.email_outbox.docs
+        assert [i["name"] for i in first["digest_items"]] == ["a", "b"]
+        assert follow_up["digest_items"] == [{"name": "c"}]
+        assert follow_up["idempotency_key"].startswith(first["idempotency_key"] + ":")
+
+    def test_failed_send_backs_off_then_gives_up(self, fake_db, monkeypatch):
+        """Test a failing send is retried with exponential backoff until EMAIL_MAX_ATTEMPTS"""
+        monkeypatch.setattr(outbox, "provider", FailingProvider())
+        fake_db.email_outbox.docs.append(claimed(3))
+        before = datetime.now(timezone.utc)
+        asyncio.run(outbox._deliver(claimed(3)))
+        doc = fake_db.email_outbox.docs[0]
+        assert doc["status"] == "pending"
+        delay = doc["next_attempt_at"] - before
+        assert timedelta(seconds=outbox.EMAIL_RETRY_BASE_SECONDS * 4) <= delay
+        assert delay < timedelta(seconds=outbox.EMAIL_RETRY_BASE_SECONDS * 4 + 5)
+
+        asyncio.run(outbox._deliver(claimed(outbox.EMAIL_MAX_ATTEMPTS)))
+        assert doc["status"] == "failed"
+        assert doc["last_error"] == "provider down"
+
+    def test_worker_survives_renderer_errors(self, fake_db, monkeypatch):
+        """Test an exception outside the provider reschedules the job and keeps the worker"""
+        async def broken(items):
+            raise ValueError("bad template")
+        monkeypatch.setitem(outbox._renderers, "broken", broken)
+        job = claimed(1, kind="broken", digest_items=[])
+        fake_db.email_outbox.docs.append(dict(job))
+        jobs = [job]
+
+        async def claim():
+            return jobs.pop() if jobs else None
+        monkeypatch.setattr(outbox, "_claim", claim)
+
+        async def run():
+            worker = asyncio.create_task(outbox._worker())
+            await asyncio.sleep(0.05)
+            alive = not worker.done()
+            worker.cancel()
+            return alive
+        assert asyncio.run(run())
+        doc = fake_db.email_outbox.docs[0]
+        assert doc["status"] == "pending"
+        assert doc["last_error"] == "bad template"
@@ -0,0 +1,41 @@
+"""
+Tests for the email templates, no database required
+"""
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+from services import templates  # noqa: E402
+
+SUBMISSION = {
+    "id": "a", "name": "Some <Game> & {Friends}", "type": "game", "category": None,
+    "file_size": "4.2 GB", "submission_date": datetime(2024, 3, 1, tzinfo=timezone.utc),
+    "created_at": "2024-03-01T12:00:00+00:00",
+}
+
+
+class TestEmailTemplates:
+    """Renders of the compiled Jinja templates"""
+
+    def test_single_mails_escape_and_default(self):
+        """Test submission fields are escaped and absent ones shown as N/A"""
+        html = templates.render_submission_received(SUBMISSION)
+        assert "Some &lt;Game&gt; &amp; {Friends}" in html
+        assert "<td style=\"padding: 8px; border: 1px solid #333; color: #00FF41;\">N/A</td>" in html
+        assert "2024-03-01</td>" in html
+        assert "Some &lt;Game&gt;" in templates.render_submission_approved(SUBMISSION)
+
+    def test_row_mails_list_each_item(self):
+        """Test row-listing mails show one row per item up to MAX_LISTED_ITEMS"""
+        for n in (0, 1, 3):
+            bulk = templates.render_bulk_submission_received([SUBMISSION] * n)
+            assert bulk.count("Some &lt;Game&gt;") == n
+            digest = templates.render_admin_submissions_digest([SUBMISSION] * n)
+            assert f"Count: {n}" in digest
+            assert digest.count("<li>") == n
+        many = templates.render_bulk_submission_received([SUBMISSION] * (templates.MAX_LISTED_ITEMS + 5))
+        assert many.count("Some &lt;Game&gt;") == templates.MAX_LISTED_ITEMS
@@ -0,0 +1,43 @@
+"""
+Tests for the leaderboard refresher, no database required
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+import services.leaderboards as leaderboards  # noqa: E402
+
+
+class TestLeaderboardRefresh:
+    """Only the lease holder recomputes"""
+
+    def test_stale_refresh_needs_the_lease(self, monkeypatch):
+        """Test a refresh after a catalog write loads the stored snapshot without the lease"""
+        computed, loaded = [], []
+
+        async def no_lease():
+            return False
+
+        async def compute():
+            computed.append(True)
+            return []
+
+        async def load():
+            loaded.append(True)
+        monkeypatch.setattr(leaderboards, "_acquire_lock", no_lease)
+        monkeypatch.setattr(leaderboards, "_load_stored", load)
+        monkeypatch.setattr(leaderboards, "COMPUTERS", {"top": compute})
+
+        async def run():
+            leaderboards.mark_leaderboards_stale()
+            task = asyncio.create_task(leaderboards._run())
+            await asyncio.sleep(0.05)
+            task.cancel()
+
+        asyncio.run(run())
+        assert computed == []
+        assert loaded
@@ -147,6 +147,15 @@ class TestDownloadActivityTracking:
         assert response.status_code == 404
         print("✓ Non-existent download tracking returns 404")
 
+    def test_click_tracking_metrics(self):
+        """Test that buffered click counters are exposed to the admin"""
+        response = requests.get(f"{BASE_URL}/api/admin/metrics")
+        assert response.status_code == 200
+        stats = response.json().get("click_tracking", {})
+        for key in ("pending_events", "flushed_events", "dropped_events"):
+            assert key in stats
+        print(f"✓ Click tracking metrics: {stats}")
+
 
 class TestTopDownloadsWithSponsored:
     """Test top downloads section with sponsored downloads"""
@@ -0,0 +1,118 @@
+"""
+Tests for the daily submission quota, no database required
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+from pymongo.errors import DuplicateKeyError  # noqa: E402
+
+import services.rate_limit as rate_limit  # noqa: E402
+
+IP = "203.0.113.7"
+DAY = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+class FakeRateLimits:
+    """One document per (ip, day), the unique index and the conditional $inc"""
+
+    def __init__(self):
+        self.docs = []
+        # Called before an insert, to let a concurrent request win the race
+        self.before_insert = None
+
+    def _find(self, query):
+        for doc in self.docs:
+            if doc["ip_address"] == query["ip_address"] and doc["date"] == query["date"]:
+                condition = query.get("count")
+                if not isinstance(condition, dict) or doc["count"] <= condition["$lte"]:
+                    return doc
+                return None
+        return None
+
+    async def find_one_and_update(self, query, update, return_document=None):
+        doc = self._find(query)
+        if doc is not None:
+            doc["count"] += update["$inc"]["count"]
+        return doc
+
+    async def find_one(self, query, projection=None):
+        return self._find(query)
+
+    async def insert_one(self, doc):
+        if self.before_insert:
+            self.before_insert()
+            self.before_insert = None
+        if self._find(doc) is not None:
+            raise DuplicateKeyError("ip_address_1_date_1")
+        self.docs.append(dict(doc))
+
+    async def update_one(self, query, update):
+        doc = self._find(query)
+        if doc is not None:
+            doc["count"] += update["$inc"]["count"]
+
+
+class FakeDb:
+    def __init__(self):
+        self.rate_limits = FakeRateLimits()
+
+
+def setup(monkeypatch, day=DAY):
+    fake = FakeDb()
+    monkeypatch.setattr(rate_limit, "db", fake)
+    monkeypatch.setattr(rate_limit, "utc_today", lambda: day)
+    return fake
+
+
+def reserve(count, limit=3):
+    return asyncio.run(rate_limit.reserve_submissions(IP, count, limit))
+
+
+class TestReserveSubmissions:
+    """Reserving, rejecting, racing and resetting daily quota"""
+
+    def test_reserves_until_limit(self, monkeypatch):
+        """Test quota is consumed up to the limit and rejected beyond it"""
+        fake = setup(monkeypatch)
+        assert reserve(2)
+        assert reserve(1)
+        assert not reserve(1)
+        assert not reserve(4)
+        assert fake.rate_limits.docs[0]["count"] == 3
+
+    def test_racing_first_insert(self, monkeypatch):
+        """Test losing the first insert of the day to a concurrent request applies the limit to its row"""
+        fake = setup(monkeypatch)
+        fake.rate_limits.before_insert = lambda: fake.rate_limits.docs.append(
+            {"ip_address": IP, "date": "2024-03-01", "count": 2}
+        )
+        assert reserve(1)
+        assert fake.rate_limits.docs[0]["count"] == 3
+
+        fake = setup(monkeypatch)
+        fake.rate_limits.before_insert = lambda: fake.rate_limits.docs.append(
+            {"ip_address": IP, "date": "2024-03-01", "count": 3}
+        )
+        assert not reserve(1)
+
+    def test_quota_resets_daily(self, monkeypatch):
+        """Test a new day starts from a fresh row that expires later"""
+        fake = setup(monkeypatch)
+        assert reserve(3)
+        monkeypatch.setattr(rate_limit, "utc_today", lambda: DAY + timedelta(days=1))
+        assert reserve(3)
+        assert [doc["date"] for doc in fake.rate_limits.docs] == ["2024-03-01", "2024-03-02"]
+        assert fake.rate_limits.docs[1]["expires_at"] == DAY + timedelta(days=3)
+
+    def test_release_gives_quota_back(self, monkeypatch):
+        """Test released units can be reserved again"""
+        setup(monkeypatch)
+        assert reserve(3)
+        asyncio.run(rate_limit.release_submissions(IP, 2))
+        assert reserve(2)
@@ -0,0 +1,102 @@
+"""
+Tests for the pooled reCAPTCHA verifier against a local stub siteverify server
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+from services.captcha import RecaptchaVerifier  # noqa: E402
+
+
+class StubSiteverify(BaseHTTPRequestHandler):
+    """Accepts the token "good", rejects everything else, fails on "boom" """
+    calls = 0
+
+    def do_POST(self):
+        StubSiteverify.calls += 1
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        token = form.get("response", [""])[0]
+        if token == "boom":
+            self.send_response(500)
+            self.end_headers()
+            return
+        body = json.dumps({"success": token == "good"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSiteverify)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/siteverify"
+    server.shutdown()
+
+
+def make_verifier(url, **overrides):
+    options = dict(verify_url=url, pool_size=4, timeout=2, http2=False,
+                   verdict_ttl=60, breaker_threshold=2, breaker_reset_seconds=60)
+    options.update(overrides)
+    return RecaptchaVerifier(**options)
+
+
+class TestRecaptchaVerifier:
+    """Verdicts, token reuse and circuit breaking"""
+
+    def test_verdicts_and_reuse(self, stub_url):
+        async def run():
+            verifier = make_verifier(stub_url)
+            try:
+                StubSiteverify.calls = 0
+                assert await verifier.verify("good", "1.2.3.4", "secret") is True
+                # A solved token is single-use, from any address
+                assert await verifier.verify("good", "1.2.3.4", "secret") is False
+                assert await verifier.verify("good", "5.6.7.8", "secret") is False
+                assert await verifier.verify("bad", "1.2.3.4", "secret") is False
+                assert StubSiteverify.calls == 2
+                stats = verifier.stats()
+                assert stats["replays_rejected"] == 2
+                assert stats["latency_ms_p50"] is not None
+            finally:
+                await verifier.close()
+        asyncio.run(run())
+
+    def test_missing_secret_or_token(self, stub_url):
+        async def run():
+            verifier = make_verifier(stub_url)
+            assert await verifier.verify("good", None, "") is False
+            assert await verifier.verify(None, None, "secret") is False
+            assert verifier.stats()["requests"] == 0
+        asyncio.run(run())
+
+    def test_circuit_opens_after_failures(self, stub_url):
+        async def run():
+            verifier = make_verifier(stub_url)
+            try:
+                assert await verifier.verify("boom", None, "secret") is False
+                assert await verifier.verify("boom", None, "secret") is False
+                StubSiteverify.calls = 0
+                assert await verifier.verify("good", None, "secret") is False
+                assert StubSiteverify.calls == 0
+                assert verifier.stats()["circuit_open"] is True
+            finally:
+                await verifier.close()
+        asyncio.run(run())
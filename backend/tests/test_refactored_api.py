@@ -87,6 +87,138 @@ class TestDownloadsEndpoints:
             names = [item["name"].lower() for item in data["items"]]
             assert names == sorted(names)
 
+    def test_get_downloads_cursor_pagination(self):
+        """Test cursor pages follow offset pages without overlap"""
+        response1 = requests.get(f"{BASE_URL}/api/downloads?sort_by=downloads_desc&limit=3")
+        assert response1.status_code == 200
+        data1 = response1.json()
+        if not data1["next_cursor"]:
+            return
+
+        response2 = requests.get(
+            f"{BASE_URL}/api/downloads?sort_by=downloads_desc&limit=3&cursor={data1['next_cursor']}"
+        )
+        assert response2.status_code == 200
+        data2 = response2.json()
+        ids1 = [item["id"] for item in data1["items"]]
+        ids2 = [item["id"] for item in data2["items"]]
+        assert not set(ids1).intersection(set(ids2))
+
+        # Going back returns the first page again
+        assert data2["prev_cursor"]
+        response3 = requests.get(
+            f"{BASE_URL}/api/downloads?sort_by=downloads_desc&limit=3&cursor={data2['prev_cursor']}"
+        )
+        assert response3.status_code == 200
+        assert [item["id"] for item in response3.json()["items"]] == ids1
+
+    def test_get_downloads_without_total(self):
+        """Test include_total=false skips the count"""
+        response = requests.get(f"{BASE_URL}/api/downloads?limit=3&include_total=false")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] is None
+        assert data["pages"] is None
+        assert len(data["items"]) <= 3
+
+    def test_get_downloads_estimated_total(self):
+        """Test include_total=estimated returns a flagged total"""
+        response = requests.get(f"{BASE_URL}/api/downloads?limit=3&include_total=estimated")
+        assert response.status_code == 200
+        data = response.json()
+        assert isinstance(data["total"], int)
+        assert data["total_estimated"] is True
+
+    def test_get_downloads_cursor_sort_mismatch(self):
+        """Test a cursor cannot be reused with another sort"""
+        response = requests.get(f"{BASE_URL}/api/downloads?sort_by=name_asc&limit=3")
+        assert response.status_code == 200
+        cursor = response.json()["next_cursor"]
+        if not cursor:
+            return
+        response = requests.get(f"{BASE_URL}/api/downloads?sort_by=size_desc&cursor={cursor}")
+        assert response.status_code == 400
+
+    def test_get_downloads_relevance_highlights(self):
+        """Test relevance-ranked search returns highlights keyed by id"""
+        response = requests.get(f"{BASE_URL}/api/downloads?search=VLC&search_mode=text&sort_by=relevance&limit=5")
+        assert response.status_code == 200
+        data = response.json()
+        assert isinstance(data["highlights"], dict)
+        for item in data["items"]:
+            if item["id"] in data["highlights"]:
+                assert "<mark>" in "".join(data["highlights"][item["id"]].values())
+
+    def test_get_downloads_substring_search_default(self):
+        """Test the default search matches part of a word in the name"""
+        response = requests.get(f"{BASE_URL}/api/downloads?search=vl&limit=5")
+        assert response.status_code == 200
+        for item in response.json()["items"]:
+            assert "vl" in item["name"].lower()
+
+    def test_get_downloads_prefix_search(self):
+        """Test prefix* search matches the start of a word"""
+        response = requests.get(f"{BASE_URL}/api/downloads?search=vl*&search_mode=text&limit=5")
+        assert response.status_code == 200
+        for item in response.json()["items"]:
+            words = [w.lower() for w in item["name"].split()] + [t.lower() for t in item.get("tags", [])]
+            assert any(w.startswith("vl") for w in words) or (item.get("category") or "").lower().startswith("vl")
+
+    def test_get_downloads_facets(self):
+        """Test facets= returns counts under the current filter with the page"""
+        response = requests.get(f"{BASE_URL}/api/downloads?type_filter=game&limit=5&facets=type,tags,size_bucket")
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["items"]) <= 5
+        assert set(data["facets"]) == {"type", "tags", "size_bucket"}
+        assert all(value["name"] == "game" for value in data["facets"]["type"])
+        assert sum(value["count"] for value in data["facets"]["size_bucket"]) == data["total"]
+
+    def test_get_downloads_unknown_facet(self):
+        """Test an unknown facet is rejected"""
+        response = requests.get(f"{BASE_URL}/api/downloads?facets=type,colour")
+        assert response.status_code == 400
+
+    def test_get_downloads_sparse_fields(self):
+        """Test fields= returns only the requested fields plus id"""
+        response = requests.get(f"{BASE_URL}/api/downloads?limit=5&fields=name,download_count")
+        assert response.status_code == 200
+        for item in response.json()["items"]:
+            assert set(item) == {"id", "name", "download_count"}
+
+    def test_get_downloads_sparse_fields_cursor(self):
+        """Test cursor paging works when the sort key is not requested"""
+        response = requests.get(f"{BASE_URL}/api/downloads?sort_by=size_desc&limit=2&fields=name")
+        assert response.status_code == 200
+        data = response.json()
+        if data["next_cursor"]:
+            response = requests.get(
+                f"{BASE_URL}/api/downloads?sort_by=size_desc&limit=2&fields=name&cursor={data['next_cursor']}"
+            )
+            assert response.status_code == 200
+            assert not {i["id"] for i in data["items"]} & {i["id"] for i in response.json()["items"]}
+
+    def test_get_downloads_unknown_field(self):
+        """Test an unknown field is rejected"""
+        response = requests.get(f"{BASE_URL}/api/downloads?fields=name,password")
+        assert response.status_code == 400
+
+    def test_suggest_downloads(self):
+        """Test GET /api/downloads/suggest returns prefix suggestions"""
+        response = requests.get(f"{BASE_URL}/api/downloads/suggest?q=vl&limit=5")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["q"] == "vl"
+        assert len(data["suggestions"]) <= 5
+        for suggestion in data["suggestions"]:
+            assert suggestion["type"] in ("download", "tag")
+            assert "vl" in suggestion["text"].lower()
+
+    def test_get_downloads_relevance_rejects_cursor(self):
+        """Test relevance sort pages by offset only"""
+        response = requests.get(f"{BASE_URL}/api/downloads?search=VLC&search_mode=text&sort_by=relevance&cursor=abc")
+        assert response.status_code == 400
+
 
 class TestTopDownloads:
     """Tests for /api/downloads/top endpoint"""
@@ -113,6 +245,14 @@ class TestTopDownloads:
             assert "download_link" in item
             assert "type" in item
 
+    def test_top_downloads_snapshot_timestamp(self):
+        """Test top downloads are served from a dated snapshot"""
+        response = requests.get(f"{BASE_URL}/api/downloads/top")
+        assert response.status_code == 200
+        data = response.json()
+        if data["enabled"]:
+            assert data.get("generated_at")
+
 
 class TestTrendingDownloads:
     """Tests for /api/downloads/trending endpoint"""
@@ -332,6 +472,8 @@ class TestStats:
         assert "movies" in data
         assert "tv_shows" in data
         assert "total_downloads" in data
+        assert "by_type" in data
+        assert sum(data["by_type"].values()) == data["total"]
         # Verify counts are non-negative
         assert data["total"] >= 0
         assert data["games"] >= 0
@@ -364,6 +506,29 @@ class TestCategories:
             assert category["type"] in ["game", "all"]
 
 
+class TestFacetCounts:
+    """Tests for /api/tags and /api/facets endpoints"""
+    
+    def test_get_tags_sorted(self):
+        """Test GET /api/tags returns tags by descending count"""
+        response = requests.get(f"{BASE_URL}/api/tags?limit=10")
+        assert response.status_code == 200
+        counts = [tag["count"] for tag in response.json()]
+        assert counts == sorted(counts, reverse=True)
+    
+    def test_get_type_facet_matches_stats(self):
+        """Test type facet counts agree with /api/stats"""
+        facets = requests.get(f"{BASE_URL}/api/facets/type").json()
+        stats = requests.get(f"{BASE_URL}/api/stats").json()
+        for entry in facets:
+            assert stats["by_type"].get(entry["name"]) == entry["count"]
+    
+    def test_get_unknown_facet(self):
+        """Test unknown facets return 404"""
+        response = requests.get(f"{BASE_URL}/api/facets/unknown")
+        assert response.status_code == 404
+
+
 class TestApproveRejectSubmission:
     """Tests for approve/reject submission endpoints"""
     
@@ -378,5 +543,14 @@ class TestApproveRejectSubmission:
         assert response.status_code == 404
 
 
+class TestDeleteDownload:
+    """Tests for the admin download delete endpoint"""
+
+    def test_delete_download_not_found(self):
+        """Test deleting a non-existent download returns 404"""
+        response = requests.delete(f"{BASE_URL}/api/admin/downloads/non-existent-id")
+        assert response.status_code == 404
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "--tb=short"])
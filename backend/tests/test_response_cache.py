@@ -0,0 +1,114 @@
+"""
+Tests for the response cache decorator, no database required
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+from fastapi import FastAPI, Query  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from services import versions  # noqa: E402
+from services.response_cache import cached_response, response_cache_stats  # noqa: E402
+
+TAG = "test_catalog"
+calls = []
+app = FastAPI()
+
+
+@app.get("/items")
+@cached_response(TAG)
+async def list_items(limit: int = Query(10)):
+    calls.append(limit)
+    await asyncio.sleep(0.05)
+    return {"limit": limit, "call": len(calls)}
+
+
+def route_stats() -> dict:
+    return response_cache_stats()["routes"]["list_items"]
+
+
+class TestResponseCache:
+    """Hits, normalized keys, single-flight and tag invalidation"""
+
+    def test_hits_share_normalized_params(self):
+        """Test an explicit default and an omitted param share one entry"""
+        calls.clear()
+        client = TestClient(app)
+        first = client.get("/items").json()
+        assert client.get("/items?limit=10").json() == first
+        assert client.get("/items?limit=5").json()["limit"] == 5
+        assert calls == [10, 5]
+        assert route_stats()["hits"] >= 1
+
+    def test_concurrent_misses_coalesce(self):
+        """Test a burst of identical cold requests runs the route once"""
+        calls.clear()
+
+        async def burst():
+            return await asyncio.gather(*(list_items(limit=77) for _ in range(10)))
+
+        responses = asyncio.run(burst())
+        assert calls == [77]
+        assert len({r.body for r in responses}) == 1
+        assert route_stats()["coalesced"] >= 9
+
+    def test_version_bump_invalidates(self):
+        """Test moving the tag's version drops and bypasses old entries"""
+        client = TestClient(app)
+        before = client.get("/items?limit=3").json()
+        versions._apply(TAG, versions.current_version(TAG) + 1)
+        after = client.get("/items?limit=3").json()
+        assert after["call"] != before["call"]
+
+
+class FakeVersions:
+    def __init__(self, version):
+        self.version = version
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        self.version += 1
+        return {"id": query["id"], "version": self.version}
+
+
+class FakeDb:
+    def __init__(self, version):
+        self.cache_versions = FakeVersions(version)
+
+
+class TestVersionListeners:
+    """Which version changes reach remote-only listeners"""
+
+    def test_own_bumps_skip_remote_only_listeners(self, monkeypatch):
+        """Test a bump of this process reaches remote-only listeners only if it skipped a number"""
+        name = "test_remote_only"
+        seen = []
+        versions.on_version_change(name, lambda: seen.append("all"))
+        versions.on_version_change(name, lambda: seen.append("remote"), remote_only=True)
+        versions._apply(name, 5)
+        seen.clear()
+
+        monkeypatch.setattr(versions, "db", FakeDb(5))
+        asyncio.run(versions.bump_version(name))
+        assert seen == ["all"]
+
+        # Another process bumped to 7 before this one's bump to 8
+        seen.clear()
+        monkeypatch.setattr(versions, "db", FakeDb(7))
+        asyncio.run(versions.bump_version(name))
+        assert seen == ["all", "remote"]
+
+    def test_older_versions_are_ignored(self):
+        """Test a late change event cannot move a version back"""
+        name = "test_monotonic"
+        seen = []
+        versions.on_version_change(name, lambda: seen.append(versions.current_version(name)))
+        versions._apply(name, 3)
+        versions._apply(name, 2)
+        versions._apply(name, 3)
+        assert versions.current_version(name) == 3
+        assert seen == [3]
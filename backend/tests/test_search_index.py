@@ -0,0 +1,133 @@
+"""
+Tests for the in-process catalog search index, no database required
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+import asyncio  # noqa: E402
+
+import services.search_index as search_index_module  # noqa: E402
+from services.catalog import search_total  # noqa: E402
+from services.search_index import CatalogSearchIndex, SearchIndexService  # noqa: E402
+
+
+def build_index():
+    index = CatalogSearchIndex()
+    index.add({"id": "vlc", "name": "VLC Media Player", "tags": ["video"], "description": "Plays everything"})
+    index.add({"id": "monkey", "name": "Media Monkey", "tags": ["audio"], "category": "Audio"})
+    index.add({"id": "doom", "name": "Doom Remastered", "tags": ["shooter"], "description": "Media coverage"})
+    return index
+
+
+class TestCatalogSearchIndex:
+    """Word, substring and typo-tolerant matching with incremental updates"""
+
+    def test_ranks_name_matches_first(self):
+        """Test documents matching in the name rank above description matches"""
+        ids = build_index().search("media")
+        assert set(ids) == {"vlc", "monkey", "doom"}
+        assert ids[-1] == "doom"
+
+    def test_substring_and_typo_matches(self):
+        """Test substrings of names and misspelled words still match"""
+        index = build_index()
+        assert index.search("emaster") == ["doom"]
+        assert index.search("playr") == ["vlc"]
+        assert index.search("media audo") == ["monkey"]
+
+    def test_incremental_updates(self):
+        """Test removed documents disappear and re-added ones reuse slots"""
+        index = build_index()
+        index.remove("vlc")
+        assert index.search("vlc") == []
+        index.add({"id": "vlc2", "name": "VLC Nightly"})
+        assert index.search("vlc") == ["vlc2"]
+        assert len(index) == 3
+
+    def test_match_counts_beyond_limit(self):
+        """Test the match count covers every match, not just the returned ids"""
+        ids, matches = build_index().match("media", limit=2)
+        assert len(ids) == 2
+        assert matches == 3
+
+
+class TestSearchTotal:
+    """Totals of listings filtered to the index's ranked ids"""
+
+    def test_search_only_uses_match_count(self):
+        """Test the index's match count is the exact total without other filters"""
+        query = {"approved": True, "id": {"$in": ["a", "b"]}}
+        assert search_total(query, 2, False, ["a", "b"], 9) == (9, False)
+
+    def test_filtered_cut_off_count_is_estimate(self):
+        """Test counts within truncated ranked ids are flagged as estimates"""
+        query = {"approved": True, "type": "game", "id": {"$in": ["a", "b"]}}
+        assert search_total(query, 1, False, ["a", "b"], 9) == (1, True)
+        assert search_total(query, 1, False, ["a", "b"], 2) == (1, False)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        # Yield so a concurrent rebuild could interleave
+        await asyncio.sleep(0)
+        return self.docs
+
+
+class FakeDownloads:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        return FakeCursor(list(self.docs))
+
+
+class FakeDb:
+    def __init__(self, docs):
+        self.downloads = FakeDownloads(docs)
+
+
+class TestRebuild:
+    """Rebuilds swapped in while updates arrive"""
+
+    def test_concurrent_rebuilds_keep_updates(self, monkeypatch):
+        """Test overlapping rebuilds run one at a time and replay updates"""
+        docs = [{"id": f"doc{i}", "name": f"Tool {i}"} for i in range(5)]
+        monkeypatch.setattr(search_index_module, "db", FakeDb(docs))
+        service = SearchIndexService(True, 300)
+
+        async def run():
+            first = asyncio.create_task(service.rebuild())
+            second = asyncio.create_task(service.rebuild())
+            await asyncio.sleep(0)
+            late = {"id": "late", "name": "Late Tool"}
+            docs.append(late)
+            service.add([late])
+            await asyncio.gather(first, second)
+
+        asyncio.run(run())
+        assert service.index.search("late") == ["late"]
+        assert len(service.index) == 6
+
+    def test_catalog_change_rebuilds(self, monkeypatch):
+        """Test a catalog change from another worker is not answered from memory until rebuilt"""
+        docs = [{"id": "vlc", "name": "VLC Media Player"}]
+        monkeypatch.setattr(search_index_module, "db", FakeDb(docs))
+        service = SearchIndexService(True, 300)
+
+        async def run():
+            await service.rebuild()
+            docs.append({"id": "monkey", "name": "Media Monkey"})
+            service.catalog_changed()
+            assert not service.ready
+            await service._catch_up
+            assert service.ready
+
+        asyncio.run(run())
+        assert set(service.index.search("media")) == {"vlc", "monkey"}
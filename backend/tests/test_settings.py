@@ -0,0 +1,55 @@
+"""
+Tests for the cached site settings, no database required
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+import services.settings as settings_module  # noqa: E402
+
+
+class FakeSiteSettings:
+    def __init__(self):
+        self.doc = {"id": "site_settings", "site_name": "old"}
+        self.on_read = None
+
+    async def find_one(self, query, projection=None):
+        doc = dict(self.doc)
+        if self.on_read:
+            # A write completes while this read is in flight
+            self.on_read()
+            self.on_read = None
+        return doc
+
+
+class FakeDb:
+    def __init__(self):
+        self.site_settings = FakeSiteSettings()
+
+
+class TestSiteSettingsCache:
+    """Snapshots are never older than the last invalidation"""
+
+    def test_load_overlapping_a_write_is_not_kept(self, monkeypatch):
+        """Test a read that started before an invalidation is not cached"""
+        fake = FakeDb()
+        monkeypatch.setattr(settings_module, "db", fake)
+        settings_module.invalidate_site_settings()
+
+        def write():
+            fake.site_settings.doc["site_name"] = "new"
+            settings_module.invalidate_site_settings()
+        fake.site_settings.on_read = write
+
+        async def run():
+            first = await settings_module.get_site_settings()
+            second = await settings_module.get_site_settings()
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first["site_name"] == "old"
+        assert second["site_name"] == "new"
@@ -0,0 +1,108 @@
+"""
+Tests for the suggestion prefix index, no database required
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+import services.suggest as suggest_module  # noqa: E402
+from services.suggest import (  # noqa: E402
+    COMPACT_THRESHOLD, SCAN_LIMIT, TOP_K_STORED, PackedPrefixIndex, SuggestionService
+)
+
+DOCS = [
+    {"id": "vlc", "name": "VLC Media Player", "tags": ["Video"], "download_count": 5},
+    {"id": "monkey", "name": "Média Monkey", "tags": [], "download_count": 9},
+]
+
+
+def make_service():
+    service = SuggestionService(reload_seconds=300)
+    service._packed = PackedPrefixIndex(service._entries_from(DOCS))
+    return service
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return list(self.docs)
+
+
+class FakeDownloads:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        return FakeCursor(self.docs)
+
+
+class FakeDb:
+    def __init__(self, docs):
+        self.downloads = FakeDownloads(docs)
+
+
+class TestSuggestions:
+    """Prefix matching, ranking and incremental updates"""
+
+    def test_ranked_by_download_count(self):
+        """Test any word of a name matches and accents are ignored"""
+        texts = [s["text"] for s in make_service().suggest("me", 5)]
+        assert texts == ["Média Monkey", "VLC Media Player"]
+
+    def test_tags_are_suggested(self):
+        """Test tags appear as tag suggestions"""
+        assert make_service().suggest("vid", 5) == [{"text": "Video", "type": "tag", "id": None}]
+
+    def test_delta_tombstones_and_compaction(self):
+        """Test writes show up before and after compaction"""
+        async def run():
+            service = make_service()
+            service.add([{"id": "medal", "name": "Medal of Honor", "download_count": 7}])
+            service.remove(["monkey"])
+            assert [s["id"] for s in service.suggest("me", 5)] == ["medal", "vlc"]
+            service.add([{"id": f"filler-{i}", "name": f"Filler {i}"} for i in range(COMPACT_THRESHOLD)])
+            await service._compaction
+            assert service.stats()["compactions"] == 1
+            assert service.stats()["tombstones"] == 0
+            assert [s["id"] for s in service.suggest("me", 5)] == ["medal", "vlc"]
+        asyncio.run(run())
+
+    def test_removals_from_precomputed_prefix(self):
+        """Test removing a precomputed prefix's top entries still fills the limit"""
+        service = SuggestionService(reload_seconds=300)
+        docs = [{"id": f"tool-{i}", "name": f"Tool {i}", "download_count": i} for i in range(SCAN_LIMIT + 10)]
+        service._packed = PackedPrefixIndex(service._entries_from(docs))
+        assert "t" in service._packed.top
+        service.remove([f"tool-{i}" for i in range(SCAN_LIMIT + 10 - TOP_K_STORED, SCAN_LIMIT + 10)])
+        ids = [s["id"] for s in service.suggest("t", 5)]
+        assert ids == [f"tool-{i}" for i in range(SCAN_LIMIT + 9 - TOP_K_STORED, SCAN_LIMIT + 4 - TOP_K_STORED, -1)]
+
+    def test_compaction_keeps_keys(self):
+        """Test compacted entries keep the keys they were indexed under"""
+        async def run():
+            service = SuggestionService(reload_seconds=300)
+            service._packed = PackedPrefixIndex(service._entries_from(
+                DOCS + [{"id": "long", "name": "Long", "tags": ["Éditeur " * 8], "download_count": 1}]
+            ))
+            keys = list(service._packed.keys)
+            await service.compact()
+            assert service._packed.keys == keys
+        asyncio.run(run())
+
+    def test_catalog_change_reloads(self, monkeypatch):
+        """Test a catalog change from another worker is not answered from memory until reloaded"""
+        async def run():
+            service = make_service()
+            monkeypatch.setattr(suggest_module, "db", FakeDb(DOCS + [{"id": "medal", "name": "Medal of Honor"}]))
+            service.catalog_changed()
+            assert not service.ready
+            await service._catch_up
+            assert service.ready
+            assert "medal" in [s["id"] for s in service.suggest("me", 5)]
+        asyncio.run(run())
@@ -0,0 +1,178 @@
+"""
+Tests for the time-series click collections, no database required
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+from pymongo.errors import CollectionInvalid  # noqa: E402
+
+import services.database as database  # noqa: E402
+import services.migrations as migrations  # noqa: E402
+from services.database import INDEXES, TIMESERIES_COLLECTIONS, legacy_collection  # noqa: E402
+
+
+class TestTimeseriesCollections:
+    """Registry constraints MongoDB enforces on time-series collections"""
+
+    def test_indexes_use_meta_and_time_fields_only(self):
+        """Test registered indexes of time-series collections can be built"""
+        for name, spec in TIMESERIES_COLLECTIONS.items():
+            allowed = {spec["timeField"], spec["metaField"]}
+            for model in INDEXES.get(name, []):
+                assert set(model.document["key"]) <= allowed, name
+                # Expiry is a collection option, TTL indexes are rejected
+                assert "expireAfterSeconds" not in model.document, name
+
+    def test_legacy_names_do_not_collide(self):
+        """Test legacy collections are neither registered nor time-series"""
+        for name in TIMESERIES_COLLECTIONS:
+            assert legacy_collection(name) not in TIMESERIES_COLLECTIONS
+            assert legacy_collection(name) not in INDEXES
+
+
+class FakeClient:
+    async def server_info(self):
+        return {"versionArray": [7, 0, 0]}
+
+
+class RacingDb:
+    """Another worker creates the first collection between lookup and create"""
+
+    def __init__(self):
+        self.created = []
+        self.raced = False
+
+    async def create_collection(self, name, **options):
+        if not self.raced:
+            self.raced = True
+            raise CollectionInvalid(f"collection {name} already exists")
+        self.created.append(name)
+
+
+class TestEnsureTimeseries:
+    """Creating the registered time-series collections"""
+
+    def test_concurrent_creation_is_not_a_failure(self, monkeypatch):
+        """Test a collection created by another worker is skipped and the rest still created"""
+        fake = RacingDb()
+
+        async def missing(name):
+            return None
+        monkeypatch.setattr(database, "client", FakeClient())
+        monkeypatch.setattr(database, "db", fake)
+        monkeypatch.setattr(database, "_collection_info", missing)
+        report = asyncio.run(database.ensure_timeseries_collections())
+        names = list(TIMESERIES_COLLECTIONS)
+        assert report["failed"] == []
+        assert report["created"] == names[1:]
+        assert fake.created == names[1:]
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeCollection:
+    def __init__(self, docs=None):
+        self.docs = docs or []
+        self.dropped = False
+
+    def find(self, query, projection=None):
+        after = query.get("_id", {}).get("$gt")
+        return FakeCursor([doc for doc in self.docs if after is None or doc["_id"] > after])
+
+    async def find_one(self, query):
+        return next((doc for doc in self.docs if doc["id"] == query["id"]), None)
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+    async def update_one(self, query, update, upsert=False):
+        await self.find_one_and_update(query, update, upsert=upsert)
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        doc = await self.find_one(query)
+        if doc is None:
+            doc = {"id": query["id"]}
+            self.docs.append(doc)
+        doc.update(update.get("$set", {}))
+        for key, value in update.get("$inc", {}).items():
+            doc[key] = doc.get(key, 0) + value
+        return doc
+
+    async def delete_one(self, query):
+        self.docs = [doc for doc in self.docs if doc["id"] != query["id"]]
+
+    async def drop(self):
+        self.dropped = True
+
+
+class FakeDb:
+    def __init__(self, legacy_docs):
+        self.collections = {
+            "download_activity": FakeCollection(),
+            "download_activity_legacy": FakeCollection(legacy_docs),
+            "migrations": FakeCollection(),
+            "locks": FakeCollection(),
+        }
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+    def __getattr__(self, name):
+        return self.collections[name]
+
+    async def list_collection_names(self, filter=None):
+        return [filter["name"]]
+
+
+class TestTimeseriesCopy:
+    """Copying legacy click events into the time-series collections"""
+
+    def run_copy(self, monkeypatch, fake, lease=True):
+        async def acquire(lock_id):
+            return lease
+        monkeypatch.setattr(migrations, "db", fake)
+        monkeypatch.setattr(migrations, "_acquire_lease", acquire)
+        spec = TIMESERIES_COLLECTIONS["download_activity"]
+        return asyncio.run(migrations._copy_collection("download_activity", spec))
+
+    def test_copies_and_drops_legacy(self, monkeypatch):
+        """Test a fully copied legacy collection is dropped"""
+        moment = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        fake = FakeDb([{"_id": 1, "download_id": "a", "timestamp": moment},
+                       {"_id": 2, "download_id": "b", "timestamp": "2024-01-02T00:00:00Z"}])
+        assert self.run_copy(monkeypatch, fake) == 2
+        assert fake["download_activity_legacy"].dropped
+        assert fake.migrations.docs[0]["done"]
+
+    def test_keeps_legacy_with_unusable_events(self, monkeypatch):
+        """Test events without a usable timestamp keep the legacy collection"""
+        fake = FakeDb([{"_id": 1, "download_id": "a", "timestamp": "not a date"},
+                       {"_id": 2, "download_id": "b", "timestamp": "2024-01-02"}])
+        assert self.run_copy(monkeypatch, fake) == 1
+        assert not fake["download_activity_legacy"].dropped
+        assert fake.migrations.docs[0]["skipped"] == 1
+
+    def test_skipped_without_lease(self, monkeypatch):
+        """Test a worker not holding the lease copies nothing"""
+        fake = FakeDb([{"_id": 1, "download_id": "a", "timestamp": "2024-01-02"}])
+        assert self.run_copy(monkeypatch, fake, lease=False) == 0
+        assert fake.download_activity.docs == []